@@ -0,0 +1,157 @@
+import asyncio
+import contextlib
+import logging
+import typing as t
+from collections import Counter, deque
+
+import discord
+
+from evebot.utils.queries import query_scope
+
+from .choices import AttendanceServer
+from .cogs.base import MemberReactions
+from .registries import ACTIVE_EVENT_STATUSES
+
+if t.TYPE_CHECKING:
+    from .cogs.base import EventItem
+    from .cogs.core import EventCore
+
+
+logger = logging.getLogger(__name__)
+
+
+class AttendanceOp(t.NamedTuple):
+    member: discord.Member
+    # ``None`` при снятии - с любого сервера
+    server: t.Optional[AttendanceServer]
+    # ``False`` - реакция снята
+    added: bool = True
+    # Правка модератора, применяется и к завершенным событиям
+    moderated: bool = False
+
+
+class AttendanceActors(object):
+    """Single writer of the attendance state of every event.
+
+    Reaction operations are put into the mailbox of their event and applied by
+    one worker per event strictly in arrival order, so the read-modify-write of
+    a member never interleaves with another operation of the same event.
+    Mailboxes of different events are drained concurrently.
+
+    Operations are idempotent: a repeated add of the current server does
+    nothing, and a remove of a server the member is not on is ignored.
+    Operations of an event which is being closed, see :meth:`closing`, are
+    dropped. Moderator operations go through the same mailbox and also apply
+    to closed events.
+    """
+
+    def __init__(self, core: "EventCore"):
+        self.core = core
+        self.stats: t.Counter[str] = Counter()
+
+        self._mailboxes: t.Dict[int, t.Deque[t.Tuple["EventItem", AttendanceOp]]] = {}
+        self._workers: t.Dict[int, asyncio.Task] = {}
+        self._closing: t.Set[int] = set()
+
+    def __len__(self) -> int:
+        return sum(len(mailbox) for mailbox in self._mailboxes.values())
+
+    def submit(self, event: "EventItem", op: AttendanceOp) -> bool:
+        """Queue ``op``, ``False`` if it was dropped."""
+        if event.id in self._closing:
+            # Событие завершается, отметка опоздала
+            self.stats["dropped"] += 1
+            if op.added and not op.moderated:
+                self.core.reaction_removals.add(
+                    event.channel_id,
+                    event.message_id,
+                    op.member.id,
+                    MemberReactions(op.server).emoji,
+                )
+            return False
+        self._mailboxes.setdefault(event.id, deque()).append((event, op))
+        if event.id not in self._workers:
+            self._workers[event.id] = asyncio.create_task(self._run(event.id))
+        return True
+
+    async def apply(self, event: "EventItem", op: AttendanceOp) -> bool:
+        """Submit ``op`` and wait until the mailbox of the event is drained."""
+        if not self.submit(event, op):
+            return False
+        await self.join(event.id)
+        return True
+
+    async def join(self, event_id: int) -> None:
+        worker = self._workers.get(event_id)
+        if worker is not None:
+            await asyncio.shield(worker)
+
+    @contextlib.asynccontextmanager
+    async def closing(self, event_id: int) -> t.AsyncIterator[None]:
+        """Stop accepting operations of the event and wait for the queued ones.
+
+        New operations are dropped until the block exits, so everything the
+        block flushes is final when it changes the event status.
+        """
+        self._closing.add(event_id)
+        try:
+            await self.join(event_id)
+            yield
+        finally:
+            self._closing.discard(event_id)
+
+    async def _run(self, event_id: int) -> None:
+        mailbox = self._mailboxes[event_id]
+        try:
+            while mailbox:
+                event, op = mailbox.popleft()
+                try:
+                    # Воркер переживает слушатель, который его создал
+                    with query_scope("attendance_actor"):
+                        await self._apply(event, op)
+                except Exception as exc:
+                    self.stats["failed"] += 1
+                    logger.error(
+                        f"Can't apply {op} to event {event_id}: {exc}", exc_info=exc
+                    )
+        finally:
+            self._workers.pop(event_id, None)
+            if not mailbox:
+                self._mailboxes.pop(event_id, None)
+
+    async def _apply(self, event: "EventItem", op: AttendanceOp) -> None:
+        if event.status not in ACTIVE_EVENT_STATUSES and not op.moderated:
+            self.stats["skipped"] += 1
+            return
+
+        current = await event.amember_attendance(member_id=op.member.id)
+
+        if not op.added:
+            # Снятие старой реакции при смене сервера приходит уже после
+            # отметки на новом сервере - такое снятие игнорируем
+            if current is None or op.server not in (None, current):
+                self.stats["ignored"] += 1
+                return
+            await event.aremove_member_attendance(member=op.member)
+            self.stats["removed"] += 1
+            return
+
+        if current == op.server:
+            self.stats["ignored"] += 1
+            return
+
+        await event.aadd_member_attendance(member=op.member, server=op.server)
+        self.stats["added"] += 1
+
+        if current is not None and not op.moderated:
+            # Участник сменил сервер, убираем его прежнюю реакцию
+            self.core.reaction_removals.add(
+                event.channel_id,
+                event.message_id,
+                op.member.id,
+                MemberReactions(current).emoji,
+            )
+
+    async def close(self) -> None:
+        workers = list(self._workers.values())
+        await asyncio.gather(*workers, return_exceptions=True)
@@ -0,0 +1,357 @@
+import contextlib
+import datetime
+import fcntl
+import functools
+import io
+import json
+import logging
+import os
+import typing as t
+from collections import Counter, defaultdict
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.utils import timezone
+
+from system.storages import CommonFileSystemStorage
+
+from .choices import AttendanceServer, EventStatus
+from .models import Event, EventAttendance
+from .resources import server_column
+
+if t.TYPE_CHECKING:
+    from .rollups import RollupKey
+
+try:
+    import pyarrow
+    import pyarrow.compute
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+logger = logging.getLogger(__name__)
+
+
+ARCHIVE_DIR = "archive"
+MANIFEST_NAME = f"{ARCHIVE_DIR}/manifest.json"
+LOCK_NAME = f"{ARCHIVE_DIR}/.lock"
+
+ARCHIVE_STATUSES = (EventStatus.FINISHED, EventStatus.CANCELED, EventStatus.DELETED)
+
+EVENT_COLUMNS = (
+    "id",
+    "guild_id",
+    "role_id",
+    "channel_id",
+    "message_id",
+    "member_id",
+    "member_name",
+    "member_display_name",
+    "title",
+    "description",
+    "status",
+    "created",
+    "updated",
+)
+
+ATTENDANCE_COLUMNS = (
+    "id",
+    "event_id",
+    "event_created",
+    "member_id",
+    "member_name",
+    "member_display_name",
+    "server",
+    "created",
+    "updated",
+)
+
+
+class ArchiveError(Exception):
+    ...
+
+
+def _require_pyarrow() -> None:
+    if pyarrow is None:
+        raise ArchiveError(
+            "pyarrow is required for the event archive, "
+            "install the project with the 'archive' extra"
+        )
+
+
+class EventArchive(object):
+    """Parquet archive of old events on :class:`CommonFileSystemStorage`.
+
+    Every archived batch is a pair of files, events and their attendances.
+    ``manifest.json`` lists the batches with their id and date ranges so
+    readers only open the files which can contain the requested rows.
+    """
+
+    def __init__(self, storage: t.Optional[CommonFileSystemStorage] = None):
+        self.storage = storage or CommonFileSystemStorage()
+
+    def manifest(self) -> t.Dict[str, t.Any]:
+        if not self.storage.exists(MANIFEST_NAME):
+            return {"version": 1, "archived_until": None, "chunks": []}
+        with self.storage.open(MANIFEST_NAME, "rb") as fp:
+            return json.load(fp)
+
+    def _save_manifest(self, manifest: t.Dict[str, t.Any]) -> None:
+        path = self.storage.path(MANIFEST_NAME)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Читатели видят либо старый, либо новый manifest целиком
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as fp:
+            fp.write(json.dumps(manifest, indent=2).encode())
+            fp.flush()
+            os.fsync(fp.fileno())
+        os.replace(tmp_path, path)
+
+    def _add_chunk(self, chunk: t.Dict[str, t.Any], cutoff: datetime.datetime) -> None:
+        manifest = self.manifest()
+        manifest["chunks"].append(chunk)
+        archived_until = manifest["archived_until"]
+        if (
+            archived_until is None
+            or datetime.datetime.fromisoformat(archived_until) < cutoff
+        ):
+            manifest["archived_until"] = cutoff.isoformat()
+        self._save_manifest(manifest)
+
+    @contextlib.contextmanager
+    def _lock(self) -> t.Iterator[None]:
+        path = self.storage.path(LOCK_NAME)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "a") as fp:
+            try:
+                fcntl.flock(fp, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise ArchiveError("Another archive run is in progress")
+            try:
+                yield
+            finally:
+                fcntl.flock(fp, fcntl.LOCK_UN)
+
+    @property
+    def archived_until(self) -> t.Optional[datetime.datetime]:
+        value = self.manifest()["archived_until"]
+        return datetime.datetime.fromisoformat(value) if value else None
+
+    def _write_table(self, name: str, rows: t.List[dict], columns) -> str:
+        table = pyarrow.Table.from_pylist(
+            [{column: row[column] for column in columns} for row in rows],
+            schema=None if rows else pyarrow.schema([]),
+        )
+        buffer = io.BytesIO()
+        pyarrow.parquet.write_table(table, buffer, compression="zstd")
+        return self.storage.save(name, ContentFile(buffer.getvalue()))
+
+    def archive(
+        self, cutoff: datetime.datetime, batch_size: int = 1000
+    ) -> t.Tuple[int, int]:
+        """Move the closed events created before ``cutoff`` into the archive.
+
+        Returns the number of archived events and attendances. A batch is listed
+        in the manifest only after its rows are deleted and committed.
+        """
+        _require_pyarrow()
+
+        with self._lock():
+            return self._archive(cutoff, batch_size)
+
+    def _archive(self, cutoff: datetime.datetime, batch_size: int) -> t.Tuple[int, int]:
+        events_total = attendances_total = 0
+        queryset = Event._base_manager.filter(
+            status__in=ARCHIVE_STATUSES, created__lt=cutoff
+        ).order_by("id")
+
+        while True:
+            with transaction.atomic():
+                events = list(
+                    queryset.select_for_update().values(*EVENT_COLUMNS)[:batch_size]
+                )
+                if not events:
+                    break
+                event_ids = [event["id"] for event in events]
+                attendances = list(
+                    EventAttendance.objects.filter(event_id__in=event_ids)
+                    .order_by("id")
+                    .values(*ATTENDANCE_COLUMNS)
+                )
+
+                first, last = event_ids[0], event_ids[-1]
+                prefix = f"{ARCHIVE_DIR}/{first:010d}_{last:010d}"
+                chunk = {
+                    "events": self._write_table(
+                        f"{prefix}_events.parquet", events, EVENT_COLUMNS
+                    ),
+                    "attendances": self._write_table(
+                        f"{prefix}_attendances.parquet",
+                        attendances,
+                        ATTENDANCE_COLUMNS,
+                    ),
+                    "first_event_id": first,
+                    "last_event_id": last,
+                    "min_created": min(e["created"] for e in events).isoformat(),
+                    "max_created": max(e["created"] for e in events).isoformat(),
+                    "event_count": len(events),
+                    "attendance_count": len(attendances),
+                    "archived_at": timezone.now().isoformat(),
+                }
+
+                # Если транзакция откатится, строки останутся в БД, а файлы
+                # пачки не попадут в manifest и не будут посчитаны дважды
+                transaction.on_commit(functools.partial(self._add_chunk, chunk, cutoff))
+
+                EventAttendance.objects.filter(event_id__in=event_ids).delete()
+                Event._base_manager.filter(id__in=event_ids).delete()
+
+            events_total += len(events)
+            attendances_total += len(attendances)
+            logger.info(f"Archived events {first}..{last}: {len(attendances)} rows")
+
+        return events_total, attendances_total
+
+    def _chunks(
+        self,
+        start: t.Optional[datetime.datetime] = None,
+        end: t.Optional[datetime.datetime] = None,
+        first_id: t.Optional[int] = None,
+        last_id: t.Optional[int] = None,
+    ) -> t.Iterator[t.Dict[str, t.Any]]:
+        for chunk in self.manifest()["chunks"]:
+            min_created = datetime.datetime.fromisoformat(chunk["min_created"])
+            max_created = datetime.datetime.fromisoformat(chunk["max_created"])
+            if end is not None and min_created > end:
+                continue
+            if start is not None and max_created < start:
+                continue
+            if last_id is not None and chunk["first_event_id"] > last_id:
+                continue
+            if first_id is not None and chunk["last_event_id"] < first_id:
+                continue
+            yield chunk
+
+    def report_rows(
+        self,
+        start: t.Optional[datetime.datetime] = None,
+        end: t.Optional[datetime.datetime] = None,
+        event_ids: t.Optional[t.Iterable[int]] = None,
+        first_id: t.Optional[int] = None,
+        last_id: t.Optional[int] = None,
+    ) -> t.List[t.Dict[str, t.Any]]:
+        """Per-member report rows of the archived FINISHED events.
+
+        The rows have the same shape as the ones of
+        :meth:`CommonEventAttendanceResource.aggregate`.
+        """
+        if event_ids is not None:
+            event_ids = list(event_ids)
+            if not event_ids:
+                return []
+            first_id, last_id = min(event_ids), max(event_ids)
+
+        chunks = list(self._chunks(start, end, first_id, last_id))
+        if not chunks:
+            return []
+        _require_pyarrow()
+
+        servers: t.Dict[int, t.Dict[str, t.Set[int]]] = defaultdict(
+            lambda: defaultdict(set)
+        )
+        names: t.Dict[int, t.Set[str]] = defaultdict(set)
+        for chunk in chunks:
+            with self.storage.open(chunk["events"], "rb") as fp:
+                events = pyarrow.parquet.read_table(fp, columns=["id", "status"])
+            finished = events.filter(
+                pyarrow.compute.equal(events["status"], EventStatus.FINISHED.value)
+            )["id"]
+
+            with self.storage.open(chunk["attendances"], "rb") as fp:
+                table = pyarrow.parquet.read_table(fp)
+            if not table.num_rows:
+                continue
+
+            mask = pyarrow.compute.is_in(table["event_id"], value_set=finished)
+            if start is not None:
+                mask = pyarrow.compute.and_(
+                    mask, pyarrow.compute.greater_equal(table["event_created"], start)
+                )
+            if end is not None:
+                mask = pyarrow.compute.and_(
+                    mask, pyarrow.compute.less_equal(table["event_created"], end)
+                )
+            if event_ids is not None:
+                mask = pyarrow.compute.and_(
+                    mask,
+                    pyarrow.compute.is_in(
+                        table["event_id"], value_set=pyarrow.array(event_ids)
+                    ),
+                )
+            elif first_id is not None and last_id is not None:
+                mask = pyarrow.compute.and_(
+                    mask,
+                    pyarrow.compute.and_(
+                        pyarrow.compute.greater_equal(table["event_id"], first_id),
+                        pyarrow.compute.less_equal(table["event_id"], last_id),
+                    ),
+                )
+
+            for row in table.filter(mask).to_pylist():
+                member_id = row["member_id"]
+                servers[member_id][row["server"]].add(row["event_id"])
+                names[member_id].add(row["member_display_name"])
+
+        return [
+            {
+                "member_id": member_id,
+                "member_names": ",".join(sorted(names[member_id])),
+                **{
+                    server_column(server): len(servers[member_id][server.value])
+                    for server in AttendanceServer
+                },
+            }
+            for member_id in sorted(servers)
+        ]
+
+    def rollup_counts(self) -> t.Counter["RollupKey"]:
+        """Rollup counters of the archived FINISHED events.
+
+        Archived attendances are gone from the database, so
+        :func:`activity.rollups.rebuild_rollup` adds these to the live ones.
+        """
+        counts: t.Counter["RollupKey"] = Counter()
+        chunks = self.manifest()["chunks"]
+        if not chunks:
+            return counts
+        _require_pyarrow()
+
+        for chunk in chunks:
+            with self.storage.open(chunk["events"], "rb") as fp:
+                events = pyarrow.parquet.read_table(
+                    fp, columns=["id", "guild_id", "status", "created"]
+                )
+            finished = {
+                event["id"]: (timezone.localdate(event["created"]), event["guild_id"])
+                for event in events.to_pylist()
+                if event["status"] == EventStatus.FINISHED.value
+            }
+            if not finished:
+                continue
+
+            with self.storage.open(chunk["attendances"], "rb") as fp:
+                table = pyarrow.parquet.read_table(fp)
+            for row in table.to_pylist():
+                if row["event_id"] not in finished:
+                    continue
+                day, guild_id = finished[row["event_id"]]
+                key = (
+                    day,
+                    guild_id,
+                    row["member_id"],
+                    row["server"],
+                    row["member_display_name"],
+                )
+                counts[key] += 1
+        return counts
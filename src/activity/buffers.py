@@ -0,0 +1,355 @@
+import asyncio
+import datetime
+import logging
+import typing as t
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.db.models.functions import Now
+from django.utils import timezone
+
+from evebot.utils.queries import query_scope
+
+from .choices import AttendanceServer, EventStatus
+from .models import SERVER_COUNT_FIELDS, Event, EventAttendance
+from .rollups import RollupKey, apply_rollup
+
+if t.TYPE_CHECKING:
+    import discord
+
+    from .stores import ActivityStore
+
+
+logger = logging.getLogger(__name__)
+
+
+class PendingAttendance(t.NamedTuple):
+    member_name: str
+    member_display_name: str
+    server: AttendanceServer
+
+
+# member_id -> pending row, ``None`` means the row has to be deleted
+PendingEvent = t.Dict[int, t.Optional[PendingAttendance]]
+
+
+# event_id -> (created, guild_id, status)
+EventInfo = t.Dict[int, t.Tuple[datetime.datetime, int, str]]
+
+# (event_id, member_id) -> (server, member_display_name)
+PreviousAttendance = t.Dict[t.Tuple[int, int], t.Tuple[str, str]]
+
+
+def attendance_deltas(
+    batch: t.Dict[int, PendingEvent], events: EventInfo, previous: PreviousAttendance
+) -> t.Tuple[t.Counter[RollupKey], t.Dict[int, t.Counter[str]]]:
+    """Rollup deltas and per-event server counter deltas of a batch."""
+    rollup: t.Counter[RollupKey] = Counter()
+    deltas: t.Dict[int, t.Counter[str]] = defaultdict(Counter)
+    for event_id, pending_event in batch.items():
+        created, guild_id, status = events[event_id]
+        # Правки завершенных событий модераторами попадают и в rollup
+        day = timezone.localdate(created)
+        finished = status == EventStatus.FINISHED
+        for member_id, value in pending_event.items():
+            old = previous.get((event_id, member_id))
+            new = (value.server, value.member_display_name) if value else None
+            if old == new:
+                continue
+            if old is not None:
+                deltas[event_id][old[0]] -= 1
+                if finished:
+                    rollup[(day, guild_id, member_id, *old)] -= 1
+            if new is not None:
+                deltas[event_id][new[0]] += 1
+                if finished:
+                    rollup[(day, guild_id, member_id, *new)] += 1
+    return rollup, deltas
+
+
+# (event_id, event_created, member_id, member_name, member_display_name, server)
+AttendanceRow = t.Tuple[int, datetime.datetime, int, str, str, str]
+
+
+class AttendanceWrites(t.NamedTuple):
+    """Everything one batch writes, whichever store executes it."""
+
+    upserts: t.List[AttendanceRow]
+    # (event_id, event_created, member_ids)
+    deletes: t.List[t.Tuple[int, datetime.datetime, t.List[int]]]
+    rollup: t.Counter[RollupKey]
+    # event_id -> {counter field: delta}
+    counters: t.Dict[int, t.Dict[str, int]]
+
+
+def attendance_conflict_fields() -> t.Tuple[str, ...]:
+    """Fields of the unique constraint the attendance upsert conflicts on."""
+    for constraint in EventAttendance._meta.constraints:
+        if constraint.name == "event-attendance-member":
+            return tuple(constraint.fields)
+    raise LookupError("event-attendance-member constraint is missing")
+
+
+def drop_missing_events(
+    batch: t.Dict[int, PendingEvent], events: EventInfo
+) -> t.Dict[int, PendingEvent]:
+    """Drop the operations of events which no longer exist.
+
+    Purged, archived or detached events would otherwise fail every flush and
+    block the writes of all other events behind them.
+    """
+    missing = batch.keys() - events.keys()
+    if not missing:
+        return batch
+    for event_id in sorted(missing):
+        logger.warning(
+            f"Dropped {len(batch[event_id])} attendance operations "
+            f"of missing event {event_id}"
+        )
+    return {
+        event_id: pending_event
+        for event_id, pending_event in batch.items()
+        if event_id in events
+    }
+
+
+def plan_attendance_writes(
+    batch: t.Dict[int, PendingEvent], events: EventInfo, previous: PreviousAttendance
+) -> AttendanceWrites:
+    upserts: t.List[AttendanceRow] = []
+    deletes = []
+    for event_id, pending_event in batch.items():
+        # event_created в фильтрах позволяет отсечь лишние секции
+        event_created = events[event_id][0]
+        removed = []
+        for member_id, value in pending_event.items():
+            if value is None:
+                removed.append(member_id)
+                continue
+            upserts.append(
+                (
+                    event_id,
+                    event_created,
+                    member_id,
+                    value.member_name,
+                    value.member_display_name,
+                    str(value.server),
+                )
+            )
+        if removed:
+            deletes.append((event_id, event_created, removed))
+
+    rollup, deltas = attendance_deltas(batch, events, previous)
+    counters = {
+        event_id: {
+            SERVER_COUNT_FIELDS[server]: count
+            for server, count in delta.items()
+            if count
+        }
+        for event_id, delta in deltas.items()
+    }
+    return AttendanceWrites(
+        upserts=upserts,
+        deletes=deletes,
+        rollup=rollup,
+        counters={event_id: fields for event_id, fields in counters.items() if fields},
+    )
+
+
+def write_attendances(batch: t.Dict[int, PendingEvent]) -> None:
+    """Write a batch of attendance operations in one transaction.
+
+    The per-server counters of the events, and the rollup of the finished ones,
+    are updated in the same transaction. The deltas are computed from the rows
+    being replaced, see :func:`plan_attendance_writes`.
+    """
+    with transaction.atomic():
+        events = {
+            event_id: (created, guild_id, status)
+            for event_id, created, guild_id, status in Event._base_manager.filter(
+                id__in=list(batch)
+            ).values_list("id", "created", "guild_id", "status")
+        }
+        batch = drop_missing_events(batch, events)
+        if not batch:
+            return
+
+        touched = Q()
+        for event_id, pending_event in batch.items():
+            touched |= Q(
+                event_id=event_id,
+                event_created=events[event_id][0],
+                member_id__in=list(pending_event),
+            )
+        rows = (
+            EventAttendance.objects.select_for_update()
+            .filter(touched)
+            .values_list("event_id", "member_id", "server", "member_display_name")
+        )
+        previous = {
+            (event_id, member_id): (server, display_name)
+            for event_id, member_id, server, display_name in rows
+        }
+
+        writes = plan_attendance_writes(batch, events, previous)
+
+        if writes.upserts:
+            EventAttendance.objects.bulk_create(
+                [
+                    EventAttendance(
+                        event_id=event_id,
+                        event_created=event_created,
+                        member_id=member_id,
+                        member_name=member_name,
+                        member_display_name=display_name,
+                        server=server,
+                    )
+                    for (
+                        event_id,
+                        event_created,
+                        member_id,
+                        member_name,
+                        display_name,
+                        server,
+                    ) in writes.upserts
+                ],
+                update_conflicts=True,
+                unique_fields=attendance_conflict_fields(),
+                update_fields=[
+                    "member_name",
+                    "member_display_name",
+                    "server",
+                    "updated",
+                ],
+            )
+        if writes.deletes:
+            deletes = Q()
+            for event_id, event_created, removed in writes.deletes:
+                deletes |= Q(
+                    event_id=event_id,
+                    event_created=event_created,
+                    member_id__in=removed,
+                )
+            EventAttendance.objects.filter(deletes).delete()
+
+        apply_rollup(writes.rollup)
+
+        for event_id, fields in writes.counters.items():
+            Event._base_manager.filter(id=event_id).update(
+                **{field: F(field) + count for field, count in fields.items()},
+                updated=Now(),
+            )
+
+
+class AttendanceWriteBuffer(object):
+    """Write-behind buffer for the attendance rows of running events.
+
+    Operations are coalesced per ``(event_id, member_id)`` so only the last state
+    of a member is written. A flush is one ``INSERT ... ON CONFLICT DO UPDATE``
+    for all upserts plus one ``DELETE`` for all removals, see
+    :func:`write_attendances`.
+    """
+
+    def __init__(
+        self,
+        store: "ActivityStore",
+        *,
+        flush_interval: float,
+        flush_size: int,
+    ):
+        self.store = store
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+
+        self._pending: t.Dict[int, PendingEvent] = {}
+        self._size = 0
+        self._lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._closed = False
+        self._task: t.Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _put(
+        self, event_id: int, member_id: int, value: t.Optional[PendingAttendance]
+    ) -> None:
+        pending_event = self._pending.setdefault(event_id, {})
+        if member_id not in pending_event:
+            self._size += 1
+        pending_event[member_id] = value
+        if self._size >= self.flush_size:
+            self._wakeup.set()
+
+    def upsert(
+        self, event_id: int, member: "discord.Member", server: AttendanceServer
+    ) -> None:
+        self._put(
+            event_id,
+            member.id,
+            PendingAttendance(
+                member_name=member.name,
+                member_display_name=member.display_name,
+                server=server,
+            ),
+        )
+
+    def remove(self, event_id: int, member_id: int) -> None:
+        self._put(event_id, member_id, None)
+
+    def _take(self, event_id: t.Optional[int] = None) -> t.Dict[int, PendingEvent]:
+        if event_id is None:
+            batch, self._pending = self._pending, {}
+        elif event_id in self._pending:
+            batch = {event_id: self._pending.pop(event_id)}
+        else:
+            batch = {}
+        self._size -= sum(len(pending_event) for pending_event in batch.values())
+        return batch
+
+    def _restore(self, batch: t.Dict[int, PendingEvent]) -> None:
+        # Newer operations queued while the batch was in flight take precedence
+        for event_id, pending_event in batch.items():
+            for member_id, value in pending_event.items():
+                if member_id not in self._pending.get(event_id, {}):
+                    self._put(event_id, member_id, value)
+
+    async def flush(self, event_id: t.Optional[int] = None) -> int:
+        async with self._lock:
+            batch = self._take(event_id=event_id)
+            if not batch:
+                return 0
+            try:
+                with query_scope("attendance_flush"):
+                    await self.store.write_attendances(batch)
+            except Exception:
+                self._restore(batch)
+                raise
+            count = sum(len(pending_event) for pending_event in batch.values())
+            logger.debug(f"Flushed {count} attendance operations")
+            return count
+
+    async def _run(self) -> None:
+        while not self._closed:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                ...
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as exc:
+                logger.error(f"Failed to flush attendance buffer: {exc}")
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        self._closed = True
+        self._wakeup.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        await self.flush()
@@ -0,0 +1,96 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import typing as t
+
+from django.conf import settings
+
+from system.storages import CommonFileSystemStorage
+
+logger = logging.getLogger(__name__)
+
+
+CACHE_DIR = "reports"
+
+
+class ReportCache(object):
+    """Finished report files on :class:`CommonFileSystemStorage`.
+
+    An entry is addressed by the report kind, its parameters and the data
+    watermark the caller computed for them, so a change of the data gives a new
+    key and stale entries are never read, only evicted. The least recently used
+    entries are removed once the cache holds more than ``max_files`` files or
+    ``max_size`` bytes.
+    """
+
+    def __init__(
+        self,
+        storage: t.Optional[CommonFileSystemStorage] = None,
+        *,
+        max_size: t.Optional[int] = None,
+        max_files: t.Optional[int] = None,
+    ):
+        self.storage = storage or CommonFileSystemStorage()
+        self.max_size = max_size or settings.EVE_REPORT_CACHE_SIZE * 1024 * 1024
+        self.max_files = max_files or settings.EVE_REPORT_CACHE_FILES
+
+    @staticmethod
+    def key(kind: str, params: t.Mapping[str, t.Any], watermark: t.Any) -> str:
+        payload = json.dumps([kind, params, watermark], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _path(self, key: str, suffix: str) -> str:
+        return self.storage.path(f"{CACHE_DIR}/{key}{suffix}")
+
+    def get(self, key: str, suffix: str) -> t.Optional[str]:
+        """Path of the cached file, or ``None``."""
+        path = self._path(key, suffix)
+        try:
+            # mtime - время последнего обращения, по нему вытесняем
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key: str, suffix: str, content: t.BinaryIO) -> str:
+        """Copy ``content`` into the cache and return the path of the entry."""
+        path = self._path(key, suffix)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Отчеты строят несколько процессов, файл появляется только целиком
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as fp:
+            shutil.copyfileobj(content, fp)
+        os.replace(tmp_path, path)
+        self.evict(keep=path)
+        return path
+
+    def evict(self, keep: t.Optional[str] = None) -> int:
+        """Remove the least recently used entries over the limits, but ``keep``."""
+        entries = []
+        with os.scandir(self.storage.path(CACHE_DIR)) as scan:
+            for entry in scan:
+                if entry.is_file() and not entry.name.endswith(".tmp"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort()
+
+        count = len(entries)
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in entries:
+            if count <= self.max_files and total <= self.max_size:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                ...
+            count -= 1
+            total -= size
+            removed += 1
+        if removed:
+            logger.debug(f"Report cache: evicted {removed} files")
+        return removed
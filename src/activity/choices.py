@@ -1,6 +1,6 @@
 from django.db import models
 
-__all__ = ("EventStatus", "AttendanceServer")
+__all__ = ("EventStatus", "AttendanceServer", "ReportJobStatus")
 
 
 class EventStatus(models.TextChoices):
@@ -18,3 +18,10 @@ class AttendanceServer(models.TextChoices):
     FOUR = "Server 4", "Сервер 4"
     FIVE = "Server 5", "Сервер 5"
     SIX = "Server 6", "Сервер 6"
+
+
+class ReportJobStatus(models.TextChoices):
+    PENDING = "PENDING", "в очереди"
+    RUNNING = "RUNNING", "формируется"
+    DONE = "DONE", "готово"
+    FAILED = "FAILED", "ошибка"
@@ -6,6 +6,8 @@ from discord import app_commands
 from discord.ext import commands
 
 from activity.models import EventChannel, EventModerator
+from activity.registries import event_access
+from evebot.utils.queries import instrumented
 
 from .base import BaseEventCog
 
@@ -64,11 +66,14 @@ class AdminEventCog(BaseEventCog):
     @commands.guild_only()
     @app_commands.guild_only()
     @app_commands.describe(channel="Текстовый канал для событий")
+    @instrumented("/eventadmin channel add")
     async def event_admin_channel_add(
         self, ctx: "GuildEveContext", channel: discord.TextChannel
     ) -> None:
-        event_channel, _ = EventChannel.objects.get_or_create(
-            guild_id=ctx.guild.id, channel_id=channel.id
+        event_channel, _ = await self.bot.db_executor.run(
+            EventChannel.objects.get_or_create,
+            guild_id=ctx.guild.id,
+            channel_id=channel.id,
         )
         await ctx.send(
             f"Канал, {channel.mention}, настроен для использования событий!",
@@ -85,13 +90,14 @@ class AdminEventCog(BaseEventCog):
     @commands.guild_only()
     @app_commands.guild_only()
     @app_commands.describe(channel="Текстовый канал для событий")
+    @instrumented("/eventadmin channel del")
     async def event_admin_channel_del(
         self, ctx: "GuildEveContext", channel: discord.TextChannel
     ) -> None:
-        event_channel = EventChannel.objects.get(
-            guild_id=ctx.guild.id, channel_id=channel.id
+        event_channel = await self.bot.db_executor.run(
+            EventChannel.objects.get, guild_id=ctx.guild.id, channel_id=channel.id
         )
-        event_channel.delete()
+        await self.bot.db_executor.run(event_channel.delete)
         await ctx.send(
             f"Канал, {channel.mention}, больше не используется для событий!",
             reference=ctx.message,
@@ -107,11 +113,14 @@ class AdminEventCog(BaseEventCog):
     @commands.guild_only()
     @app_commands.guild_only()
     @app_commands.describe(member="Участник, которому предоставить права модерации")
+    @instrumented("/eventadmin moderator add")
     async def event_admin_moderator_add(
         self, ctx: "GuildEveContext", member: discord.Member
     ) -> None:
-        event_moderator, _ = EventModerator.objects.get_or_create(
-            guild_id=ctx.guild.id, member_id=member.id
+        event_moderator, _ = await self.bot.db_executor.run(
+            EventModerator.objects.get_or_create,
+            guild_id=ctx.guild.id,
+            member_id=member.id,
         )
         await ctx.send(
             f"Пользователь, {member.mention}, теперь является модератором!",
@@ -128,13 +137,14 @@ class AdminEventCog(BaseEventCog):
     @commands.guild_only()
     @app_commands.guild_only()
     @app_commands.describe(member="Участник, у которого отозвать права модератора")
+    @instrumented("/eventadmin moderator del")
     async def event_admin_moderator_del(
         self, ctx: "GuildEveContext", member: discord.Member
     ) -> None:
-        event_moderator = EventModerator.objects.get(
-            guild_id=ctx.guild.id, member_id=member.id
+        event_moderator = await self.bot.db_executor.run(
+            EventModerator.objects.get, guild_id=ctx.guild.id, member_id=member.id
         )
-        event_moderator.delete()
+        await self.bot.db_executor.run(event_moderator.delete)
         await ctx.send(
             f"Пользователь, {member.mention}, теперь не является модератором!",
             reference=ctx.message,
@@ -148,10 +158,9 @@ class AdminEventCog(BaseEventCog):
     )
     @commands.guild_only()
     @app_commands.guild_only()
+    @instrumented("/eventadmin moderator show")
     async def event_admin_moderator_show(self, ctx: "GuildEveContext") -> None:
-        event_moderators = EventModerator.objects.filter(
-            guild_id=ctx.guild.id
-        ).values_list("member_id", flat=True)
+        event_moderators = event_access.moderators(ctx.guild.id)
         members = ctx.guild.members
         moderators = filter(lambda member: member.id in event_moderators, members)
         moderators = ", ".join([member.mention for member in moderators])
@@ -6,14 +6,21 @@ from collections import OrderedDict
 import discord
 from discord import app_commands
 from discord.app_commands.errors import CommandAlreadyRegistered
-from discord.ext import commands, tasks
+from discord.ext import commands
+from django.db import transaction
 from django.db.models import Count
 from enum_properties import EnumProperties, s
 
 from activity.choices import AttendanceServer, EventStatus
-from activity.models import Event, EventAttendance, EventChannel, EventModerator
+from activity.models import SERVER_COUNT_FIELDS, Event
+from activity.registries import AttendanceRegistry
+from activity.rollups import add_event_rollup, subtract_event_rollup
 from evebot.bot import EveBot, EveContext
 from evebot.utils.enums import EmojiEnumMIxin
+from evebot.utils.executor import DatabaseExecutor
+
+if t.TYPE_CHECKING:
+    from .core import EventCore
 
 logger = logging.getLogger(__name__)
 
@@ -36,7 +43,10 @@ def event_template_embed(title: str, description: str) -> discord.Embed:
     return embed
 
 
-def event_embed(event: "EventItem") -> discord.Embed:
+def event_embed(
+    event: "EventItem",
+    counts: t.Optional[t.Mapping[AttendanceServer, int]] = None,
+) -> discord.Embed:
     colour = discord.Colour.light_gray()
     if event.status == EventStatus.STARTED:
         colour = discord.Colour.blue()
@@ -89,13 +99,23 @@ def event_embed(event: "EventItem") -> discord.Embed:
         f"{MemberReactions.SIX.attend_server.label}\n"
     )
 
+    if event.status == EventStatus.STARTED and counts is not None:
+        # Текущее количество отметившихся по серверам
+        live_footer = ""
+        for mr in MemberReactions:
+            cnt = counts.get(mr.attend_server, 0)
+            live_footer += f"{mr.emoji}    {mr.attend_server.label}    {cnt}\n"
+
+        embed.set_footer(text=live_footer)
+
     if event.status == EventStatus.FINISHED:
         # guild_members = list([member for member in event.guild.members])
         stats_footer = ""
 
-        for item in event.event_attendances.values("server").annotate(Count("server")):
-            mr = MemberReactions[item["server"]]
-            cnt = item["server__count"]
+        for server, cnt in event.server_counts.items():
+            if not cnt:
+                continue
+            mr = MemberReactions[server]
             stats_footer += f"{mr.emoji}    {mr.attend_server.label}    {cnt}\n"
 
         embed.set_footer(text=stats_footer)
@@ -142,13 +162,11 @@ def event_stats_embed(event: "EventItem") -> discord.Embed:
 
 class EventItem(Event):
     bot: t.Optional[EveBot] = None
-    cog: t.Optional["BaseEventCog"] = None
+    core: t.Optional["EventCore"] = None
 
     message: t.Optional[discord.Message]
     author: t.Optional[discord.Member]
 
-    _member_attendances: dict[int, AttendanceServer] = {}
-
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
@@ -191,83 +209,136 @@ class EventItem(Event):
     def author(self) -> discord.Member:
         return self.guild.get_member(self.member_id)
 
+    @property
+    def db(self) -> DatabaseExecutor:
+        return self.bot.db_executor
+
+    def change_status(self, status: EventStatus) -> None:
+        # Rollup хранит только завершенные события
+        with transaction.atomic():
+            was_finished = self.status == EventStatus.FINISHED
+            self.save(status=status)
+            if status == EventStatus.FINISHED and not was_finished:
+                add_event_rollup(self)
+            elif was_finished and status != EventStatus.FINISHED:
+                subtract_event_rollup(self)
+
+    async def asave(self, *args, **kwargs) -> None:
+        await self.db.run(self.save, *args, **kwargs)
+
     async def fetch_message(self) -> t.Optional[discord.Message]:
         channel = self.channel
         if channel is not None and self.message_id is not None:
-            self.message = await self.cog.get_event_message(channel.id, self.message_id)
+            self.message = await self.core.get_event_message(
+                channel.id, self.message_id
+            )
         return self.message
 
     @property
-    def member_attendances(self) -> dict:
-        # Подгружаем из БД то что есть ( при рестарте )
-        if not self._member_attendances:
-            members = self.event_attendances.all().values("member_id", "server")
-            for member in members:
-                attend_server = AttendanceServer(member["server"])
-                self._member_attendances[member["member_id"]] = attend_server
-        return self._member_attendances
-
-    def member_attendance(self, member_id: int):
-        attend_server = self.member_attendances.get(member_id)
-        return attend_server
-
-    def add_member_attendance(
-        self, member: discord.Member, server: AttendanceServer, force: bool = True
-    ) -> t.Tuple[EventAttendance, bool]:
-        self._member_attendances[member.id] = server
-        attend_member, created = EventAttendance.objects.get_or_create(
-            event=self,
-            member_id=member.id,
-            defaults={
-                "member_name": member.name,
-                "member_display_name": member.display_name,
-                "server": server,
-            },
-        )
-        if not created and force:
-            attend_member.server = server
+    def attendance_registry(self) -> t.Optional[AttendanceRegistry]:
+        # Состояние в памяти держим только для запущенных событий
+        if self.status == EventStatus.STARTED:
+            return self.core.attendance_registry
+        return None
 
-        attend_member.save(
-            update_fields=[
-                "server",
-            ]
+    def member_attendance(self, member_id: int) -> t.Optional[AttendanceServer]:
+        server = (
+            self.event_attendances.filter(member_id=member_id)
+            .values_list("server", flat=True)
+            .first()
         )
-        return attend_member, created
+        return AttendanceServer(server) if server is not None else None
 
-    def remove_member_attendance(self, member: discord.Member) -> bool:
-        try:
-            attend_member = EventAttendance.objects.get(event=self, member_id=member.id)
-            attend_member.delete()
-        except EventAttendance.DoesNotExist:
-            ...
-        except EventAttendance.MultipleObjectsReturned:
-            EventAttendance.objects.filter(event=self, member_id=member.id).delete()
-        self._member_attendances.pop(member.id, None)
+    async def amember_attendance(self, member_id: int) -> t.Optional[AttendanceServer]:
+        registry = self.attendance_registry
+        if registry is not None:
+            return await registry.get(self.id, member_id)
+        return await self.db.run(self.member_attendance, member_id)
+
+    async def aadd_member_attendance(
+        self, member: discord.Member, server: AttendanceServer, force: bool = True
+    ) -> None:
+        # Запись в БД выполняется отложенно через буфер
+        if not force and await self.amember_attendance(member.id) is not None:
+            return
+        registry = self.attendance_registry
+        if registry is not None:
+            await registry.set(self.id, member.id, server)
+            self.touch_live_embed()
+        self.core.attendance_buffer.upsert(self.id, member=member, server=server)
+
+    async def aremove_member_attendance(self, member: discord.Member) -> bool:
+        registry = self.attendance_registry
+        if registry is not None:
+            await registry.discard(self.id, member.id)
+            self.touch_live_embed()
+        self.core.attendance_buffer.remove(self.id, member_id=member.id)
         return True
 
+    async def aflush_attendances(self) -> None:
+        await self.core.attendance_buffer.flush(event_id=self.id)
+        # Счетчики обновляются в БД через F(), перечитываем их
+        await self.db.run(
+            self.refresh_from_db, fields=list(SERVER_COUNT_FIELDS.values())
+        )
+
+    async def aevent_embed(self) -> discord.Embed:
+        registry = self.attendance_registry
+        if registry is not None:
+            # Для запущенного события счетчики берем из памяти, без БД
+            counts = await registry.counts(self.id)
+            return event_embed(event=self, counts=counts)
+        return await self.db.run(event_embed, event=self)
+
+    def touch_live_embed(self) -> None:
+        if self.message_id is not None:
+            self.core.live_embeds.touch(self.channel_id, self.message_id, self)
+
+    async def aevent_stats_embed(self) -> discord.Embed:
+        return await self.db.run(event_stats_embed, event=self)
+
     async def do_finish(self) -> None:
-        self.status = EventStatus.FINISHED
-        self.save()
+        async with self.core.attendance_actors.closing(self.id):
+            await self.aflush_attendances()
+            await self.db.run(self.change_status, EventStatus.FINISHED)
+        self.core.live_embeds.forget(self.message_id)
+        self.core.active_events.add(self)
+        self.core.attendance_registry.evict(self.id)
 
     async def do_cancel(self) -> None:
-        self.status = EventStatus.CANCELED
-        self.save()
+        async with self.core.attendance_actors.closing(self.id):
+            await self.aflush_attendances()
+            await self.db.run(self.change_status, EventStatus.CANCELED)
+        self.core.live_embeds.forget(self.message_id)
+        self.core.active_events.add(self)
+        self.core.attendance_registry.evict(self.id)
+
+    async def do_delete(self) -> None:
+        async with self.core.attendance_actors.closing(self.id):
+            await self.aflush_attendances()
+            await self.db.run(self.change_status, EventStatus.DELETED)
+        self.core.live_embeds.forget(self.message_id)
+        self.core.active_events.add(self)
+        self.core.attendance_registry.evict(self.id)
 
     async def clean_reactions(self) -> None:
+        self.core.reaction_removals.drop_message(self.channel_id, self.message_id)
         message = await self.fetch_message()
         await message.clear_reactions()
 
 
 class EventButtonsPersistentView(discord.ui.View):
-    def __init__(self, cog: "BaseEventCog"):
+    def __init__(self, core: "EventCore"):
         super().__init__(timeout=None)
-        self.cog: "BaseEventCog" = cog
+        self.core: "EventCore" = core
         self.event: t.Optional[EventItem] = None
 
     async def interaction_check(self, interaction: discord.Interaction) -> bool:
-        self.event = await self.cog.get_event_for_message(interaction.message.id)
+        self.event = await self.core.get_event_for_message(interaction.message.id)
+        if self.event is None:
+            return False
 
-        if not self.cog.is_event_moderator(self.event.guild_id, interaction.user.id):
+        if not self.core.is_event_moderator(self.event.guild_id, interaction.user.id):
             await interaction.response.send_message(
                 ":face_with_symbols_over_mouth: "
                 "Убрал руки! Это только для модераторов.",
@@ -276,7 +347,7 @@ class EventButtonsPersistentView(discord.ui.View):
             return False
 
         if self.event.status in [EventStatus.FINISHED, EventStatus.CANCELED]:
-            embed = event_embed(event=self.event)
+            embed = await self.event.aevent_embed()
             await interaction.response.edit_message(
                 content=None, embed=embed, view=None
             )
@@ -299,12 +370,12 @@ class EventButtonsPersistentView(discord.ui.View):
         self, interaction: discord.Interaction, button: discord.ui.Button
     ):
         await self.event.do_finish()
-        embed = event_embed(event=self.event)
+        embed = await self.event.aevent_embed()
         await interaction.response.edit_message(content=None, embed=embed, view=None)
         await self.event.clean_reactions()
 
         parent_message = await self.event.fetch_message()
-        stats_embed = event_stats_embed(self.event)
+        stats_embed = await self.event.aevent_stats_embed()
         try:
             thread = await parent_message.create_thread(name="Статистика")
             await thread.send(content=None, embed=stats_embed)
@@ -319,110 +390,25 @@ class EventButtonsPersistentView(discord.ui.View):
     )
     async def cancel(self, interaction: discord.Interaction, button: discord.ui.Button):
         await self.event.do_cancel()
-        embed = event_embed(event=self.event)
+        embed = await self.event.aevent_embed()
         await interaction.response.edit_message(content=None, embed=embed, view=None)
         await self.event.clean_reactions()
 
 
 class BaseEventCog(commands.Cog):
-    def __init__(self, bot: EveBot):
-        self.bot: EveBot = bot
+    """Base class for the event command cogs.
 
-        self.bot.add_view(EventButtonsPersistentView(cog=self))
+    Listeners, caches and the persistent view live in :class:`EventCore`, the
+    command cogs only use it.
+    """
 
+    def __init__(self, bot: EveBot):
+        self.bot: EveBot = bot
         self.event_class = EventItem
-        self.event_class.bot = bot
-        self.event_class.cog = self
-
-        self._event_message_cache: dict[int, discord.Message] = {}
-        self.cleanup_event_message_cache.start()
-        self._event_moderators_cache: dict[int, dict] = {}
-        self.cleanup_event_moderators_cache.start()
-
-        self._event_channels_cache: dict[int, dict] = {}
-        self.cleanup_event_channels_cache.start()
-
-    @tasks.loop(hours=1.0)
-    async def cleanup_event_message_cache(self):
-        self._event_message_cache.clear()
-
-    @tasks.loop(hours=1.0)
-    async def cleanup_event_moderators_cache(self):
-        self._event_moderators_cache.clear()
 
-    @tasks.loop(hours=1.0)
-    async def cleanup_event_channels_cache(self):
-        self._event_channels_cache.clear()
-
-    @commands.Cog.listener()
-    async def on_raw_reaction_add(
-        self, payload: discord.RawReactionActionEvent
-    ) -> None:
-        # Проверим канал. Есть ли он в БД
-        if not self.is_event_channel(
-            guild_id=payload.guild_id, channel_id=payload.channel_id
-        ):
-            return
-
-        message = await self.get_event_message(
-            payload.channel_id, message_id=payload.message_id
-        )
-        event = await self.get_event_for_message(message_id=payload.message_id)
-
-        member = payload.member
-
-        # Сначала проверяем есть ли событие для этого сообщения
-        if not event:
-            await message.remove_reaction(payload.emoji, member)
-            return
-
-        if event.status == EventStatus.FINISHED:
-            await message.remove_reaction(payload.emoji, member)
-            return
-
-        if member.bot:
-            return
-
-        if str(payload.emoji) in MemberReactions.emojis():
-            current_member_attendance = MemberReactions(
-                str(payload.emoji)
-            ).attend_server
-            old_member_attendance = event.member_attendance(member_id=member.id)
-            if (
-                old_member_attendance is not None
-                and current_member_attendance != old_member_attendance
-            ):
-                emoji = MemberReactions(old_member_attendance).emoji
-                await message.remove_reaction(emoji, member)
-
-            event.add_member_attendance(member=member, server=current_member_attendance)
-        else:
-            await message.remove_reaction(str(payload.emoji), member)
-
-    @commands.Cog.listener()
-    async def on_raw_reaction_remove(
-        self, payload: discord.RawReactionActionEvent
-    ) -> None:
-        # message
-        _ = await self.get_event_message(
-            payload.channel_id, message_id=payload.message_id
-        )
-        event = await self.get_event_for_message(message_id=payload.message_id)
-
-        # Сначала проверяем есть ли событие для этого сообщения
-        if not event:
-            return
-
-        member = payload.member or event.guild.get_member(payload.user_id)
-
-        if event.status == EventStatus.FINISHED:
-            return
-
-        if member.bot:
-            return
-
-        if str(payload.emoji) in MemberReactions.emojis():
-            event.remove_member_attendance(member=member)
+    @property
+    def core(self) -> "EventCore":
+        return self.bot.get_cog("EventCore")
 
     async def cog_app_command_error(
         self, inter: discord.Interaction, error: app_commands.AppCommandError
@@ -439,55 +425,3 @@ class BaseEventCog(commands.Cog):
             f"\N{SKULL AND CROSSBONES} " f"Что-то пошло не так\n\n" f"> {str(error)}",
             ephemeral=True,
         )
-
-    def is_event_moderator(self, guild_id: int, member_id: int) -> bool:
-        try:
-            _ = self._event_moderators_cache[guild_id][member_id]
-            return True
-        except KeyError:
-            try:
-                _ = EventModerator.objects.get(guild_id=guild_id, member_id=member_id)
-            except EventModerator.DoesNotExist:
-                return False
-            else:
-                if guild_id not in self._event_moderators_cache:
-                    self._event_moderators_cache[guild_id] = {}
-                self._event_moderators_cache[guild_id].update({member_id: True})
-                return True
-
-    def is_event_channel(self, guild_id: int, channel_id: int) -> bool:
-        try:
-            _ = self._event_channels_cache[guild_id][channel_id]
-            return True
-        except KeyError:
-            try:
-                _ = EventChannel.objects.get(guild_id=guild_id, channel_id=channel_id)
-            except EventChannel.DoesNotExist:
-                return False
-            else:
-                if guild_id not in self._event_channels_cache:
-                    self._event_channels_cache[guild_id] = {}
-                self._event_channels_cache[guild_id].update({channel_id: True})
-                return True
-
-    async def get_event_message(
-        self, channel_id: int, message_id: int
-    ) -> t.Optional[discord.Message]:
-        try:
-            return self._event_message_cache[message_id]
-        except KeyError:
-            try:
-                channel = self.bot.get_channel(channel_id)
-                msg = await channel.fetch_message(message_id)
-            except discord.HTTPException:
-                return None
-            else:
-                self._event_message_cache[message_id] = msg
-                return msg
-
-    async def get_event_for_message(self, message_id: int) -> t.Optional[EventItem]:
-        try:
-            event = self.event_class.objects.get(message_id=message_id)
-            return event
-        except (EventItem.DoesNotExist, Event.DoesNotExist):
-            return None
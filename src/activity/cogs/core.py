@@ -0,0 +1,298 @@
+import asyncio
+import datetime
+import logging
+import typing as t
+from collections import Counter
+
+import discord
+from discord.ext import commands, tasks
+from django.conf import settings
+from django.utils import timezone
+
+from activity.actors import AttendanceActors, AttendanceOp
+from activity.buffers import AttendanceWriteBuffer
+from activity.choices import EventStatus
+from activity.jobs import ReportJobQueue
+from activity.queues import EmbedUpdateDebouncer, ReactionRemovalQueue
+from activity.registries import (
+    ACTIVE_EVENT_STATUSES,
+    ActiveEventIndex,
+    AttendanceRegistry,
+    event_access,
+)
+from activity.retention import purge_batch
+from activity.stores import create_activity_store
+from evebot.utils.processes import ProcessJobPool
+from evebot.utils.queries import instrumented
+
+from .base import EventButtonsPersistentView, EventItem, MemberReactions
+
+if t.TYPE_CHECKING:
+    from evebot.bot import EveBot
+
+
+logger = logging.getLogger(__name__)
+
+
+class EventCore(commands.Cog, name="EventCore"):
+    """Event runtime shared by all event cogs.
+
+    Owns the attendance buffer and registries, the reaction listeners and the
+    persistent view. It is loaded once per bot, so every reaction is handled
+    exactly once.
+    """
+
+    def __init__(self, bot: "EveBot"):
+        self.bot: "EveBot" = bot
+
+        self.event_class = EventItem
+        self.event_class.bot = bot
+        self.event_class.core = self
+
+        self.stats: t.Counter[str] = Counter()
+
+        self._event_message_cache: dict[int, discord.Message] = {}
+
+        self.store = create_activity_store(
+            settings.EVE_DB_ASYNC_BACKEND,
+            self.bot.db_executor,
+            size=settings.EVE_DB_ASYNC_POOL_SIZE,
+        )
+        self.attendance_buffer = AttendanceWriteBuffer(
+            store=self.store,
+            flush_interval=settings.EVE_ATTENDANCE_FLUSH_INTERVAL / 1000,
+            flush_size=settings.EVE_ATTENDANCE_FLUSH_SIZE,
+        )
+        self.attendance_registry = AttendanceRegistry(store=self.store)
+        self.active_events: ActiveEventIndex[EventItem] = ActiveEventIndex()
+        self.reaction_removals = ReactionRemovalQueue(
+            bot, rate=settings.EVE_REACTION_REMOVAL_RATE
+        )
+        self.attendance_actors = AttendanceActors(core=self)
+        self.live_embeds = EmbedUpdateDebouncer(
+            bot,
+            render=EventItem.aevent_embed,
+            interval=settings.EVE_LIVE_EMBED_INTERVAL / 1000,
+        )
+        self.report_pool: t.Optional[ProcessJobPool] = None
+        if settings.EVE_REPORT_PROCESSES:
+            self.report_pool = ProcessJobPool(
+                settings.EVE_REPORT_PROCESSES,
+                concurrency=settings.EVE_REPORT_GUILD_CONCURRENCY,
+                timeout=settings.EVE_REPORT_TIMEOUT,
+            )
+        self.report_jobs = ReportJobQueue(
+            bot,
+            pool=self.report_pool,
+            workers=settings.EVE_REPORT_JOB_WORKERS,
+            progress_interval=settings.EVE_REPORT_JOB_PROGRESS_INTERVAL,
+        )
+
+    async def cog_load(self) -> None:
+        self.bot.add_view(EventButtonsPersistentView(core=self))
+
+        self.attendance_buffer.start()
+        if not event_access.loaded:
+            event_access.replace(*await self.store.load_access())
+        await self.warm_active_events()
+        await self.report_jobs.start()
+
+        self.cleanup_event_message_cache.start()
+        self.refresh_event_access.start()
+        if settings.EVE_RETENTION_DELETED_DAYS:
+            self.purge_deleted_events.change_interval(
+                hours=settings.EVE_RETENTION_INTERVAL
+            )
+            self.purge_deleted_events.start()
+
+    async def cog_unload(self) -> None:
+        self.cleanup_event_message_cache.cancel()
+        self.refresh_event_access.cancel()
+        self.purge_deleted_events.cancel()
+        await self.attendance_actors.close()
+        await self.reaction_removals.close()
+        await self.live_embeds.close()
+        # Записываем всё, что накопилось в буфере, перед остановкой
+        await self.attendance_buffer.close()
+        await self.store.close()
+        await self.report_jobs.close()
+        if self.report_pool is not None:
+            self.report_pool.shutdown(wait=False)
+
+    @tasks.loop(hours=1.0)
+    async def cleanup_event_message_cache(self):
+        self._event_message_cache.clear()
+
+    @tasks.loop(hours=1.0)
+    async def refresh_event_access(self):
+        # Сигналы не видят изменений из других процессов (веб), поэтому
+        # периодически подменяем снимок целиком
+        if self.refresh_event_access.current_loop:
+            event_access.replace(*await self.store.load_access())
+
+    @tasks.loop(hours=24.0)
+    async def purge_deleted_events(self):
+        if not self.purge_deleted_events.current_loop:
+            return
+        cutoff = timezone.now() - datetime.timedelta(
+            days=settings.EVE_RETENTION_DELETED_DAYS
+        )
+        events_total = attendances_total = 0
+        while True:
+            # Короткие транзакции с паузами, чтобы не мешать записи отметок
+            events, attendances = await self.bot.db_executor.run(
+                purge_batch, cutoff, settings.EVE_RETENTION_BATCH_SIZE
+            )
+            if not events and not attendances:
+                break
+            events_total += events
+            attendances_total += attendances
+            await asyncio.sleep(settings.EVE_RETENTION_PAUSE / 1000)
+        if events_total:
+            logger.info(
+                f"Purged {events_total} deleted events "
+                f"and {attendances_total} attendances"
+            )
+
+    @commands.Cog.listener()
+    @instrumented("on_raw_reaction_add")
+    async def on_raw_reaction_add(
+        self, payload: discord.RawReactionActionEvent
+    ) -> None:
+        # Проверим канал. Есть ли он в БД
+        if not self.is_event_channel(
+            guild_id=payload.guild_id, channel_id=payload.channel_id
+        ):
+            return
+
+        self.stats["reaction_add"] += 1
+
+        event = await self.get_event_for_message(message_id=payload.message_id)
+
+        member = payload.member
+
+        # Сначала проверяем есть ли событие для этого сообщения
+        if not event:
+            self.remove_reaction(payload, payload.emoji)
+            return
+
+        if event.status == EventStatus.FINISHED:
+            self.remove_reaction(payload, payload.emoji)
+            return
+
+        if member.bot:
+            return
+
+        if str(payload.emoji) in MemberReactions.emojis():
+            server = MemberReactions(str(payload.emoji)).attend_server
+            # Изменения участников события применяются по порядку в его очереди
+            self.attendance_actors.submit(event, AttendanceOp(member, server))
+        else:
+            self.remove_reaction(payload, payload.emoji)
+
+    @commands.Cog.listener()
+    @instrumented("on_raw_reaction_remove")
+    async def on_raw_reaction_remove(
+        self, payload: discord.RawReactionActionEvent
+    ) -> None:
+        self.reaction_removals.discard(
+            payload.channel_id, payload.message_id, payload.user_id, payload.emoji
+        )
+
+        event = await self.get_event_for_message(message_id=payload.message_id)
+
+        # Сначала проверяем есть ли событие для этого сообщения
+        if not event:
+            return
+
+        self.stats["reaction_remove"] += 1
+
+        member = payload.member or event.guild.get_member(payload.user_id)
+
+        if event.status == EventStatus.FINISHED:
+            return
+
+        if member.bot:
+            return
+
+        if str(payload.emoji) in MemberReactions.emojis():
+            server = MemberReactions(str(payload.emoji)).attend_server
+            self.attendance_actors.submit(
+                event, AttendanceOp(member, server, added=False)
+            )
+
+    def remove_reaction(
+        self,
+        payload: discord.RawReactionActionEvent,
+        emoji: t.Union[discord.PartialEmoji, str],
+    ) -> None:
+        self.reaction_removals.add(
+            payload.channel_id, payload.message_id, payload.user_id, emoji
+        )
+
+    def is_event_moderator(self, guild_id: int, member_id: int) -> bool:
+        return event_access.is_event_moderator(guild_id, member_id)
+
+    def is_event_channel(self, guild_id: int, channel_id: int) -> bool:
+        return event_access.is_event_channel(guild_id, channel_id)
+
+    async def get_event_message(
+        self, channel_id: int, message_id: int
+    ) -> t.Optional[discord.Message]:
+        try:
+            return self._event_message_cache[message_id]
+        except KeyError:
+            try:
+                channel = self.bot.get_channel(channel_id)
+                msg = await channel.fetch_message(message_id)
+            except discord.HTTPException:
+                return None
+            else:
+                self._event_message_cache[message_id] = msg
+                return msg
+
+    async def warm_active_events(self) -> None:
+        events = await self.bot.db_executor.run(
+            lambda: list(
+                self.event_class.objects.filter(
+                    status__in=ACTIVE_EVENT_STATUSES, message_id__isnull=False
+                )
+            )
+        )
+        self.active_events.warm(events)
+        logger.info(f"Active events index warmed: {len(events)} events")
+
+    async def get_event(self, event_id: int) -> EventItem:
+        """Event by id for the commands, raises ``DoesNotExist`` like ``get``.
+
+        An active event is the instance of the index, the one its attendance
+        operations and status changes go through.
+        """
+        event = self.active_events.get_by_id(event_id)
+        if event is not None:
+            return event
+        event = await self.bot.db_executor.run(
+            self.event_class.objects.get, id=event_id
+        )
+        self.active_events.add(event)
+        return event
+
+    async def get_event_for_message(self, message_id: int) -> t.Optional[EventItem]:
+        event = self.active_events.get(message_id)
+        if event is not None:
+            return event
+
+        if self.active_events.is_missing(message_id):
+            return None
+
+        # Закрытые события ложатся в свой кэш индекса, удаленные - в отрицательный
+        event = await self.store.get_event(self.event_class, message_id)
+        if event is None:
+            self.active_events.mark_missing(message_id)
+            return None
+        self.active_events.add(event)
+        return event
+
+
+async def setup(bot):
+    await bot.add_cog(EventCore(bot))
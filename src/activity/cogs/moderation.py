@@ -7,11 +7,12 @@ from dateutil.parser import parse
 from discord import app_commands
 from discord.ext import commands
 
+from activity.actors import AttendanceOp
 from activity.choices import AttendanceServer, EventStatus
 from activity.models import Event
 from evebot.utils import checks
+from evebot.utils.queries import instrumented
 
-from ..services import ActivityStatisticService
 from .base import (
     BaseEventCog,
     EventButtonsPersistentView,
@@ -84,11 +85,12 @@ class ModerEventCog(BaseEventCog):
             for value, label in AttendanceServer.choices
         ]
     )
+    @instrumented("/eventmod member add")
     async def event_mod_member_add(
         self, ctx: "GuildEveContext", member: discord.Member, server: str, event: int
     ) -> None:
         try:
-            event = self.event_class.objects.get(id=event)
+            event = await self.core.get_event(event)
 
             if event.status != EventStatus.FINISHED:
                 await ctx.send(
@@ -99,10 +101,20 @@ class ModerEventCog(BaseEventCog):
                 )
                 return
 
-            event.add_member_attendance(member=member, server=server)
+            # Правка идет через очередь события, как и отметки реакциями
+            op = AttendanceOp(member, AttendanceServer(server), moderated=True)
+            if not await self.core.attendance_actors.apply(event, op):
+                await ctx.send(
+                    f"\N{SKULL AND CROSSBONES} "
+                    f"Событие с номером **{event.id}** сейчас закрывается, "
+                    f"повторите позже.",
+                    ephemeral=True,
+                )
+                return
+            await event.aflush_attendances()
 
             event_message = await event.fetch_message()
-            embed = event_embed(event=event)
+            embed = await event.aevent_embed()
             await event_message.edit(content=None, embed=embed)
 
             await ctx.send(
@@ -131,16 +143,28 @@ class ModerEventCog(BaseEventCog):
     @app_commands.describe(
         member="Участник, которого надо удалить из события", event="Номер события"
     )
+    @instrumented("/eventmod member del")
     async def event_mod_member_del(
         self, ctx: "GuildEveContext", member: discord.Member, event: int
     ) -> None:
         try:
-            event = self.event_class.objects.get(id=event)
-            event.remove_member_attendance(member=member)
+            event = await self.core.get_event(event)
+
+            op = AttendanceOp(member, None, added=False, moderated=True)
+            if not await self.core.attendance_actors.apply(event, op):
+                await ctx.send(
+                    f"\N{SKULL AND CROSSBONES} "
+                    f"Событие с номером **{event.id}** сейчас закрывается, "
+                    f"повторите позже.",
+                    ephemeral=True,
+                )
+                return
+            await event.aflush_attendances()
 
             event_message = await event.fetch_message()
-            embed = event_embed(event=event)
+            embed = await event.aevent_embed()
             await event_message.edit(content=None, embed=embed)
+            self.core.live_embeds.invalidate(event.message_id)
 
             await ctx.send(
                 f"Удален участник {member.mention} из события "
@@ -166,14 +190,16 @@ class ModerEventCog(BaseEventCog):
     @app_commands.guild_only()
     @checks.event_channel_only()
     @checks.event_moderator_only()
+    @instrumented("/eventmod sync")
     async def event_sync(self, ctx: "GuildEveContext", event: int) -> None:
         try:
-            event: EventItem = EventItem.objects.get(id=event)
+            event: EventItem = await self.core.get_event(event)
 
             event_message = await event.fetch_message()
-            embed = event_embed(event=event)
+            embed = await event.aevent_embed()
 
             await event_message.edit(content=None, embed=embed)
+            self.core.live_embeds.invalidate(event.message_id)
 
             await ctx.send(
                 f"**Синхронизировано**\n"
@@ -199,14 +225,14 @@ class ModerEventCog(BaseEventCog):
     @app_commands.guild_only()
     @checks.event_channel_only()
     @checks.event_moderator_only()
+    @instrumented("/eventmod delete")
     async def event_delete(self, ctx: "GuildEveContext", event: int) -> None:
         try:
-            event: EventItem = EventItem.objects.get(id=event)
-            event.status = EventStatus.DELETED
-            event.save()
+            event: EventItem = await self.core.get_event(event)
+            await event.do_delete()
 
             event_message = await event.fetch_message()
-            embed = event_embed(event=event)
+            embed = await event.aevent_embed()
 
             await event_message.edit(content=None, embed=embed, view=None)
 
@@ -252,13 +278,15 @@ class ModerEventCog(BaseEventCog):
         title='Название события. По умолчанию "Сбор Арена"',
         schedule="Запланированное время сбора. Формат: 14:00",
     )
+    @instrumented("/event start")
     async def event_start(
         self, ctx: "GuildEveContext", title: t.Optional[str], schedule: str
     ) -> None:
         if not title:
             title = "Сбор Арена"
 
-        event = self.event_class.objects.create(
+        event = await self.bot.db_executor.run(
+            self.event_class.objects.create,
             guild_id=ctx.guild.id,
             channel_id=ctx.channel.id,
             member_id=ctx.author.id,
@@ -269,14 +297,15 @@ class ModerEventCog(BaseEventCog):
             status=EventStatus.STARTED,
         )
 
-        embed = event_embed(event=event)
-        event_buttons_view = EventButtonsPersistentView(cog=self)
+        embed = await event.aevent_embed()
+        event_buttons_view = EventButtonsPersistentView(core=self.core)
 
         message = await ctx.send(
             content="Призываю: @everyone\n", embed=embed, view=event_buttons_view
         )
 
-        event.save(message_id=message.id)
+        await event.asave(message_id=message.id)
+        self.core.active_events.add(event)
         for event_reaction in MemberReactions.emojis():
             await message.add_reaction(event_reaction)
 
@@ -294,6 +323,13 @@ class ModerEventCog(BaseEventCog):
     async def event_stats(self, ctx: "GuildEveContext") -> None:
         ...
 
+    async def send_statistics(
+        self, ctx: "GuildEveContext", method: str, **params
+    ) -> None:
+        # Отчет за большой период может строиться дольше жизни взаимодействия,
+        # поэтому команда только ставит его в очередь
+        await self.core.report_jobs.enqueue(ctx, method, **params)
+
     @event_stats.command(
         name="daterange",
         description="Статистика посещаемости за выбранный диапазон дат",
@@ -308,6 +344,7 @@ class ModerEventCog(BaseEventCog):
         start_date="Дата начала статистики. Форматы: 2024-01-01|2024-1-1|2024/1/1",
         end_date="Дата начала статистики. Форматы: 2024-01-01|2024-1-1|2024/1/1",
     )
+    @instrumented("/eventstats daterange")
     async def event_stats_date_range(
         self,
         ctx: "GuildEveContext",
@@ -316,11 +353,12 @@ class ModerEventCog(BaseEventCog):
     ) -> None:
         await ctx.defer(ephemeral=True)
 
-        statistic_service = ActivityStatisticService()
-        statistic_file = statistic_service.get_statistics_by_date_range(
-            start_date=start_date, end_date=end_date
+        await self.send_statistics(
+            ctx,
+            "get_statistics_by_date_range",
+            start_date=start_date,
+            end_date=end_date,
         )
-        await ctx.send("Все готово!", file=statistic_file, ephemeral=True)
 
     @event_stats.command(
         name="eventrange",
@@ -336,6 +374,7 @@ class ModerEventCog(BaseEventCog):
         start_id="ID события начала статистики.",
         end_id="ID события конца статистики.",
     )
+    @instrumented("/eventstats eventrange")
     async def event_stats_event_range(
         self,
         ctx: "GuildEveContext",
@@ -344,11 +383,9 @@ class ModerEventCog(BaseEventCog):
     ) -> None:
         await ctx.defer(ephemeral=True)
 
-        statistic_service = ActivityStatisticService()
-        statistic_file = statistic_service.get_statistics_by_event_range(
-            start_id=start_id, end_id=end_id
+        await self.send_statistics(
+            ctx, "get_statistics_by_event_range", start_id=start_id, end_id=end_id
         )
-        await ctx.send("Все готово!", file=statistic_file, ephemeral=True)
 
     @event_stats.command(
         name="events",
@@ -364,6 +401,7 @@ class ModerEventCog(BaseEventCog):
         event_ids="Список событий для статистики. "
         "Одно или более значений через пробел",
     )
+    @instrumented("/eventstats events")
     async def event_stats_event_list(
         self,
         ctx: "GuildEveContext",
@@ -371,11 +409,9 @@ class ModerEventCog(BaseEventCog):
     ) -> None:
         await ctx.defer(ephemeral=True)
 
-        statistic_service = ActivityStatisticService()
-        statistic_file = statistic_service.get_statistics_by_event_list(
-            event_ids=event_ids
+        await self.send_statistics(
+            ctx, "get_statistics_by_event_list", event_ids=list(event_ids)
         )
-        await ctx.send("Все готово!", file=statistic_file, ephemeral=True)
 
     # @event.command(
     #     name="evedbg",
@@ -402,7 +438,7 @@ class ModerEventCog(BaseEventCog):
     #     )
     #
     #     embed = event_embed(event=event)
-    #     event_buttons_view = EventButtonsPersistentView(cog=self)
+    #     event_buttons_view = EventButtonsPersistentView(core=self.core)
     #
     #     message = await ctx.send(
     #         content="Призываю: @everyone\n", embed=embed, view=event_buttons_view
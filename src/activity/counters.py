@@ -0,0 +1,52 @@
+import functools
+import operator
+import typing as t
+
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import SERVER_COUNT_FIELDS
+
+if t.TYPE_CHECKING:
+    from django.db.models import Model, QuerySet
+
+
+def server_count_subqueries(attendance_model: t.Type["Model"]) -> t.Dict[str, Coalesce]:
+    """Per-server headcount of an event computed from its attendance rows."""
+    return {
+        field: Coalesce(
+            Subquery(
+                attendance_model.objects.filter(event=OuterRef("pk"), server=server)
+                .order_by()
+                .values("event")
+                .annotate(count=Count("pk"))
+                .values("count")
+            ),
+            0,
+        )
+        for server, field in SERVER_COUNT_FIELDS.items()
+    }
+
+
+def reconcile_server_counts(
+    queryset: "QuerySet", attendance_model: t.Type["Model"]
+) -> int:
+    """Recompute the per-server counters of the drifted events of ``queryset``.
+
+    Returns the number of corrected events.
+    """
+    subqueries = server_count_subqueries(attendance_model)
+    drifted = functools.reduce(
+        operator.or_,
+        (~Q(**{field: F(f"actual_{field}")}) for field in subqueries),
+    )
+    event_ids = (
+        queryset.alias(
+            **{f"actual_{field}": subquery for field, subquery in subqueries.items()}
+        )
+        .filter(drifted)
+        .values_list("pk", flat=True)
+    )
+    return queryset.model._base_manager.filter(pk__in=list(event_ids)).update(
+        **subqueries
+    )
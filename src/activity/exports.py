@@ -0,0 +1,57 @@
+import csv
+import io
+import tempfile
+import typing as t
+
+import openpyxl
+from django.conf import settings
+
+Row = t.Sequence[t.Any]
+
+EXPORT_FORMATS = ("xlsx", "csv")
+
+
+def write_xlsx(fp: t.BinaryIO, headers: Row, rows: t.Iterable[Row]) -> None:
+    # В режиме write_only openpyxl не держит лист в памяти
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(list(headers))
+    for row in rows:
+        sheet.append(list(row))
+    workbook.save(fp)
+
+
+def write_csv(fp: t.BinaryIO, headers: Row, rows: t.Iterable[Row]) -> None:
+    text = io.TextIOWrapper(fp, encoding="utf-8", newline="")
+    writer = csv.writer(text)
+    writer.writerow(headers)
+    writer.writerows(rows)
+    text.flush()
+    # Файл нужен и после записи, не даем обертке его закрыть
+    text.detach()
+
+
+WRITERS = {"xlsx": write_xlsx, "csv": write_csv}
+
+
+def export_file(
+    headers: Row, rows: t.Iterable[Row], file_format: str = "xlsx"
+) -> t.BinaryIO:
+    """Write ``rows`` into a spooled temporary file and rewind it.
+
+    The file stays in memory up to ``EVE_EXPORT_SPOOL_SIZE`` bytes and moves to
+    disk after that, rows are consumed one by one.
+    """
+    try:
+        writer = WRITERS[file_format]
+    except KeyError:
+        raise ValueError(f"Unknown export format: {file_format}")
+
+    fp = tempfile.SpooledTemporaryFile(max_size=settings.EVE_EXPORT_SPOOL_SIZE)
+    try:
+        writer(fp, headers, rows)
+    except BaseException:
+        fp.close()
+        raise
+    fp.seek(0)
+    return fp
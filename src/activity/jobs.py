@@ -0,0 +1,316 @@
+import asyncio
+import datetime
+import logging
+import os
+import typing as t
+
+import discord
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from evebot.utils.processes import ProcessJobPool
+
+from .choices import ReportJobStatus
+from .models import ReportJob
+from .services import save_statistics_report
+
+if t.TYPE_CHECKING:
+    from evebot.bot import EveBot
+    from evebot.context import GuildEveContext
+
+
+logger = logging.getLogger(__name__)
+
+
+# Токен взаимодействия живет 15 минут, оставляем запас
+INTERACTION_TOKEN_TTL = datetime.timedelta(minutes=14)
+
+# Параметры отчетов, которые после JSON нужно вернуть в datetime
+DATETIME_PARAMS = ("start_date", "end_date")
+
+
+def create_job(**fields) -> ReportJob:
+    return ReportJob.objects.create(**fields)
+
+
+def set_job_message(job_id: int, message_id: int) -> None:
+    ReportJob.objects.filter(pk=job_id).update(
+        message_id=message_id, updated=timezone.now()
+    )
+
+
+def queue_position(job_id: int) -> int:
+    return ReportJob.objects.filter(
+        status=ReportJobStatus.PENDING, pk__lt=job_id
+    ).count()
+
+
+def claim_job(job_id: int) -> t.Optional[ReportJob]:
+    """Move a PENDING job to RUNNING, ``None`` if it is not pending anymore."""
+    now = timezone.now()
+    claimed = ReportJob.objects.filter(
+        pk=job_id, status=ReportJobStatus.PENDING
+    ).update(
+        status=ReportJobStatus.RUNNING,
+        attempts=F("attempts") + 1,
+        started=now,
+        updated=now,
+    )
+    if not claimed:
+        return None
+    return ReportJob.objects.get(pk=job_id)
+
+
+def finish_job(job_id: int, status: ReportJobStatus, error: str = "") -> None:
+    now = timezone.now()
+    ReportJob.objects.filter(pk=job_id).update(
+        status=status, error=error, finished=now, updated=now
+    )
+
+
+def recover_jobs(max_attempts: int, keep_days: int) -> t.List[int]:
+    """Requeue the jobs interrupted by a restart and return the pending ids.
+
+    A job which was already started ``max_attempts`` times is failed instead,
+    finished jobs older than ``keep_days`` are removed.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        running = ReportJob.objects.filter(status=ReportJobStatus.RUNNING)
+        running.filter(attempts__gte=max_attempts).update(
+            status=ReportJobStatus.FAILED,
+            error="Прервано перезапуском бота",
+            finished=now,
+            updated=now,
+        )
+        running.update(status=ReportJobStatus.PENDING, updated=now)
+        ReportJob.objects.filter(
+            status__in=[ReportJobStatus.DONE, ReportJobStatus.FAILED],
+            updated__lt=now - datetime.timedelta(days=keep_days),
+        ).delete()
+    return list(
+        ReportJob.objects.filter(status=ReportJobStatus.PENDING)
+        .order_by("id")
+        .values_list("id", flat=True)
+    )
+
+
+def decode_params(params: t.Dict[str, t.Any]) -> t.Dict[str, t.Any]:
+    return {
+        name: datetime.datetime.fromisoformat(value)
+        if name in DATETIME_PARAMS and isinstance(value, str)
+        else value
+        for name, value in params.items()
+    }
+
+
+def token_alive(job: ReportJob) -> bool:
+    return bool(job.interaction_token) and (
+        timezone.now() - job.created < INTERACTION_TOKEN_TTL
+    )
+
+
+class ReportJobQueue(object):
+    """Persistent queue of statistics reports.
+
+    Jobs are stored as :class:`ReportJob` rows and built by ``workers`` tasks,
+    in the report process pool when there is one. The progress message is
+    edited while a job runs, the file is sent as a followup while the
+    interaction token is alive and by DM after that. Jobs interrupted by a
+    restart are queued again by :meth:`start`.
+    """
+
+    def __init__(
+        self,
+        bot: "EveBot",
+        *,
+        pool: t.Optional[ProcessJobPool],
+        workers: int,
+        progress_interval: float,
+    ):
+        self.bot = bot
+        self.pool = pool
+        self.workers = workers
+        self.progress_interval = progress_interval
+
+        self._queue: asyncio.Queue[int] = asyncio.Queue()
+        self._workers: t.List[asyncio.Task] = []
+
+    def __len__(self) -> int:
+        return self._queue.qsize()
+
+    async def start(self) -> None:
+        job_ids = await self.bot.db_executor.run(
+            recover_jobs,
+            settings.EVE_REPORT_JOB_ATTEMPTS,
+            settings.EVE_REPORT_JOB_KEEP_DAYS,
+        )
+        for job_id in job_ids:
+            self._queue.put_nowait(job_id)
+        if job_ids:
+            logger.info(f"Report jobs recovered: {len(job_ids)} pending")
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def close(self) -> None:
+        # Незавершенные отчеты остаются RUNNING и будут перезапущены
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+
+    async def enqueue(self, ctx: "GuildEveContext", method: str, **params) -> ReportJob:
+        interaction = ctx.interaction
+        job = await self.bot.db_executor.run(
+            create_job,
+            guild_id=ctx.guild.id,
+            channel_id=ctx.channel.id,
+            member_id=ctx.author.id,
+            method=method,
+            params=params,
+            application_id=interaction.application_id if interaction else None,
+            interaction_token=interaction.token if interaction else "",
+        )
+        position = await self.bot.db_executor.run(queue_position, job.id)
+        text = f"\N{HOURGLASS} Отчет #{job.id} поставлен в очередь"
+        if position:
+            text += f", перед ним {position}"
+        text += ". Файл придет сюда или в личные сообщения"
+        message = await ctx.send(text, ephemeral=True)
+        job.message_id = message.id
+        await self.bot.db_executor.run(set_job_message, job.id, message.id)
+        self._queue.put_nowait(job.id)
+        return job
+
+    async def _work(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._process(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.exception(f"Report job {job_id} crashed: {exc}")
+
+    async def _process(self, job_id: int) -> None:
+        job = await self.bot.db_executor.run(claim_job, job_id)
+        if job is None:
+            return
+
+        ticker = asyncio.create_task(self._tick(job))
+        try:
+            path, filename, description = await self._build(job)
+        except TimeoutError:
+            await self._fail(
+                job, "Отчет не успел сформироваться, попробуйте уменьшить период"
+            )
+            return
+        except Exception as exc:
+            logger.exception(f"Report job {job.id} failed: {exc}")
+            await self._fail(job, str(exc))
+            return
+        finally:
+            ticker.cancel()
+
+        try:
+            where = await self._deliver(job, path, filename, description)
+        except discord.HTTPException as exc:
+            logger.error(f"Can't deliver report job {job.id}: {exc}")
+            await self._fail(job, "Не удалось отправить файл")
+            return
+        finally:
+            os.remove(path)
+
+        await self.bot.db_executor.run(finish_job, job.id, ReportJobStatus.DONE)
+        await self._progress(job, f"\N{WHITE HEAVY CHECK MARK} Отчет #{job.id} {where}")
+
+    async def _build(self, job: ReportJob) -> t.Tuple[str, str, str]:
+        params = decode_params(job.params)
+        if self.pool is None:
+            return await self.bot.db_executor.run(
+                save_statistics_report, job.method, **params
+            )
+        # Отчет строится в отдельном процессе и не блокирует обработку реакций
+        return await self.pool.run(
+            job.guild_id,
+            "activity.services.save_statistics_report",
+            job.method,
+            discard=lambda result: os.remove(result[0]),
+            **params,
+        )
+
+    async def _deliver(
+        self, job: ReportJob, path: str, filename: str, description: str
+    ) -> str:
+        content = f"Отчет #{job.id} готов!"
+        if token_alive(job):
+            try:
+                await self._webhook(job).send(
+                    content,
+                    file=discord.File(path, filename=filename, description=description),
+                    ephemeral=True,
+                )
+                return "готов"
+            except discord.HTTPException as exc:
+                logger.warning(f"Report job {job.id}: followup failed, {exc}")
+
+        user = self.bot.get_user(job.member_id) or await self.bot.fetch_user(
+            job.member_id
+        )
+        try:
+            await user.send(
+                content,
+                file=discord.File(path, filename=filename, description=description),
+            )
+            return "отправлен в личные сообщения"
+        except discord.Forbidden:
+            # Личные сообщения закрыты, отправляем в канал команды
+            channel = self.bot.get_partial_messageable(job.channel_id)
+            await channel.send(
+                f"<@{job.member_id}> {content}",
+                file=discord.File(path, filename=filename, description=description),
+                allowed_mentions=discord.AllowedMentions(users=[user]),
+            )
+            return "отправлен в канал"
+
+    async def _fail(self, job: ReportJob, error: str) -> None:
+        await self.bot.db_executor.run(
+            finish_job, job.id, ReportJobStatus.FAILED, error
+        )
+        await self._progress(
+            job, f"\N{SKULL AND CROSSBONES} Отчет #{job.id} не сформирован\n\n> {error}"
+        )
+
+    async def _tick(self, job: ReportJob) -> None:
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        while True:
+            elapsed = int(loop.time() - started)
+            await self._progress(
+                job,
+                f"\N{HOURGLASS WITH FLOWING SAND} Отчет #{job.id} формируется, "
+                f"прошло {elapsed // 60}:{elapsed % 60:02d}",
+            )
+            await asyncio.sleep(self.progress_interval)
+
+    def _webhook(self, job: ReportJob) -> discord.Webhook:
+        return discord.Webhook.partial(
+            job.application_id, job.interaction_token, client=self.bot
+        )
+
+    async def _progress(self, job: ReportJob, content: str) -> None:
+        if job.message_id is None:
+            return
+        try:
+            if job.interaction_token:
+                # Эфемерное сообщение редактируется только по живому токену
+                if token_alive(job):
+                    await self._webhook(job).edit_message(
+                        job.message_id, content=content
+                    )
+            else:
+                channel = self.bot.get_partial_messageable(job.channel_id)
+                await channel.get_partial_message(job.message_id).edit(content=content)
+        except discord.HTTPException as exc:
+            logger.warning(f"Can't update progress of report job {job.id}: {exc}")
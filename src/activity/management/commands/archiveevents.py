@@ -0,0 +1,37 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from activity.archive import ArchiveError, EventArchive
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves finished, canceled and deleted events older than the cutoff, with "
+        "their attendances, into Parquet files on the common storage."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=365,
+            help="Archive events older than this many days.",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - datetime.timedelta(days=options["days"])
+        try:
+            events, attendances = EventArchive().archive(
+                cutoff=cutoff, batch_size=options["batch_size"]
+            )
+        except ArchiveError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Archived {events} events and {attendances} attendances "
+                f"created before {cutoff:%Y-%m-%d %H:%M}"
+            )
+        )
@@ -0,0 +1,66 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from activity import partitions
+
+
+class Command(BaseCommand):
+    help = (
+        "Manages the monthly partitions of the attendance table (PostgreSQL). "
+        "'convert' turns the current table into a partitioned one, 'maintain' "
+        "pre-creates future partitions and detaches the old ones."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("action", choices=["convert", "maintain"])
+        parser.add_argument(
+            "--ahead",
+            type=int,
+            default=settings.DATABASE_ATTENDANCE_PARTITIONS_AHEAD,
+            help="How many future months to create.",
+        )
+        parser.add_argument(
+            "--keep",
+            type=int,
+            default=settings.DATABASE_ATTENDANCE_PARTITIONS_KEEP,
+            help="How many past months to keep attached, 0 keeps all.",
+        )
+        parser.add_argument(
+            "--drop",
+            action="store_true",
+            help="Drop the detached partitions instead of keeping them as tables.",
+        )
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_ATTENDANCE_PARTITIONING:
+            raise CommandError("DATABASE_ATTENDANCE_PARTITIONING is disabled.")
+        if connection.vendor != "postgresql":
+            raise CommandError("Partitioning is supported on PostgreSQL only.")
+
+        if options["action"] == "convert":
+            if partitions.is_partitioned():
+                raise CommandError("The attendance table is already partitioned.")
+            created = partitions.convert_to_partitioned(ahead=options["ahead"])
+            self.stdout.write(
+                self.style.SUCCESS(f"Converted, {len(created)} partitions created")
+            )
+            return
+
+        if not partitions.is_partitioned():
+            raise CommandError("The attendance table is not partitioned yet.")
+
+        created = partitions.create_partitions(ahead=options["ahead"])
+        for name in created:
+            self.stdout.write(f"Created {name}")
+
+        if options["keep"]:
+            detached = partitions.detach_partitions(
+                keep=options["keep"], drop=options["drop"]
+            )
+            for name in detached:
+                self.stdout.write(
+                    f"{'Dropped' if options['drop'] else 'Detached'} {name}"
+                )
+
+        self.stdout.write(self.style.SUCCESS("Partitions are up to date"))
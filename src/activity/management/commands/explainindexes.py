@@ -0,0 +1,151 @@
+import datetime
+import random
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connection
+from django.test.utils import setup_databases, teardown_databases
+from django.utils import timezone
+
+from activity.choices import AttendanceServer, EventStatus
+from activity.models import Event, EventAttendance, EventChannel, EventModerator
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates a throwaway test database, fills it with a synthetic dataset and "
+        "prints EXPLAIN of the bot queries without and with the activity indexes. "
+        "The configured database is never touched, the test one is dropped at "
+        "the end."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--guilds", type=int, default=20)
+        parser.add_argument("--events", type=int, default=50_000)
+        parser.add_argument("--members", type=int, default=20)
+
+    def queries(self, sample: Event):
+        start = sample.created - datetime.timedelta(days=7)
+        return {
+            "event by message_id": Event.objects.filter(message_id=sample.message_id),
+            "active events": Event.objects.filter(
+                status__in=[EventStatus.PENDING, EventStatus.STARTED],
+                message_id__isnull=False,
+            ),
+            "latest events": Event.objects.all()[:50],
+            "event channel": EventChannel.objects.filter(
+                guild_id=sample.guild_id, channel_id=sample.channel_id
+            ),
+            "event moderator": EventModerator.objects.filter(
+                guild_id=sample.guild_id, member_id=sample.member_id
+            ),
+            "stats by date range": EventAttendance.objects.filter(
+                event__created__gte=start,
+                event__created__lte=sample.created,
+                event__status=EventStatus.FINISHED,
+            ),
+        }
+
+    def fill(self, guilds: int, events: int, members: int) -> Event:
+        now = timezone.now()
+        statuses = list(EventStatus)
+        servers = list(AttendanceServer)
+
+        EventChannel.objects.bulk_create(
+            EventChannel(guild_id=guild_id, channel_id=guild_id * 1000 + channel)
+            for guild_id in range(1, guilds + 1)
+            for channel in range(5)
+        )
+        EventModerator.objects.bulk_create(
+            EventModerator(guild_id=guild_id, member_id=guild_id * 1000 + member)
+            for guild_id in range(1, guilds + 1)
+            for member in range(10)
+        )
+        Event.objects.bulk_create(
+            (
+                Event(
+                    guild_id=number % guilds + 1,
+                    channel_id=(number % guilds + 1) * 1000,
+                    message_id=10**12 + number,
+                    member_id=(number % guilds + 1) * 1000,
+                    title=f"Event {number}",
+                    status=random.choices(statuses, weights=[1, 1, 80, 8, 10])[0],
+                )
+                for number in range(events)
+            ),
+            batch_size=5000,
+        )
+        synthetic = Event._base_manager.filter(message_id__gte=10**12)
+        event_ids = list(synthetic.order_by("id").values_list("id", flat=True))
+
+        # auto_now_add не дает задать дату при создании
+        for number in range(0, len(event_ids), 1000):
+            synthetic.filter(id__gte=event_ids[number]).update(
+                created=now - datetime.timedelta(hours=(events - number) // 10)
+            )
+
+        EventAttendance.objects.bulk_create(
+            (
+                EventAttendance(
+                    event_id=event_id,
+                    member_id=member,
+                    member_name=f"member{member}",
+                    server=random.choice(servers),
+                    event_created=event_created,
+                )
+                for event_id, event_created in synthetic.values_list("id", "created")
+                for member in range(random.randint(0, members))
+            ),
+            batch_size=5000,
+        )
+        return synthetic.get(id=event_ids[len(event_ids) // 2])
+
+    def analyze(self) -> None:
+        if connection.vendor in ("postgresql", "sqlite"):
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+
+    def explain(self, title: str, sample: Event) -> None:
+        self.analyze()
+        self.stdout.write(self.style.MIGRATE_HEADING(f"=== {title} ==="))
+        for name, queryset in self.queries(sample).items():
+            self.stdout.write(self.style.MIGRATE_LABEL(name))
+            self.stdout.write(queryset.explain())
+            self.stdout.write("")
+
+    def handle(self, *args, **options):
+        indexes = [
+            (model, index)
+            for model in (Event, EventChannel, EventModerator)
+            for index in model._meta.indexes
+        ]
+        constraints = [
+            (model, constraint)
+            for model in (Event,)
+            for constraint in model._meta.constraints
+        ]
+
+        # Схема и данные меняются только в тестовой базе, рабочие таблицы и их
+        # индексы не блокируются
+        old_config = setup_databases(
+            verbosity=options["verbosity"],
+            interactive=False,
+            aliases={DEFAULT_DB_ALIAS},
+        )
+        try:
+            sample = self.fill(options["guilds"], options["events"], options["members"])
+
+            with connection.schema_editor() as editor:
+                for model, index in indexes:
+                    editor.remove_index(model, index)
+                for model, constraint in constraints:
+                    editor.remove_constraint(model, constraint)
+            self.explain("before", sample)
+
+            with connection.schema_editor() as editor:
+                for model, index in indexes:
+                    editor.add_index(model, index)
+                for model, constraint in constraints:
+                    editor.add_constraint(model, constraint)
+            self.explain("after", sample)
+        finally:
+            teardown_databases(old_config, verbosity=options["verbosity"])
@@ -0,0 +1,59 @@
+import datetime
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from activity.retention import purge_batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Hard-deletes deleted events older than the retention age, with their "
+        "attendances, in short batches."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=settings.EVE_RETENTION_DELETED_DAYS,
+            help="Purge events deleted more than this many days ago. "
+            "Required when EVE_RETENTION_DELETED_DAYS is 0.",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=settings.EVE_RETENTION_BATCH_SIZE
+        )
+        parser.add_argument(
+            "--pause",
+            type=int,
+            default=settings.EVE_RETENTION_PAUSE,
+            help="Pause between batches, in milliseconds.",
+        )
+
+    def handle(self, *args, **options):
+        # 0 - удаление выключено, а не "удалить все"
+        if options["days"] <= 0:
+            raise CommandError(
+                "Purging is disabled: pass a positive --days "
+                "or set EVE_RETENTION_DELETED_DAYS"
+            )
+        cutoff = timezone.now() - datetime.timedelta(days=options["days"])
+        events_total = attendances_total = 0
+        while True:
+            events, attendances = purge_batch(cutoff, options["batch_size"])
+            if not events and not attendances:
+                break
+            events_total += events
+            attendances_total += attendances
+            if options["verbosity"] > 1:
+                self.stdout.write(f"Deleted {events} events, {attendances} rows")
+            time.sleep(options["pause"] / 1000)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Purged {events_total} events and {attendances_total} attendances "
+                f"deleted before {cutoff:%Y-%m-%d %H:%M}"
+            )
+        )
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from activity.models import EventAttendance, EventAttendanceRollup
+from activity.rollups import rebuild_rollup
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuilds the attendance rollup from the attendances of finished events, "
+        "archived ones included."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        rows = rebuild_rollup(
+            EventAttendance, EventAttendanceRollup, batch_size=options["batch_size"]
+        )
+        self.stdout.write(self.style.SUCCESS(f"Rollup rebuilt: {rows} rows"))
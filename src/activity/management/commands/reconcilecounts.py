@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from activity.counters import reconcile_server_counts
+from activity.models import Event, EventAttendance
+
+
+class Command(BaseCommand):
+    help = "Recomputes the per-server headcount columns of events from attendances."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "events", nargs="*", type=int, help="Event ids, all events by default."
+        )
+
+    def handle(self, *args, **options):
+        queryset = Event._base_manager.all()
+        if options["events"]:
+            queryset = queryset.filter(id__in=options["events"])
+
+        fixed = reconcile_server_counts(queryset, EventAttendance)
+        self.stdout.write(self.style.SUCCESS(f"Reconciled {fixed} events"))
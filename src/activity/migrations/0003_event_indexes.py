@@ -0,0 +1,71 @@
+# Generated by Django 5.0.14 on 2026-10-18 12:32
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def dedupe_message_ids(apps, schema_editor):
+    # Уникальный индекс не создастся, пока у нескольких событий один message_id.
+    # Сообщение оставляем последнему неудаленному событию, у остальных обнуляем
+    Event = apps.get_model("activity", "Event")
+    duplicates = (
+        Event._base_manager.filter(message_id__isnull=False)
+        .values("message_id")
+        .annotate(count=Count("id"))
+        .filter(count__gt=1)
+        .values_list("message_id", flat=True)
+    )
+    for message_id in list(duplicates):
+        events = list(
+            Event._base_manager.filter(message_id=message_id).values_list(
+                "id", "status"
+            )
+        )
+        keep = max(events, key=lambda event: (event[1] != "DELETED", event[0]))[0]
+        Event._base_manager.filter(message_id=message_id).exclude(id=keep).update(
+            message_id=None
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("activity", "0002_alter_event_status"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="event",
+            index=models.Index(
+                fields=["status", "created"], name="event-status-created"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="event",
+            index=models.Index(
+                condition=models.Q(("status", "DELETED"), _negated=True),
+                fields=["-id"],
+                name="event-not-deleted",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="eventchannel",
+            index=models.Index(
+                fields=["guild_id", "channel_id"], name="event-channel-guild-channel"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="eventmoderator",
+            index=models.Index(
+                fields=["guild_id", "member_id"], name="event-moderator-guild-member"
+            ),
+        ),
+        migrations.RunPython(dedupe_message_ids, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="event",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("message_id__isnull", False)),
+                fields=("message_id",),
+                name="event-message-id",
+            ),
+        ),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 5.0.14 on 2026-10-18 12:34
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+# Серверы на момент миграции, не зависит от текущего AttendanceServer
+SERVER_COUNT_FIELDS = {
+    "Server 1": "server_one_count",
+    "Server 2": "server_two_count",
+    "Server 3": "server_three_count",
+    "Server 4": "server_four_count",
+    "Server 5": "server_five_count",
+    "Server 6": "server_six_count",
+}
+
+
+def fill_server_counts(apps, schema_editor):
+    Event = apps.get_model("activity", "Event")
+    EventAttendance = apps.get_model("activity", "EventAttendance")
+    Event._base_manager.update(
+        **{
+            field: Coalesce(
+                Subquery(
+                    EventAttendance.objects.filter(event=OuterRef("pk"), server=server)
+                    .order_by()
+                    .values("event")
+                    .annotate(count=Count("pk"))
+                    .values("count")
+                ),
+                0,
+            )
+            for server, field in SERVER_COUNT_FIELDS.items()
+        }
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("activity", "0003_event_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="event",
+            name="server_five_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="event",
+            name="server_four_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="event",
+            name="server_one_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="event",
+            name="server_six_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="event",
+            name="server_three_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="event",
+            name="server_two_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_server_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,92 @@
+# Generated by Django 5.0.14 on 2026-10-18 12:36
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def fill_rollup(apps, schema_editor):
+    EventAttendance = apps.get_model("activity", "EventAttendance")
+    EventAttendanceRollup = apps.get_model("activity", "EventAttendanceRollup")
+    rows = (
+        EventAttendance.objects.filter(event__status="FINISHED")
+        .annotate(day=TruncDate("event__created"))
+        .values("day", "event__guild_id", "member_id", "server", "member_display_name")
+        .order_by()
+        .annotate(count=Count("id"))
+    )
+    EventAttendanceRollup.objects.bulk_create(
+        (
+            EventAttendanceRollup(
+                day=row["day"],
+                guild_id=row["event__guild_id"],
+                member_id=row["member_id"],
+                server=row["server"],
+                member_display_name=row["member_display_name"],
+                count=row["count"],
+            )
+            for row in rows.iterator()
+        ),
+        batch_size=5000,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("activity", "0004_event_server_counts"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EventAttendanceRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                ("guild_id", models.BigIntegerField()),
+                ("member_id", models.BigIntegerField()),
+                ("member_display_name", models.CharField(blank=True, max_length=255)),
+                (
+                    "server",
+                    models.CharField(
+                        choices=[
+                            ("Server 1", "Сервер 1"),
+                            ("Server 2", "Сервер 2"),
+                            ("Server 3", "Сервер 3"),
+                            ("Server 4", "Сервер 4"),
+                            ("Server 5", "Сервер 5"),
+                            ("Server 6", "Сервер 6"),
+                        ],
+                        max_length=32,
+                    ),
+                ),
+                ("count", models.IntegerField(default=0)),
+                ("created", models.DateTimeField(auto_now_add=True)),
+                ("updated", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "ordering": ["-id"],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="eventattendancerollup",
+            constraint=models.UniqueConstraint(
+                fields=(
+                    "day",
+                    "guild_id",
+                    "member_id",
+                    "server",
+                    "member_display_name",
+                ),
+                name="event-attendance-rollup",
+            ),
+        ),
+        migrations.RunPython(fill_rollup, migrations.RunPython.noop),
+    ]
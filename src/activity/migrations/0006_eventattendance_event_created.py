@@ -0,0 +1,45 @@
+# Generated by Django 5.0.14 on 2026-10-18 12:40
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def fill_event_created(apps, schema_editor):
+    Event = apps.get_model("activity", "Event")
+    EventAttendance = apps.get_model("activity", "EventAttendance")
+    EventAttendance.objects.update(
+        event_created=Subquery(
+            Event.objects.filter(pk=OuterRef("event_id")).values("created")[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("activity", "0005_event_attendance_rollup"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="eventattendance",
+            name="event_created",
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunPython(fill_event_created, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="eventattendance",
+            name="event_created",
+            field=models.DateTimeField(),
+        ),
+        migrations.RemoveConstraint(
+            model_name="eventattendance",
+            name="event-attendance-member",
+        ),
+        migrations.AddConstraint(
+            model_name="eventattendance",
+            constraint=models.UniqueConstraint(
+                fields=("event", "member_id", "event_created"),
+                name="event-attendance-member",
+            ),
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.0.14 on 2026-10-18 12:57
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("activity", "0006_eventattendance_event_created"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ReportJob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("guild_id", models.BigIntegerField()),
+                ("channel_id", models.BigIntegerField()),
+                ("member_id", models.BigIntegerField()),
+                ("method", models.CharField(max_length=64)),
+                (
+                    "params",
+                    models.JSONField(
+                        default=dict,
+                        encoder=django.core.serializers.json.DjangoJSONEncoder,
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("PENDING", "в очереди"),
+                            ("RUNNING", "формируется"),
+                            ("DONE", "готово"),
+                            ("FAILED", "ошибка"),
+                        ],
+                        default="PENDING",
+                        max_length=32,
+                    ),
+                ),
+                ("attempts", models.PositiveSmallIntegerField(default=0)),
+                ("error", models.TextField(blank=True, default="")),
+                ("application_id", models.BigIntegerField(null=True)),
+                (
+                    "interaction_token",
+                    models.CharField(blank=True, default="", max_length=255),
+                ),
+                ("message_id", models.BigIntegerField(null=True)),
+                ("started", models.DateTimeField(null=True)),
+                ("finished", models.DateTimeField(null=True)),
+                ("created", models.DateTimeField(auto_now_add=True)),
+                ("updated", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "ordering": ["-id"],
+                "indexes": [
+                    models.Index(fields=["status", "id"], name="report-job-status")
+                ],
+            },
+        ),
+    ]
@@ -1,6 +1,9 @@
+import typing as t
+
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 
-from .choices import AttendanceServer, EventStatus
+from .choices import AttendanceServer, EventStatus, ReportJobStatus
 from .managers import EventManager
 
 
@@ -15,6 +18,11 @@ class EventChannel(models.Model):
         ordering = [
             "-id",
         ]
+        indexes = [
+            models.Index(
+                fields=["guild_id", "channel_id"], name="event-channel-guild-channel"
+            ),
+        ]
 
 
 class EventModerator(models.Model):
@@ -29,6 +37,17 @@ class EventModerator(models.Model):
         ordering = [
             "-id",
         ]
+        indexes = [
+            models.Index(
+                fields=["guild_id", "member_id"], name="event-moderator-guild-member"
+            ),
+        ]
+
+
+# Поле счетчика участников события для каждого сервера
+SERVER_COUNT_FIELDS: t.Dict[str, str] = {
+    server.value: f"server_{server.name.lower()}_count" for server in AttendanceServer
+}
 
 
 class Event(models.Model):
@@ -48,6 +67,13 @@ class Event(models.Model):
         max_length=32, choices=EventStatus.choices, default=EventStatus.PENDING
     )
 
+    server_one_count = models.PositiveIntegerField(default=0)
+    server_two_count = models.PositiveIntegerField(default=0)
+    server_three_count = models.PositiveIntegerField(default=0)
+    server_four_count = models.PositiveIntegerField(default=0)
+    server_five_count = models.PositiveIntegerField(default=0)
+    server_six_count = models.PositiveIntegerField(default=0)
+
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
 
@@ -57,6 +83,45 @@ class Event(models.Model):
         ordering = [
             "-id",
         ]
+        indexes = [
+            models.Index(fields=["status", "created"], name="event-status-created"),
+            # EventManager исключает удаленные события из каждого запроса
+            models.Index(
+                fields=["-id"],
+                condition=~models.Q(status=EventStatus.DELETED),
+                name="event-not-deleted",
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["message_id"],
+                condition=models.Q(message_id__isnull=False),
+                name="event-message-id",
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        # Счетчики меняются только через F() вместе с записью участников,
+        # обычное сохранение события их не перезаписывает
+        if (
+            not self._state.adding
+            and kwargs.get("update_fields") is None
+            and not kwargs.get("force_insert")
+        ):
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in SERVER_COUNT_FIELDS.values()
+            ]
+        super().save(*args, **kwargs)
+
+    @property
+    def server_counts(self) -> t.Dict[AttendanceServer, int]:
+        return {
+            AttendanceServer(server): getattr(self, field)
+            for server, field in SERVER_COUNT_FIELDS.items()
+        }
 
 
 class EventAttendance(models.Model):
@@ -70,6 +135,9 @@ class EventAttendance(models.Model):
 
     server = models.CharField(max_length=32, choices=AttendanceServer.choices)
 
+    # Копия Event.created - ключ секционирования таблицы по месяцам
+    event_created = models.DateTimeField()
+
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
 
@@ -78,7 +146,80 @@ class EventAttendance(models.Model):
             "-id",
         ]
         constraints = [
+            # Уникальные ограничения секционированной таблицы обязаны
+            # включать ключ секционирования
             models.UniqueConstraint(
-                fields=["event", "member_id"], name="event-attendance-member"
+                fields=["event", "member_id", "event_created"],
+                name="event-attendance-member",
             ),
         ]
+
+    def save(self, *args, **kwargs):
+        if self.event_created is None:
+            self.event_created = self.event.created
+        super().save(*args, **kwargs)
+
+
+class EventAttendanceRollup(models.Model):
+    # Сколько завершенных событий участник посетил за день на каждом сервере
+    day = models.DateField()
+    guild_id = models.BigIntegerField()
+    member_id = models.BigIntegerField()
+    member_display_name = models.CharField(max_length=255, blank=True)
+    server = models.CharField(max_length=32, choices=AttendanceServer.choices)
+    count = models.IntegerField(default=0)
+
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = [
+            "-id",
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=[
+                    "day",
+                    "guild_id",
+                    "member_id",
+                    "server",
+                    "member_display_name",
+                ],
+                name="event-attendance-rollup",
+            ),
+        ]
+
+
+class ReportJob(models.Model):
+    # Отчет, заказанный командой eventstats и построенный в фоне
+    guild_id = models.BigIntegerField()
+    channel_id = models.BigIntegerField()
+    member_id = models.BigIntegerField()
+
+    method = models.CharField(max_length=64)
+    params = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+
+    status = models.CharField(
+        max_length=32, choices=ReportJobStatus.choices, default=ReportJobStatus.PENDING
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(default="", blank=True)
+
+    # Сообщение с ходом выполнения: followup взаимодействия (пока жив токен)
+    # или обычное сообщение в канале для текстовой команды
+    application_id = models.BigIntegerField(null=True)
+    interaction_token = models.CharField(max_length=255, default="", blank=True)
+    message_id = models.BigIntegerField(null=True)
+
+    started = models.DateTimeField(null=True)
+    finished = models.DateTimeField(null=True)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = [
+            "-id",
+        ]
+        indexes = [
+            models.Index(fields=["status", "id"], name="report-job-status"),
+        ]
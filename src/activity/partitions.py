@@ -0,0 +1,200 @@
+import datetime
+import logging
+import re
+import typing as t
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import EventAttendance
+
+logger = logging.getLogger(__name__)
+
+
+PARTITION_NAME_RE = re.compile(r"_y(?P<year>\d{4})m(?P<month>\d{2})$")
+
+
+def _table() -> str:
+    return EventAttendance._meta.db_table
+
+
+def _qn(name: str) -> str:
+    return connection.ops.quote_name(name)
+
+
+def month_start(value: datetime.date) -> datetime.date:
+    return value.replace(day=1)
+
+
+def add_months(value: datetime.date, months: int) -> datetime.date:
+    month = value.month - 1 + months
+    return value.replace(year=value.year + month // 12, month=month % 12 + 1, day=1)
+
+
+def partition_name(month: datetime.date) -> str:
+    return f"{_table()}_y{month.year:04d}m{month.month:02d}"
+
+
+def _bound(month: datetime.date) -> str:
+    # Границы секций - начало месяца в часовом поясе проекта
+    start = timezone.make_aware(datetime.datetime.combine(month, datetime.time.min))
+    return start.isoformat()
+
+
+def is_partitioned() -> bool:
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relkind = 'p' FROM pg_class c WHERE c.oid = to_regclass(%s)",
+            [_table()],
+        )
+        row = cursor.fetchone()
+    return bool(row and row[0])
+
+
+def partitions() -> t.Dict[datetime.date, str]:
+    """Attached monthly partitions, ``month -> table name``."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(%s)",
+            [_table()],
+        )
+        names = [name for (name,) in cursor.fetchall()]
+
+    result = {}
+    for name in names:
+        match = PARTITION_NAME_RE.search(name)
+        if match:
+            month = datetime.date(int(match["year"]), int(match["month"]), 1)
+            result[month] = name
+    return result
+
+
+def create_partitions(ahead: int) -> t.List[str]:
+    """Create the partitions of the current month and ``ahead`` next months."""
+    existing = partitions()
+    current = month_start(timezone.localdate())
+    created = []
+    for offset in range(ahead + 1):
+        month = add_months(current, offset)
+        if month not in existing:
+            # Строки будущего месяца могли уже попасть в DEFAULT секцию
+            created.append(split_default_partition(month))
+    return created
+
+
+def detach_partitions(keep: int, drop: bool = False) -> t.List[str]:
+    """Detach the partitions older than ``keep`` months."""
+    oldest = add_months(month_start(timezone.localdate()), -keep)
+    detached = []
+    with connection.cursor() as cursor:
+        for month, name in sorted(partitions().items()):
+            if month >= oldest:
+                continue
+            cursor.execute(f"ALTER TABLE {_qn(_table())} DETACH PARTITION {_qn(name)}")
+            if drop:
+                cursor.execute(f"DROP TABLE {_qn(name)}")
+            detached.append(name)
+    return detached
+
+
+def convert_to_partitioned(ahead: int) -> t.List[str]:
+    """Replace the attendance table with a monthly partitioned copy.
+
+    Rows are copied in one transaction under an exclusive lock, the constraints
+    and indexes of the old table are recreated on the new one. The primary key
+    becomes ``(id, event_created)``, Postgres requires the partition key in it.
+    """
+    table = _table()
+    new_table = f"{table}_partitioned"
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"LOCK TABLE {_qn(table)} IN ACCESS EXCLUSIVE MODE")
+
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = to_regclass(%s) AND contype IN ('u', 'f', 'c')",
+            [table],
+        )
+        constraints = cursor.fetchall()
+        cursor.execute(
+            "SELECT indexdef FROM pg_indexes WHERE tablename = %s "
+            "AND indexname NOT IN ("
+            "  SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(%s)"
+            ")",
+            [table, table],
+        )
+        indexes = [indexdef for (indexdef,) in cursor.fetchall()]
+
+        cursor.execute(f"SELECT min(event_created) FROM {_qn(table)}")
+        (first,) = cursor.fetchone()
+
+        cursor.execute(
+            f"CREATE TABLE {_qn(new_table)} (LIKE {_qn(table)} "
+            f"INCLUDING DEFAULTS INCLUDING IDENTITY INCLUDING STORAGE) "
+            f"PARTITION BY RANGE (event_created)"
+        )
+        cursor.execute(
+            f"CREATE TABLE {_qn(table + '_default')} "
+            f"PARTITION OF {_qn(new_table)} DEFAULT"
+        )
+        cursor.execute(f"INSERT INTO {_qn(new_table)} SELECT * FROM {_qn(table)}")
+        cursor.execute(f"DROP TABLE {_qn(table)}")
+        cursor.execute(f"ALTER TABLE {_qn(new_table)} RENAME TO {_qn(table)}")
+        cursor.execute(f"ALTER TABLE {_qn(table)} ADD PRIMARY KEY (id, event_created)")
+
+        for name, definition in constraints:
+            cursor.execute(
+                f"ALTER TABLE {_qn(table)} ADD CONSTRAINT {_qn(name)} {definition}"
+            )
+        for indexdef in indexes:
+            cursor.execute(indexdef)
+
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence(%s, 'id'), "
+            f"coalesce((SELECT max(id) FROM {_qn(table)}), 0) + 1, false)",
+            [table],
+        )
+
+    # Все строки попали в DEFAULT секцию, разносим их по месяцам
+    last = add_months(month_start(timezone.localdate()), ahead)
+    month = month_start(timezone.localdate(first)) if first is not None else last
+    created = []
+    while month <= last:
+        created.append(split_default_partition(month))
+        month = add_months(month, 1)
+    logger.info(f"{table} converted to partitioned table: {len(created)} partitions")
+    return created
+
+
+def split_default_partition(month: datetime.date) -> str:
+    """Move the rows of ``month`` from the DEFAULT partition to their own one."""
+    table = _table()
+    default = f"{table}_default"
+    name = partition_name(month)
+    start, end = _bound(month), _bound(add_months(month, 1))
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {_qn(table)} DETACH PARTITION {_qn(default)}")
+        cursor.execute(
+            f"CREATE TABLE {_qn(name)} PARTITION OF {_qn(table)} "
+            f"FOR VALUES FROM (%s) TO (%s)",
+            [start, end],
+        )
+        cursor.execute(
+            f"INSERT INTO {_qn(table)} SELECT * FROM {_qn(default)} "
+            f"WHERE event_created >= %s AND event_created < %s",
+            [start, end],
+        )
+        cursor.execute(
+            f"DELETE FROM {_qn(default)} "
+            f"WHERE event_created >= %s AND event_created < %s",
+            [start, end],
+        )
+        cursor.execute(
+            f"ALTER TABLE {_qn(table)} ATTACH PARTITION {_qn(default)} DEFAULT"
+        )
+    return name
@@ -0,0 +1,210 @@
+import asyncio
+import logging
+import typing as t
+from collections import Counter
+
+import discord
+
+from evebot.utils.queries import query_scope
+
+if t.TYPE_CHECKING:
+    from evebot.bot import EveBot
+
+
+logger = logging.getLogger(__name__)
+
+
+EmojiType = t.Union[discord.PartialEmoji, discord.Emoji, str]
+
+# (member_id, str(emoji)) -> emoji
+MessageRemovals = t.Dict[t.Tuple[int, str], EmojiType]
+
+
+class ReactionRemovalQueue(object):
+    """Coalescing queue of reaction removals.
+
+    Removals are grouped per message and deduplicated by ``(member, emoji)``.
+    Every channel is drained by its own worker at ``rate`` removals per second,
+    which is the budget of the Discord reaction bucket, so the listeners never
+    wait for the HTTP calls. A 429 that still happens is retried by the
+    discord.py HTTP client itself, which sleeps for ``retry_after``.
+    """
+
+    def __init__(self, bot: "EveBot", *, rate: float):
+        self.bot = bot
+        self.delay = 1.0 / rate
+        self.stats: t.Counter[str] = Counter()
+
+        self._pending: t.Dict[int, t.Dict[int, MessageRemovals]] = {}
+        self._workers: t.Dict[int, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return sum(
+            len(removals)
+            for messages in self._pending.values()
+            for removals in messages.values()
+        )
+
+    def add(
+        self, channel_id: int, message_id: int, member_id: int, emoji: EmojiType
+    ) -> None:
+        removals = self._pending.setdefault(channel_id, {}).setdefault(message_id, {})
+        key = (member_id, str(emoji))
+        if key in removals:
+            self.stats["coalesced"] += 1
+        removals[key] = emoji
+
+        if channel_id not in self._workers:
+            self._workers[channel_id] = asyncio.create_task(self._drain(channel_id))
+
+    def discard(
+        self, channel_id: int, message_id: int, member_id: int, emoji: EmojiType
+    ) -> None:
+        # Реакцию уже убрали (сам участник или мы), удалять больше нечего
+        removals = self._pending.get(channel_id, {}).get(message_id)
+        if removals and removals.pop((member_id, str(emoji)), None) is not None:
+            self.stats["skipped"] += 1
+
+    def drop_message(self, channel_id: int, message_id: int) -> None:
+        removals = self._pending.get(channel_id, {}).pop(message_id, None)
+        if removals:
+            self.stats["skipped"] += len(removals)
+
+    def _pop(self, channel_id: int) -> t.Optional[t.Tuple[int, int, EmojiType]]:
+        messages = self._pending.get(channel_id)
+        while messages:
+            message_id, removals = next(iter(messages.items()))
+            if not removals:
+                del messages[message_id]
+                continue
+            (member_id, key), emoji = next(iter(removals.items()))
+            del removals[(member_id, key)]
+            if not removals:
+                del messages[message_id]
+            return message_id, member_id, emoji
+        return None
+
+    async def _drain(self, channel_id: int) -> None:
+        channel = self.bot.get_partial_messageable(channel_id)
+        try:
+            while (item := self._pop(channel_id)) is not None:
+                message_id, member_id, emoji = item
+                message = channel.get_partial_message(message_id)
+                try:
+                    await message.remove_reaction(emoji, discord.Object(id=member_id))
+                    self.stats["removed"] += 1
+                except (discord.NotFound, discord.Forbidden):
+                    self.stats["failed"] += 1
+                except discord.HTTPException as exc:
+                    self.stats["failed"] += 1
+                    logger.error(f"Can't remove reaction {emoji} of {member_id}: {exc}")
+                await asyncio.sleep(self.delay)
+        finally:
+            self._workers.pop(channel_id, None)
+            if channel_id in self._pending and not self._pending[channel_id]:
+                del self._pending[channel_id]
+
+    async def close(self) -> None:
+        for worker in list(self._workers.values()):
+            worker.cancel()
+        await asyncio.gather(*self._workers.values(), return_exceptions=True)
+        self._workers.clear()
+        self._pending.clear()
+
+
+class EmbedUpdateDebouncer(object):
+    """Per-message debouncer of the live event embed.
+
+    Any number of :meth:`touch` calls between two edits are merged into one
+    edit, and a message is edited at most once per ``interval`` seconds. The
+    edit is skipped when the rendered embed is the same as the last one sent.
+    """
+
+    def __init__(
+        self,
+        bot: "EveBot",
+        render: t.Callable[[t.Any], t.Awaitable[discord.Embed]],
+        *,
+        interval: float,
+    ):
+        self.bot = bot
+        self.render = render
+        self.interval = interval
+        self.stats: t.Counter[str] = Counter()
+
+        # message_id -> (channel_id, event)
+        self._dirty: t.Dict[int, t.Tuple[int, t.Any]] = {}
+        self._workers: t.Dict[int, asyncio.Task] = {}
+        self._rendered: t.Dict[int, dict] = {}
+        self._edited_at: t.Dict[int, float] = {}
+
+    def touch(self, channel_id: int, message_id: int, event: t.Any) -> None:
+        if message_id in self._dirty:
+            self.stats["merged"] += 1
+        self._dirty[message_id] = (channel_id, event)
+
+        if message_id not in self._workers:
+            self._workers[message_id] = asyncio.create_task(self._run(message_id))
+
+    def invalidate(self, message_id: int) -> None:
+        # Сообщение отредактировали в обход дебаунсера
+        self._rendered.pop(message_id, None)
+
+    def forget(self, message_id: t.Optional[int]) -> None:
+        self._dirty.pop(message_id, None)
+        self._rendered.pop(message_id, None)
+        self._edited_at.pop(message_id, None)
+        worker = self._workers.pop(message_id, None)
+        if worker is not None:
+            worker.cancel()
+
+    async def _run(self, message_id: int) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            while message_id in self._dirty:
+                delay = self._edited_at.get(message_id, 0.0) + self.interval
+                delay -= loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                try:
+                    channel_id, event = self._dirty.pop(message_id)
+                except KeyError:
+                    break
+                await self._edit(channel_id, message_id, event)
+                self._edited_at[message_id] = loop.time()
+        finally:
+            if self._workers.get(message_id) is asyncio.current_task():
+                del self._workers[message_id]
+
+    async def _edit(self, channel_id: int, message_id: int, event: t.Any) -> None:
+        try:
+            with query_scope("live_embed"):
+                embed = await self.render(event)
+        except Exception as exc:
+            logger.error(f"Can't render live embed for message {message_id}: {exc}")
+            return
+
+        rendered = embed.to_dict()
+        if self._rendered.get(message_id) == rendered:
+            self.stats["unchanged"] += 1
+            return
+
+        message = self.bot.get_partial_messageable(channel_id).get_partial_message(
+            message_id
+        )
+        try:
+            await message.edit(embed=embed)
+        except discord.HTTPException as exc:
+            self.stats["failed"] += 1
+            logger.error(f"Can't edit live embed of message {message_id}: {exc}")
+            return
+        self._rendered[message_id] = rendered
+        self.stats["edited"] += 1
+
+    async def close(self) -> None:
+        workers = list(self._workers.values())
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        self._workers.clear()
+        self._dirty.clear()
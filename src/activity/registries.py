@@ -0,0 +1,261 @@
+import asyncio
+import logging
+import sys
+import threading
+import typing as t
+from collections import Counter, defaultdict
+
+from lru import LRU
+
+from .choices import AttendanceServer, EventStatus
+from .models import Event, EventChannel, EventModerator
+
+if t.TYPE_CHECKING:
+    from .stores import ActivityStore
+
+
+logger = logging.getLogger(__name__)
+
+
+# Сервер участника хранится как его порядковый номер в AttendanceServer
+SERVER_CODES: t.Tuple[AttendanceServer, ...] = tuple(AttendanceServer)
+SERVER_CODE_MAP: t.Dict[str, int] = {
+    server.value: code for code, server in enumerate(SERVER_CODES)
+}
+
+
+class AttendanceRegistry(object):
+    """In-memory ``member_id -> server`` state of the running events.
+
+    The state of an event is loaded from ``event_attendances`` on first access
+    and has to be evicted once the event leaves ``STARTED``.
+    """
+
+    def __init__(self, store: "ActivityStore"):
+        self.store = store
+        self._states: t.Dict[int, t.Dict[int, int]] = {}
+        self._loading: t.Dict[int, asyncio.Task] = {}
+
+    def __contains__(self, event_id: int) -> bool:
+        return event_id in self._states
+
+    async def _load(self, event_id: int) -> t.Dict[int, int]:
+        members = await self.store.load_attendances(event_id)
+        return {member_id: SERVER_CODE_MAP[server] for member_id, server in members}
+
+    async def _state(self, event_id: int) -> t.Dict[int, int]:
+        try:
+            return self._states[event_id]
+        except KeyError:
+            ...
+
+        # Одновременные обращения к событию ждут одну и ту же загрузку
+        task = self._loading.get(event_id)
+        if task is None:
+            task = asyncio.create_task(self._load(event_id))
+            self._loading[event_id] = task
+        try:
+            state = await asyncio.shield(task)
+        except BaseException:
+            if task.done() and self._loading.get(event_id) is task:
+                del self._loading[event_id]
+            raise
+
+        if self._loading.get(event_id) is task:
+            del self._loading[event_id]
+            return self._states.setdefault(event_id, state)
+        if event_id in self._states:
+            # Результат уже сохранил другой ожидающий
+            return self._states[event_id]
+        # Событие вытеснено во время загрузки, состояние не кэшируем
+        return state
+
+    async def get(self, event_id: int, member_id: int) -> t.Optional[AttendanceServer]:
+        state = await self._state(event_id)
+        code = state.get(member_id)
+        if code is None:
+            return None
+        return SERVER_CODES[code]
+
+    async def set(
+        self, event_id: int, member_id: int, server: AttendanceServer
+    ) -> t.Optional[AttendanceServer]:
+        state = await self._state(event_id)
+        code = state.get(member_id)
+        state[member_id] = SERVER_CODE_MAP[AttendanceServer(server).value]
+        return SERVER_CODES[code] if code is not None else None
+
+    async def discard(
+        self, event_id: int, member_id: int
+    ) -> t.Optional[AttendanceServer]:
+        state = await self._state(event_id)
+        code = state.pop(member_id, None)
+        return SERVER_CODES[code] if code is not None else None
+
+    async def counts(self, event_id: int) -> t.Dict[AttendanceServer, int]:
+        state = await self._state(event_id)
+        codes = Counter(state.values())
+        return {server: codes[code] for code, server in enumerate(SERVER_CODES)}
+
+    def evict(self, event_id: int) -> None:
+        self._states.pop(event_id, None)
+        # Незавершенная загрузка не должна вернуть состояние в кэш
+        self._loading.pop(event_id, None)
+
+    def stats(self) -> t.Dict[str, int]:
+        members = sum(len(state) for state in self._states.values())
+        size = sys.getsizeof(self._states) + sum(
+            sys.getsizeof(state) + sum(sys.getsizeof(key) for key in state)
+            for state in self._states.values()
+        )
+        return {"events": len(self._states), "members": members, "bytes": size}
+
+
+ACTIVE_EVENT_STATUSES = (EventStatus.PENDING, EventStatus.STARTED)
+CLOSED_EVENT_STATUSES = (EventStatus.FINISHED, EventStatus.CANCELED)
+
+_E = t.TypeVar("_E", bound=Event)
+
+
+class ActiveEventIndex(t.Generic[_E]):
+    """``message_id -> event`` index of the PENDING/STARTED events.
+
+    FINISHED and CANCELED events are kept in a bounded cache of their own, so
+    reactions on closed event messages don't hit the database either. Message
+    ids which are known not to belong to any event are remembered in a bounded
+    negative cache.
+    """
+
+    def __init__(self, missing_size: int = 4096, closed_size: int = 1024):
+        self._events: t.Dict[int, _E] = {}
+        self._closed = LRU(closed_size)
+        self._missing = LRU(missing_size)
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    def warm(self, events: t.Iterable[_E]) -> None:
+        self._events = {
+            event.message_id: event
+            for event in events
+            if event.message_id is not None and event.status in ACTIVE_EVENT_STATUSES
+        }
+        self._closed.clear()
+        self._missing.clear()
+
+    def add(self, event: _E) -> None:
+        if event.message_id is None:
+            return
+        self.discard(event.message_id)
+        if event.status in ACTIVE_EVENT_STATUSES:
+            self._events[event.message_id] = event
+        elif event.status in CLOSED_EVENT_STATUSES:
+            self._closed[event.message_id] = event
+        else:
+            # Удаленное событие для слушателей не существует
+            self.mark_missing(event.message_id)
+            return
+        self._missing.pop(event.message_id, None)
+
+    def discard(self, message_id: t.Optional[int]) -> None:
+        self._events.pop(message_id, None)
+        self._closed.pop(message_id, None)
+
+    def get(self, message_id: int) -> t.Optional[_E]:
+        event = self._events.get(message_id)
+        if event is None:
+            event = self._closed.get(message_id)
+        return event
+
+    def get_by_id(self, event_id: int) -> t.Optional[_E]:
+        # Активных событий единицы, отдельный индекс по id не нужен
+        for event in self._events.values():
+            if event.id == event_id:
+                return event
+        return None
+
+    def is_missing(self, message_id: int) -> bool:
+        return message_id in self._missing
+
+    def mark_missing(self, message_id: int) -> None:
+        self._missing[message_id] = True
+
+    def stats(self) -> t.Dict[str, int]:
+        return {
+            "events": len(self._events),
+            "closed": len(self._closed),
+            "missing": len(self._missing),
+        }
+
+
+class EventAccessRegistry(object):
+    """Full snapshot of the event channels and moderators of every guild.
+
+    The snapshot is loaded once and reloaded by the ``post_save``/``post_delete``
+    signals of ``EventChannel`` and ``EventModerator``. Lookups never touch the
+    database.
+    """
+
+    def __init__(self):
+        self.loaded = False
+        self._channels: t.Dict[int, t.FrozenSet[int]] = {}
+        self._moderators: t.Dict[int, t.FrozenSet[int]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _snapshot(rows: t.Iterable[t.Tuple[int, int]]) -> t.Dict[int, t.FrozenSet[int]]:
+        snapshot = defaultdict(set)
+        for guild_id, object_id in rows:
+            snapshot[guild_id].add(object_id)
+        return {guild_id: frozenset(ids) for guild_id, ids in snapshot.items()}
+
+    def load(self) -> None:
+        with self._lock:
+            self._replace(
+                EventChannel.objects.values_list("guild_id", "channel_id"),
+                EventModerator.objects.values_list("guild_id", "member_id"),
+            )
+
+    def replace(
+        self,
+        channels: t.Iterable[t.Tuple[int, int]],
+        moderators: t.Iterable[t.Tuple[int, int]],
+    ) -> None:
+        """Replace the snapshot with ``(guild_id, id)`` rows loaded elsewhere."""
+        with self._lock:
+            self._replace(channels, moderators)
+
+    def _replace(
+        self,
+        channels: t.Iterable[t.Tuple[int, int]],
+        moderators: t.Iterable[t.Tuple[int, int]],
+    ) -> None:
+        channels = self._snapshot(channels)
+        moderators = self._snapshot(moderators)
+        # Подменяем снимок целиком, читатели никогда не видят пустой кэш
+        self._channels, self._moderators = channels, moderators
+        self.loaded = True
+        logger.debug(
+            f"Event access registry loaded: "
+            f"{sum(len(ids) for ids in channels.values())} channels, "
+            f"{sum(len(ids) for ids in moderators.values())} moderators"
+        )
+
+    def reload(self) -> None:
+        if self.loaded:
+            self.load()
+
+    def is_event_channel(self, guild_id: int, channel_id: int) -> bool:
+        return channel_id in self._channels.get(guild_id, ())
+
+    def is_event_moderator(self, guild_id: int, member_id: int) -> bool:
+        return member_id in self._moderators.get(guild_id, ())
+
+    def channels(self, guild_id: int) -> t.FrozenSet[int]:
+        return self._channels.get(guild_id, frozenset())
+
+    def moderators(self, guild_id: int) -> t.FrozenSet[int]:
+        return self._moderators.get(guild_id, frozenset())
+
+
+event_access = EventAccessRegistry()
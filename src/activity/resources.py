@@ -1,127 +1,190 @@
-from collections import namedtuple
+import heapq
+import itertools
+import logging
+import typing as t
+from array import array
+from collections import Counter, namedtuple
+from operator import itemgetter
 
+from django.conf import settings
 from django.contrib.postgres.aggregates import StringAgg
-from django.db.models import Count, Q
+from django.db.models import Count, Sum
+from django.db.models.functions import Coalesce
 from import_export import fields, resources, widgets
 
 from activity.choices import AttendanceServer, EventStatus
-from activity.models import EventAttendance
+from activity.exports import export_file
+from activity.models import EventAttendance, EventAttendanceRollup
+
+logger = logging.getLogger(__name__)
 
 
 def convert(dictionary):
     return namedtuple("GenericDict", dictionary.keys())(**dictionary)
 
 
+def server_column(server: AttendanceServer) -> str:
+    return f"server_{server.name.lower()}"
+
+
+# Колонки отчета следуют за AttendanceServer, новые серверы не требуют правок
+SERVER_COLUMNS = tuple(server_column(server) for server in AttendanceServer)
+
+REPORT_COLUMNS = ("member_id", "member_names", *SERVER_COLUMNS)
+
+
+def merge_report_rows(*sources):
+    """Merge per-member report rows coming from different sources."""
+    merged = {}
+    for rows in sources:
+        for row in rows:
+            member = merged.setdefault(
+                row["member_id"],
+                {"member_id": row["member_id"], "member_names": set()},
+            )
+            member["member_names"].update(
+                name for name in (row["member_names"] or "").split(",") if name
+            )
+            for column in SERVER_COLUMNS:
+                member[column] = member.get(column, 0) + row[column]
+    return [
+        {**row, "member_names": ",".join(sorted(row["member_names"]))}
+        for _, row in sorted(merged.items())
+    ]
+
+
+def merge_sorted_report_rows(*sources):
+    """Streaming :func:`merge_report_rows` for sources sorted by ``member_id``."""
+    rows = heapq.merge(*sources, key=itemgetter("member_id"))
+    for member_id, group in itertools.groupby(rows, key=itemgetter("member_id")):
+        group = list(group)
+        if len(group) == 1:
+            yield group[0]
+        else:
+            yield merge_report_rows(group)[0]
+
+
+def pivot_report_rows(rows: t.Iterable[t.Mapping[str, t.Any]]):
+    """Pivot ``(member_id, server)`` groups into one report row per member.
+
+    ``rows`` are sorted by ``member_id`` and carry ``server``, ``value`` and
+    ``member_names``. Counters of a member live in an ``array`` indexed by the
+    position of the server in :class:`AttendanceServer`. Rows of servers which
+    are not in :class:`AttendanceServer` anymore are skipped with a warning.
+    """
+    index = {server.value: position for position, server in enumerate(AttendanceServer)}
+    unknown: t.Counter[str] = Counter()
+    for member_id, group in itertools.groupby(rows, key=itemgetter("member_id")):
+        counts = array("q", [0]) * len(index)
+        names = set()
+        known = False
+        for row in group:
+            position = index.get(row["server"])
+            if position is None:
+                unknown[row["server"]] += 1
+                continue
+            known = True
+            counts[position] += row["value"] or 0
+            names.update(
+                name for name in (row["member_names"] or "").split(",") if name
+            )
+        if not known:
+            continue
+        yield {
+            "member_id": member_id,
+            "member_names": ",".join(sorted(names)),
+            **dict(zip(SERVER_COLUMNS, counts)),
+        }
+    for server, count in unknown.items():
+        logger.warning(f"Skipped {count} report rows of unknown server {server!r}")
+
+
 class CommonEventAttendanceResource(resources.ModelResource):
     member_id = fields.Field(
         attribute="member_id", column_name="member_id", widget=widgets.IntegerWidget()
     )
     member_names = fields.Field(attribute="member_names", column_name="member_names")
-    server_one = fields.Field(
-        attribute="server_one", column_name="server_one", widget=widgets.IntegerWidget()
-    )
-    server_two = fields.Field(
-        attribute="server_two", column_name="server_two", widget=widgets.IntegerWidget()
-    )
-    server_three = fields.Field(
-        attribute="server_three",
-        column_name="server_three",
-        widget=widgets.IntegerWidget(),
-    )
-    server_four = fields.Field(
-        attribute="server_four",
-        column_name="server_four",
-        widget=widgets.IntegerWidget(),
-    )
-    server_five = fields.Field(
-        attribute="server_five",
-        column_name="server_five",
-        widget=widgets.IntegerWidget(),
-    )
-    server_six = fields.Field(
-        attribute="server_six", column_name="server_six", widget=widgets.IntegerWidget()
-    )
 
     class Meta:
         model = EventAttendance
-        fields = (
-            "member_id",
-            "member_names",
-            "server_one",
-            "server_two",
-            "server_three",
-            "server_four",
-            "server_five",
-            "server_six",
-        )
-        export_order = (
-            "member_id",
-            "member_names",
-            "server_one",
-            "server_two",
-            "server_three",
-            "server_four",
-            "server_five",
-            "server_six",
-        )
+        fields = REPORT_COLUMNS
+        export_order = REPORT_COLUMNS
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        for column in SERVER_COLUMNS:
+            self.fields[column] = fields.Field(
+                attribute=column, column_name=column, widget=widgets.IntegerWidget()
+            )
+
+    def export(self, queryset=None, *args, archived=None, **kwargs):
+        if queryset is None:
+            queryset = self.get_queryset()
 
-    def export(self, queryset=None, *args, **kwargs):
+        rows = self.aggregate(queryset)
+        if archived:
+            rows = merge_report_rows(rows, archived)
+        queryset = list(map(convert, rows))
+        return super().export(queryset=queryset)
+
+    def export_file(
+        self, queryset=None, archived=None, file_format: str = "xlsx"
+    ) -> t.BinaryIO:
+        """Stream the report into a temporary file, see :func:`export_file`.
+
+        Unlike :meth:`export` the rows are read with a server-side cursor and
+        never held in memory all at once.
+        """
         if queryset is None:
             queryset = self.get_queryset()
 
-        queryset = (
-            queryset.values("member_id")
-            .order_by("member_id")
-            .annotate(member_names=StringAgg("member_display_name", ",", distinct=True))
-            .values("member_id", "member_names")
+        rows = self.aggregate(queryset)
+        if archived:
+            # Обе последовательности отсортированы по member_id
+            rows = merge_sorted_report_rows(rows, archived)
+
+        fields = self.get_export_fields()
+        return export_file(
+            self.get_export_headers(),
+            (
+                [field.widget.render(row[field.attribute]) for field in fields]
+                for row in rows
+            ),
+            file_format=file_format,
+        )
+
+    def value(self):
+        """Per ``(member, server)`` value of the report cells."""
+        return Count("event_id", distinct=True)
+
+    def aggregate(self, queryset):
+        groups = (
+            queryset.values("member_id", "server")
+            .order_by("member_id", "server")
             .annotate(
-                server_one=Count(
-                    "event_id",
-                    distinct=True,
-                    filter=Q(server=AttendanceServer.ONE.value),
-                ),
-                server_two=Count(
-                    "event_id",
-                    distinct=True,
-                    filter=Q(server=AttendanceServer.TWO.value),
-                ),
-                server_three=Count(
-                    "event_id",
-                    distinct=True,
-                    filter=Q(server=AttendanceServer.THREE.value),
-                ),
-                server_four=Count(
-                    "event_id",
-                    distinct=True,
-                    filter=Q(server=AttendanceServer.FOUR.value),
-                ),
-                server_five=Count(
-                    "event_id",
-                    distinct=True,
-                    filter=Q(server=AttendanceServer.FIVE.value),
-                ),
-                server_six=Count(
-                    "event_id",
-                    distinct=True,
-                    filter=Q(server=AttendanceServer.SIX.value),
-                ),
-            )
-            .values(
-                "member_id",
-                "member_names",
-                "server_one",
-                "server_two",
-                "server_three",
-                "server_four",
-                "server_five",
-                "server_six",
+                value=self.value(),
+                member_names=StringAgg("member_display_name", ",", distinct=True),
             )
+            .values("member_id", "server", "value", "member_names")
+        )
+        return pivot_report_rows(
+            groups.iterator(chunk_size=settings.EVE_EXPORT_CHUNK_SIZE)
         )
-
-        queryset = list(map(convert, queryset))
-        return super().export(queryset=queryset)
 
     def get_queryset(self):
         queryset = super().get_queryset()
         queryset = queryset.filter(event__status=EventStatus.FINISHED)
         return queryset
+
+
+class EventAttendanceRollupResource(CommonEventAttendanceResource):
+    """Same report as :class:`CommonEventAttendanceResource` built from the rollup."""
+
+    class Meta(CommonEventAttendanceResource.Meta):
+        model = EventAttendanceRollup
+
+    def value(self):
+        return Coalesce(Sum("count"), 0)
+
+    def get_queryset(self):
+        return EventAttendanceRollup.objects.all()
@@ -0,0 +1,47 @@
+import datetime
+import logging
+import typing as t
+
+from django.db import transaction
+from django.db.models import QuerySet
+
+from .choices import EventStatus
+from .models import Event, EventAttendance
+
+logger = logging.getLogger(__name__)
+
+
+def expired_events(cutoff: datetime.datetime) -> QuerySet:
+    """DELETED events whose status was last changed before ``cutoff``."""
+    # EventManager скрывает удаленные события, берем базовый менеджер
+    return Event._base_manager.filter(
+        status=EventStatus.DELETED, updated__lt=cutoff
+    ).order_by("id")
+
+
+def purge_batch(cutoff: datetime.datetime, batch_size: int) -> t.Tuple[int, int]:
+    """Hard-delete one bounded batch of expired events and their attendances.
+
+    A batch removes at most ``batch_size`` attendance rows or, once the events
+    of the batch have none left, at most ``batch_size`` events, in one short
+    transaction. Returns the deleted ``(events, attendances)``, ``(0, 0)`` when
+    nothing is left to purge.
+    """
+    with transaction.atomic():
+        event_ids = list(
+            expired_events(cutoff).values_list("id", flat=True)[:batch_size]
+        )
+        if not event_ids:
+            return 0, 0
+
+        attendance_ids = list(
+            EventAttendance.objects.filter(event_id__in=event_ids)
+            .order_by("id")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        if attendance_ids:
+            deleted, _ = EventAttendance.objects.filter(id__in=attendance_ids).delete()
+            return 0, deleted
+
+        deleted, _ = Event._base_manager.filter(id__in=event_ids).delete()
+        return deleted, 0
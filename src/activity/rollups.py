@@ -0,0 +1,156 @@
+import datetime
+import typing as t
+from collections import Counter
+
+from django.db import connection, transaction
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .archive import EventArchive
+from .choices import EventStatus
+from .models import Event, EventAttendance, EventAttendanceRollup
+
+if t.TYPE_CHECKING:
+    from django.db.models import Model
+
+# (day, guild_id, member_id, server, member_display_name)
+RollupKey = t.Tuple[datetime.date, int, int, str, str]
+
+ROLLUP_KEY_FIELDS = ("day", "guild_id", "member_id", "server", "member_display_name")
+
+
+def rollup_upsert_sql(table: str) -> str:
+    """``INSERT ... ON CONFLICT`` adding a delta to a rollup row.
+
+    ``table`` is the quoted rollup table, the parameters are
+    :func:`rollup_params` rows.
+    """
+    columns = (*ROLLUP_KEY_FIELDS, "count", "created", "updated")
+    return (
+        f"INSERT INTO {table} ({', '.join(columns)}) "
+        f"VALUES ({', '.join(['%s'] * len(columns))}) "
+        f"ON CONFLICT ({', '.join(ROLLUP_KEY_FIELDS)}) DO UPDATE "
+        f"SET count = {table}.count + EXCLUDED.count, updated = EXCLUDED.updated"
+    )
+
+
+def rollup_params(
+    deltas: t.Mapping[RollupKey, int], now: datetime.datetime
+) -> t.List[tuple]:
+    return [
+        (day, guild_id, member_id, str(server), display_name, delta, now, now)
+        for (day, guild_id, member_id, server, display_name), delta in deltas.items()
+        if delta
+    ]
+
+
+def rollup_cleanup_sql(table: str, keys: int) -> str:
+    """``DELETE`` of the rows of ``keys`` rollup keys which dropped to zero.
+
+    The parameters are :func:`rollup_cleanup_params`.
+    """
+    match = " AND ".join(f"{field} = %s" for field in ROLLUP_KEY_FIELDS)
+    return (
+        f"DELETE FROM {table} WHERE count <= 0 "
+        f"AND ({' OR '.join([f'({match})'] * keys)})"
+    )
+
+
+def rollup_cleanup_params(deltas: t.Mapping[RollupKey, int]) -> t.List[t.Any]:
+    # Обнулиться могут только строки, у которых счетчик уменьшился
+    return [
+        value
+        for (day, guild_id, member_id, server, display_name), delta in deltas.items()
+        if delta < 0
+        for value in (day, guild_id, member_id, str(server), display_name)
+    ]
+
+
+def apply_rollup(deltas: t.Mapping[RollupKey, int]) -> None:
+    """Add ``deltas`` to the rollup counters, creating missing rows.
+
+    Rows of the decremented keys which drop to zero are removed.
+    """
+    params = rollup_params(deltas, timezone.now())
+    if not params:
+        return
+
+    table = connection.ops.quote_name(EventAttendanceRollup._meta.db_table)
+    cleanup = rollup_cleanup_params(deltas)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(rollup_upsert_sql(table), params)
+        if cleanup:
+            keys = len(cleanup) // len(ROLLUP_KEY_FIELDS)
+            cursor.execute(rollup_cleanup_sql(table, keys), cleanup)
+
+
+def event_rollup(event: Event) -> t.Counter[RollupKey]:
+    day = timezone.localdate(event.created)
+    members = EventAttendance.objects.filter(
+        event_id=event.id, event_created=event.created
+    ).values_list("member_id", "server", "member_display_name")
+    return Counter(
+        (day, event.guild_id, member_id, server, display_name)
+        for member_id, server, display_name in members
+    )
+
+
+def add_event_rollup(event: Event) -> None:
+    apply_rollup(event_rollup(event))
+
+
+def subtract_event_rollup(event: Event) -> None:
+    apply_rollup({key: -count for key, count in event_rollup(event).items()})
+
+
+def rebuild_rollup(
+    attendance_model: t.Type["Model"],
+    rollup_model: t.Type["Model"],
+    batch_size: int = 5000,
+    archive: t.Optional[EventArchive] = None,
+) -> int:
+    """Recompute the whole rollup from the attendances of finished events.
+
+    Attendances of the archived events are read from ``archive``, see
+    :meth:`EventArchive.rollup_counts`.
+    """
+    rows = (
+        attendance_model.objects.filter(event__status=EventStatus.FINISHED)
+        .annotate(day=TruncDate("event__created"))
+        .values("day", "event__guild_id", "member_id", "server", "member_display_name")
+        .order_by()
+        .annotate(count=Count("id"))
+    )
+    archived = (archive or EventArchive()).rollup_counts()
+
+    def counts() -> t.Iterator[t.Tuple[RollupKey, int]]:
+        for row in rows.iterator():
+            key = (
+                row["day"],
+                row["event__guild_id"],
+                row["member_id"],
+                row["server"],
+                row["member_display_name"],
+            )
+            # Часть событий дня может быть уже в архиве, часть еще в БД
+            yield key, row["count"] + archived.pop(key, 0)
+        yield from archived.items()
+
+    with transaction.atomic():
+        rollup_model.objects.all().delete()
+        created = rollup_model.objects.bulk_create(
+            (
+                rollup_model(
+                    day=day,
+                    guild_id=guild_id,
+                    member_id=member_id,
+                    server=server,
+                    member_display_name=display_name,
+                    count=count,
+                )
+                for (day, guild_id, member_id, server, display_name), count in counts()
+            ),
+            batch_size=batch_size,
+        )
+    return len(created)
@@ -1,13 +1,79 @@
 import datetime
-import io
+import os
+import shutil
+import tempfile
 import typing as t
 
 import discord
+from django.conf import settings
+from django.db.models import Count, Max, QuerySet
 from django.utils import timezone
 
+from system.routers import replica_configured, use_replica
+
+from .archive import EventArchive
+from .caches import ReportCache
 from .choices import EventStatus
-from .models import EventAttendance
-from .resources import CommonEventAttendanceResource
+from .models import Event, EventAttendance, EventAttendanceRollup
+from .resources import CommonEventAttendanceResource, EventAttendanceRollupResource
+
+
+def replica_is_fresh(**event_filter) -> bool:
+    """Whether the replica can serve a report over the events of the filter.
+
+    Events finished within ``DATABASE_REPLICA_MAX_LAG`` seconds may not have
+    reached the replica yet, such reports are read from the primary.
+    """
+    if not replica_configured():
+        return False
+    recent = timezone.now() - datetime.timedelta(
+        seconds=settings.DATABASE_REPLICA_MAX_LAG
+    )
+    return not Event._base_manager.filter(
+        status=EventStatus.FINISHED, updated__gte=recent, **event_filter
+    ).exists()
+
+
+def report_watermark(*querysets: QuerySet) -> t.List[t.Any]:
+    """Version of the data read by a report, part of its cache key.
+
+    Any write bumps ``updated`` of the rows it touches, deletions change the
+    counts, archiving changes the number of archive chunks.
+    """
+    return [
+        *(
+            queryset.aggregate(updated=Max("updated"), count=Count("pk"))
+            for queryset in querysets
+        ),
+        len(EventArchive().manifest()["chunks"]),
+    ]
+
+
+def cached_report(
+    kind: str,
+    params: t.Dict[str, t.Any],
+    watermark: t.List[t.Any],
+    file_format: str,
+    build: t.Callable[[], t.BinaryIO],
+) -> t.BinaryIO:
+    """Open the cached report file, building and caching it on a miss."""
+    if not settings.EVE_REPORT_CACHE:
+        return build()
+
+    cache = ReportCache()
+    key = cache.key(kind, {**params, "format": file_format}, watermark)
+    suffix = f".{file_format}"
+    path = cache.get(key, suffix)
+    if path is not None:
+        try:
+            return open(path, "rb")
+        except FileNotFoundError:
+            # Успел вытеснить другой процесс
+            ...
+
+    with build() as content:
+        path = cache.put(key, suffix, content)
+    return open(path, "rb")
 
 
 class ActivityStatisticService(object):
@@ -15,18 +81,62 @@ class ActivityStatisticService(object):
     def get_statistics_by_date_range(
         start_date: datetime.datetime, end_date: datetime.datetime
     ) -> discord.File:
-        event_filter = {
-            "event__created__gte": timezone.make_aware(start_date),
-            "event__created__lte": timezone.make_aware(end_date),
-            "event__status": EventStatus.FINISHED,
-        }
+        file_format = settings.EVE_REPORT_FORMAT
+        filename = (
+            f"report_by_date_range_{start_date.date()}_{end_date.date()}.{file_format}"
+        )
+        start, end = timezone.make_aware(start_date), timezone.make_aware(end_date)
+        # Целые дни считаем по rollup. Конец диапазона, как и раньше,
+        # не включается (кроме событий ровно в полночь)
+        use_rollup = start_date.time() == end_date.time() == datetime.time.min
 
-        filename = f"report_by_date_range_{start_date.date()}_{end_date.date()}.xlsx"
+        def build() -> t.BinaryIO:
+            archived = None
+            if use_rollup:
+                queryset = EventAttendanceRollup.objects.filter(
+                    day__gte=start_date.date(), day__lt=end_date.date()
+                )
+                resource = EventAttendanceRollupResource()
+            else:
+                event_filter = {
+                    "event__created__gte": start,
+                    "event__created__lte": end,
+                    # Копия даты события отсекает лишние секции event_attendances
+                    "event_created__gte": start,
+                    "event_created__lte": end,
+                    "event__status": EventStatus.FINISHED,
+                }
+                queryset = EventAttendance.objects.filter(**event_filter)
+                resource = CommonEventAttendanceResource()
+                # Rollup включает и архивные события, сырые строки - нет
+                archived = EventArchive().report_rows(start=start, end=end)
+            with use_replica(replica_is_fresh(created__gte=start, created__lte=end)):
+                return resource.export_file(
+                    queryset=queryset,
+                    archived=archived,
+                    file_format=file_format,
+                )
 
-        queryset = EventAttendance.objects.filter(**event_filter)
-        resource = CommonEventAttendanceResource()
-        result = resource.export(queryset=queryset)
-        statistic_content = io.BytesIO(result.xlsx)
+        sources = [
+            Event._base_manager.filter(created__gte=start, created__lte=end),
+            EventAttendance.objects.filter(
+                event_created__gte=start, event_created__lte=end
+            ),
+        ]
+        if use_rollup:
+            sources.append(
+                EventAttendanceRollup.objects.filter(
+                    day__gte=start_date.date(), day__lt=end_date.date()
+                )
+            )
+        watermark = report_watermark(*sources)
+        statistic_content = cached_report(
+            "date_range",
+            {"start": start, "end": end},
+            watermark,
+            file_format,
+            build,
+        )
         statistic_file = discord.File(
             statistic_content,
             filename=filename,
@@ -43,12 +153,33 @@ class ActivityStatisticService(object):
             "event__status": EventStatus.FINISHED,
         }
 
-        filename = f"report_by_event_range_{start_id}_{end_id}.xlsx"
+        file_format = settings.EVE_REPORT_FORMAT
+        filename = f"report_by_event_range_{start_id}_{end_id}.{file_format}"
 
-        queryset = EventAttendance.objects.filter(**event_filter)
-        resource = CommonEventAttendanceResource()
-        result = resource.export(queryset=queryset)
-        statistic_content = io.BytesIO(result.xlsx)
+        def build() -> t.BinaryIO:
+            queryset = EventAttendance.objects.filter(**event_filter)
+            archived = EventArchive().report_rows(first_id=start_id, last_id=end_id)
+            resource = CommonEventAttendanceResource()
+            with use_replica(replica_is_fresh(id__gte=start_id, id__lte=end_id)):
+                return resource.export_file(
+                    queryset=queryset,
+                    archived=archived,
+                    file_format=file_format,
+                )
+
+        watermark = report_watermark(
+            Event._base_manager.filter(id__gte=start_id, id__lte=end_id),
+            EventAttendance.objects.filter(
+                event_id__gte=start_id, event_id__lte=end_id
+            ),
+        )
+        statistic_content = cached_report(
+            "event_range",
+            {"start_id": start_id, "end_id": end_id},
+            watermark,
+            file_format,
+            build,
+        )
         statistic_file = discord.File(
             statistic_content,
             filename=filename,
@@ -63,15 +194,49 @@ class ActivityStatisticService(object):
             "event__status": EventStatus.FINISHED,
         }
         event_ids_str = "_".join([str(x) for x in event_ids])
-        filename = f"report_by_event_list_{event_ids_str}.xlsx"
+        file_format = settings.EVE_REPORT_FORMAT
+        filename = f"report_by_event_list_{event_ids_str}.{file_format}"
 
-        queryset = EventAttendance.objects.filter(**event_filter)
-        resource = CommonEventAttendanceResource()
-        result = resource.export(queryset=queryset)
-        statistic_content = io.BytesIO(result.xlsx)
+        def build() -> t.BinaryIO:
+            queryset = EventAttendance.objects.filter(**event_filter)
+            archived = EventArchive().report_rows(event_ids=event_ids)
+            resource = CommonEventAttendanceResource()
+            with use_replica(replica_is_fresh(id__in=event_ids)):
+                return resource.export_file(
+                    queryset=queryset,
+                    archived=archived,
+                    file_format=file_format,
+                )
+
+        watermark = report_watermark(
+            Event._base_manager.filter(id__in=event_ids),
+            EventAttendance.objects.filter(event_id__in=event_ids),
+        )
+        statistic_content = cached_report(
+            "event_list",
+            {"event_ids": sorted(set(event_ids))},
+            watermark,
+            file_format,
+            build,
+        )
         statistic_file = discord.File(
             statistic_content,
             filename=filename,
             description=f"Статистика по событиям с {event_ids_str}",
         )
         return statistic_file
+
+
+def save_statistics_report(method: str, **params) -> t.Tuple[str, str, str]:
+    """Build a report with ``ActivityStatisticService.<method>`` into a file.
+
+    Used by the report worker processes, which can't return a ``discord.File``.
+    Returns the path, file name and description, the caller removes the file.
+    """
+    statistic_file = getattr(ActivityStatisticService, method)(**params)
+    suffix = os.path.splitext(statistic_file.filename)[1]
+    fd, path = tempfile.mkstemp(prefix="evebot_report_", suffix=suffix)
+    with os.fdopen(fd, "wb") as fp:
+        shutil.copyfileobj(statistic_file.fp, fp)
+    statistic_file.close()
+    return path, statistic_file.filename, statistic_file.description
@@ -0,0 +1,14 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import EventChannel, EventModerator
+from .registries import event_access
+
+
+@receiver(post_save, sender=EventChannel)
+@receiver(post_delete, sender=EventChannel)
+@receiver(post_save, sender=EventModerator)
+@receiver(post_delete, sender=EventModerator)
+def reload_event_access(sender, **kwargs) -> None:
+    transaction.on_commit(event_access.reload)
@@ -0,0 +1,336 @@
+import asyncio
+import contextlib
+import logging
+import typing as t
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+from django.utils import timezone
+
+from evebot.utils.queries import recorded_query
+
+from .buffers import (
+    PendingEvent,
+    attendance_conflict_fields,
+    drop_missing_events,
+    plan_attendance_writes,
+    write_attendances,
+)
+from .choices import EventStatus
+from .models import (
+    Event,
+    EventAttendance,
+    EventAttendanceRollup,
+    EventChannel,
+    EventModerator,
+)
+from .rollups import (
+    ROLLUP_KEY_FIELDS,
+    rollup_cleanup_params,
+    rollup_cleanup_sql,
+    rollup_params,
+    rollup_upsert_sql,
+)
+
+try:
+    import psycopg
+    from psycopg import sql
+except ImportError:
+    psycopg = None
+
+if t.TYPE_CHECKING:
+    from evebot.utils.executor import DatabaseExecutor
+
+
+logger = logging.getLogger(__name__)
+
+_E = t.TypeVar("_E", bound=Event)
+
+AccessRows = t.Tuple[t.List[t.Tuple[int, int]], t.List[t.Tuple[int, int]]]
+
+
+class DjangoActivityStore(object):
+    """Hot activity queries through the ORM on the bot's DB executor."""
+
+    def __init__(self, executor: "DatabaseExecutor"):
+        self.executor = executor
+
+    async def get_event(self, model: t.Type[_E], message_id: int) -> t.Optional[_E]:
+        def get() -> t.Optional[_E]:
+            try:
+                return model.objects.get(message_id=message_id)
+            except model.DoesNotExist:
+                return None
+
+        return await self.executor.run(get)
+
+    async def load_attendances(self, event_id: int) -> t.List[t.Tuple[int, str]]:
+        return await self.executor.run(
+            lambda: list(
+                EventAttendance.objects.filter(event_id=event_id).values_list(
+                    "member_id", "server"
+                )
+            )
+        )
+
+    async def load_access(self) -> AccessRows:
+        def load() -> AccessRows:
+            return (
+                list(EventChannel.objects.values_list("guild_id", "channel_id")),
+                list(EventModerator.objects.values_list("guild_id", "member_id")),
+            )
+
+        return await self.executor.run(load)
+
+    async def write_attendances(self, batch: t.Dict[int, PendingEvent]) -> None:
+        await self.executor.run(write_attendances, batch)
+
+    async def close(self) -> None:
+        ...
+
+
+def _table(model) -> "sql.Identifier":
+    return sql.Identifier(model._meta.db_table)
+
+
+async def _execute(target, query, params=None, *, many: bool = False):
+    """Execute on a psycopg connection or cursor, recording the statement."""
+    conn = getattr(target, "connection", target)
+    text = query if isinstance(query, str) else query.as_string(conn)
+    with recorded_query(text):
+        if many:
+            return await target.executemany(query, params)
+        return await target.execute(query, params)
+
+
+class PsycopgActivityStore(object):
+    """Hot activity queries on native psycopg 3 async connections.
+
+    Connections are opened lazily up to ``size`` and shared by all operations,
+    a broken connection is replaced on the next checkout. Independent statements
+    of one operation are sent in pipeline mode, so they cost one round-trip to
+    the server.
+    """
+
+    def __init__(self, *, size: int, alias: str = "default"):
+        if psycopg is None:
+            raise ImproperlyConfigured(
+                "psycopg 3 is required for the async activity store, "
+                "install the project with the 'async' extra"
+            )
+        if connections[alias].vendor != "postgresql":
+            raise ImproperlyConfigured("The async activity store requires PostgreSQL")
+
+        self.size = size
+        self.alias = alias
+        # Семафор ограничивает число выданных соединений, свободные лежат в
+        # _idle, недостающее открывается при выдаче
+        self._slots = asyncio.Semaphore(size)
+        self._idle: t.List["psycopg.AsyncConnection"] = []
+        self._closed = False
+
+    def _conninfo(self) -> str:
+        settings_dict = connections[self.alias].settings_dict
+        return psycopg.conninfo.make_conninfo(
+            dbname=settings_dict["NAME"] or None,
+            user=settings_dict["USER"] or None,
+            password=settings_dict["PASSWORD"] or None,
+            host=settings_dict["HOST"] or None,
+            port=settings_dict["PORT"] or None,
+            sslmode=settings_dict["OPTIONS"].get("sslmode"),
+        )
+
+    @contextlib.asynccontextmanager
+    async def _connection(self) -> t.AsyncIterator["psycopg.AsyncConnection"]:
+        async with self._slots:
+            if self._idle:
+                conn = self._idle.pop()
+            else:
+                conn = await psycopg.AsyncConnection.connect(
+                    self._conninfo(), autocommit=True
+                )
+            try:
+                yield conn
+            finally:
+                if conn.closed or conn.broken or self._closed:
+                    await conn.close()
+                else:
+                    self._idle.append(conn)
+
+    async def get_event(self, model: t.Type[_E], message_id: int) -> t.Optional[_E]:
+        fields = model._meta.concrete_fields
+        # Повторяет EventManager: удаленные события не отдаем
+        query = sql.SQL(
+            "SELECT {columns} FROM {table} WHERE message_id = %s AND status <> %s"
+        ).format(
+            columns=sql.SQL(", ").join(sql.Identifier(f.column) for f in fields),
+            table=_table(model),
+        )
+        async with self._connection() as conn:
+            cursor = await _execute(
+                conn, query, [message_id, EventStatus.DELETED.value]
+            )
+            row = await cursor.fetchone()
+        if row is None:
+            return None
+        return model.from_db(self.alias, [f.attname for f in fields], row)
+
+    async def load_attendances(self, event_id: int) -> t.List[t.Tuple[int, str]]:
+        query = sql.SQL("SELECT member_id, server FROM {} WHERE event_id = %s").format(
+            _table(EventAttendance)
+        )
+        async with self._connection() as conn:
+            cursor = await _execute(conn, query, [event_id])
+            return await cursor.fetchall()
+
+    async def load_access(self) -> AccessRows:
+        async with self._connection() as conn, conn.pipeline():
+            channels = await _execute(
+                conn,
+                sql.SQL("SELECT guild_id, channel_id FROM {}").format(
+                    _table(EventChannel)
+                ),
+            )
+            moderators = await _execute(
+                conn,
+                sql.SQL("SELECT guild_id, member_id FROM {}").format(
+                    _table(EventModerator)
+                ),
+            )
+            return await channels.fetchall(), await moderators.fetchall()
+
+    async def write_attendances(self, batch: t.Dict[int, PendingEvent]) -> None:
+        """Execute :func:`activity.buffers.plan_attendance_writes` in raw SQL.
+
+        One round-trip reads the events and locks the rows being replaced, one
+        more sends all the writes and the commit.
+        """
+        event_table = _table(Event)
+        attendance_table = _table(EventAttendance)
+        keys = [
+            (event_id, member_id)
+            for event_id, pending_event in batch.items()
+            for member_id in pending_event
+        ]
+
+        async with self._connection() as conn, conn.transaction():
+            async with conn.pipeline():
+                events_cursor = await _execute(
+                    conn,
+                    sql.SQL(
+                        "SELECT id, created, guild_id, status FROM {} "
+                        "WHERE id = ANY(%s)"
+                    ).format(event_table),
+                    [list(batch)],
+                )
+                previous_cursor = await _execute(
+                    conn,
+                    sql.SQL(
+                        "SELECT a.event_id, a.member_id, a.server, "
+                        "a.member_display_name FROM {attendance} a "
+                        "JOIN {event} e "
+                        "ON e.id = a.event_id AND e.created = a.event_created "
+                        "WHERE (a.event_id, a.member_id) IN ("
+                        "  SELECT * FROM unnest(%s::bigint[], %s::bigint[])"
+                        ") FOR UPDATE OF a"
+                    ).format(attendance=attendance_table, event=event_table),
+                    [[key[0] for key in keys], [key[1] for key in keys]],
+                )
+                events = {
+                    event_id: (created, guild_id, status)
+                    for event_id, created, guild_id, status in (
+                        await events_cursor.fetchall()
+                    )
+                }
+                previous = {
+                    (event_id, member_id): (server, display_name)
+                    for event_id, member_id, server, display_name in (
+                        await previous_cursor.fetchall()
+                    )
+                }
+
+            batch = drop_missing_events(batch, events)
+            writes = plan_attendance_writes(batch, events, previous)
+            now = timezone.now()
+
+            async with conn.pipeline(), conn.cursor() as cursor:
+                if writes.upserts:
+                    conflict = [
+                        EventAttendance._meta.get_field(name).column
+                        for name in attendance_conflict_fields()
+                    ]
+                    await _execute(
+                        cursor,
+                        sql.SQL(
+                            "INSERT INTO {} (event_id, event_created, member_id, "
+                            "member_name, member_display_name, server, created, "
+                            "updated) VALUES (%s, %s, %s, %s, %s, %s, %s, %s) "
+                            "ON CONFLICT ({}) "
+                            "DO UPDATE SET member_name = EXCLUDED.member_name, "
+                            "member_display_name = EXCLUDED.member_display_name, "
+                            "server = EXCLUDED.server, updated = EXCLUDED.updated"
+                        ).format(
+                            attendance_table,
+                            sql.SQL(", ").join(map(sql.Identifier, conflict)),
+                        ),
+                        [(*row, now, now) for row in writes.upserts],
+                        many=True,
+                    )
+                for event_id, event_created, removed in writes.deletes:
+                    await _execute(
+                        cursor,
+                        sql.SQL(
+                            "DELETE FROM {} WHERE event_id = %s "
+                            "AND event_created = %s AND member_id = ANY(%s)"
+                        ).format(attendance_table),
+                        [event_id, event_created, removed],
+                    )
+
+                params = rollup_params(writes.rollup, now)
+                if params:
+                    rollup_table = _table(EventAttendanceRollup).as_string(conn)
+                    await _execute(
+                        cursor, rollup_upsert_sql(rollup_table), params, many=True
+                    )
+                    cleanup = rollup_cleanup_params(writes.rollup)
+                    if cleanup:
+                        await _execute(
+                            cursor,
+                            rollup_cleanup_sql(
+                                rollup_table, len(cleanup) // len(ROLLUP_KEY_FIELDS)
+                            ),
+                            cleanup,
+                        )
+
+                for event_id, fields in writes.counters.items():
+                    counters = [
+                        sql.SQL("{field} = {field} + %s").format(
+                            field=sql.Identifier(field)
+                        )
+                        for field in fields
+                    ]
+                    await _execute(
+                        cursor,
+                        sql.SQL("UPDATE {} SET {}, updated = %s WHERE id = %s").format(
+                            event_table, sql.SQL(", ").join(counters)
+                        ),
+                        [*fields.values(), now, event_id],
+                    )
+
+    async def close(self) -> None:
+        self._closed = True
+        while self._idle:
+            await self._idle.pop().close()
+
+
+ActivityStore = t.Union[DjangoActivityStore, PsycopgActivityStore]
+
+
+def create_activity_store(
+    backend: str, executor: "DatabaseExecutor", *, size: int
+) -> ActivityStore:
+    if backend == "django":
+        return DjangoActivityStore(executor)
+    if backend == "psycopg":
+        return PsycopgActivityStore(size=size)
+    raise ImproperlyConfigured(f"Unknown activity store backend: {backend}")
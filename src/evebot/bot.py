@@ -18,7 +18,9 @@ from django.db.models.expressions import connector
 
 from evebot.client import EveAutoShardedClient
 from evebot.context import EveContext
+from evebot.utils.executor import DatabaseExecutor
 from evebot.utils.functional import find_cogs
+from evebot.utils.queries import query_scope
 from evebot.utils.storage import PersistJsonFile
 from system.settings import EVE_PROXY_HOST
 
@@ -120,6 +122,13 @@ class EveBot(BotBase, EveAutoShardedClient):
         )
         self._auto_spam_count = Counter()
 
+        self.db_executor = DatabaseExecutor(
+            max_workers=settings.EVE_DB_EXECUTOR_WORKERS,
+            min_workers=settings.EVE_DB_EXECUTOR_MIN_WORKERS,
+            conn_max_age=settings.EVE_DB_CONN_MAX_AGE,
+            health_checks=settings.EVE_DB_CONN_HEALTH_CHECKS,
+        )
+
     async def setup_hook(self) -> None:
         self.session = self.http.session
         self.bot_app_info = await self.application_info()
@@ -128,6 +137,9 @@ class EveBot(BotBase, EveAutoShardedClient):
             settings.SECRET_ROOT / "blacklist.json"
         )
 
+        # Соединения открываем до загрузки расширений, они сразу читают БД
+        await self.db_executor.prewarm()
+
         logger.info("Search installed extensions...")
         installed_extensions = find_cogs(settings.INSTALLED_APPS)
 
@@ -463,6 +475,12 @@ class EveBot(BotBase, EveAutoShardedClient):
 
         await self.invoke(ctx)
 
+    async def invoke(self, ctx: EveContext) -> None:
+        if ctx.command is None:
+            return await super().invoke(ctx)
+        with query_scope(f"{settings.EVE_PREFIX}{ctx.command.qualified_name}"):
+            await super().invoke(ctx)
+
     async def on_message(self, message: discord.Message) -> None:
         if message.author.bot:
             return
@@ -476,3 +494,4 @@ class EveBot(BotBase, EveAutoShardedClient):
         await super().close()
         if self.session:
             await self.session.close()
+        self.db_executor.shutdown()
@@ -2,7 +2,11 @@ import logging
 import typing as t
 
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
+from django.conf import settings
+
+from evebot.utils.checks import get_check_stats
+from evebot.utils.queries import QueryStat, get_query_stats
 
 if t.TYPE_CHECKING:
     from evebot.bot import EveBot
@@ -18,6 +22,31 @@ class AdminCog(commands.Cog):
         self._last_result: t.Optional[t.Any] = None
         self.sessions: set[int] = set()
 
+    async def cog_load(self) -> None:
+        if settings.EVE_QUERY_INSTRUMENTATION:
+            self.log_query_stats.change_interval(
+                minutes=settings.EVE_QUERY_STATS_LOG_INTERVAL
+            )
+            self.log_query_stats.start()
+
+    async def cog_unload(self) -> None:
+        self.log_query_stats.cancel()
+
+    @staticmethod
+    def format_query_stat(name: str, stat: QueryStat) -> str:
+        return (
+            f"{name}: calls={stat.calls} queries={stat.queries} "
+            f"max={stat.max_queries} db={stat.duration * 1000:.0f}ms "
+            f"slowest={stat.slowest[0] * 1000:.0f}ms n+1={stat.n_plus_one}"
+        )
+
+    @tasks.loop(minutes=60.0)
+    async def log_query_stats(self):
+        if not self.log_query_stats.current_loop:
+            return
+        for name, stat in get_query_stats():
+            logger.info(f"Query stats {self.format_query_stat(name, stat)}")
+
     @commands.group(
         name="sync",
         description="Синхронизация команд приложения для сервера",
@@ -59,6 +88,45 @@ class AdminCog(commands.Cog):
 
         await ctx.send(content, reference=ctx.message)
 
+    @commands.command(
+        name="checkstats", description="Статистика проверок команд приложения"
+    )
+    @commands.is_owner()
+    async def check_stats(self, ctx: "EveContext"):
+        stats = get_check_stats()
+        await ctx.entry_to_code([(key, str(value)) for key, value in stats.items()])
+
+    @commands.command(name="dbstats", description="Статистика пула соединений с БД")
+    @commands.is_owner()
+    async def db_stats(self, ctx: "EveContext"):
+        stats = self.bot.db_executor.stats()
+        await ctx.entry_to_code(
+            [
+                (key, f"{value:.2f}" if isinstance(value, float) else str(value))
+                for key, value in stats.items()
+            ]
+        )
+
+    @commands.command(name="querystats", description="SQL запросы команд и слушателей")
+    @commands.is_owner()
+    async def query_stats(self, ctx: "EveContext"):
+        stats = get_query_stats()
+        if not stats:
+            await ctx.send("Запросов пока не было", reference=ctx.message)
+            return
+        await ctx.entry_to_code(
+            [
+                (
+                    name,
+                    f"{stat.calls} calls, {stat.queries} queries "
+                    f"(max {stat.max_queries}), {stat.duration * 1000:.0f} ms, "
+                    f"slowest {stat.slowest[0] * 1000:.0f} ms, "
+                    f"n+1 {stat.n_plus_one}",
+                )
+                for name, stat in stats
+            ]
+        )
+
 
 async def setup(bot):
     await bot.add_cog(AdminCog(bot))
@@ -1,26 +1,68 @@
 import typing as t
+from collections import Counter
 
 import discord
 from discord import app_commands
 from discord.ext import commands
 
 from activity.models import EventChannel, EventModerator
+from activity.registries import event_access
 from evebot.exceptions import NotEventChannel, NotEventModerator
 
 if t.TYPE_CHECKING:
-    ...
+    from django.db.models import QuerySet
 
 
 T = t.TypeVar("T")
 
+# Счетчики проверок: сколько раз обошлись без запроса в БД
+check_stats: t.Counter[str] = Counter()
+
+_EXTRAS_KEY = "evebot.checks"
+
+
+async def _cached_check(
+    interaction: discord.Interaction,
+    name: str,
+    lookup: t.Callable[[], bool],
+    queryset: "QuerySet",
+) -> bool:
+    # Декораторы на родительских группах повторяют одну и ту же проверку,
+    # результат запоминаем на время жизни interaction
+    memo = interaction.extras.setdefault(_EXTRAS_KEY, {})
+    if name in memo:
+        check_stats[f"{name}.memoized"] += 1
+        return memo[name]
+
+    if event_access.loaded:
+        result = lookup()
+        check_stats[f"{name}.registry"] += 1
+    else:
+        result = await interaction.client.db_executor.run(queryset.exists)
+        check_stats[f"{name}.database"] += 1
+
+    memo[name] = result
+    return result
+
+
+def get_check_stats() -> t.Dict[str, int]:
+    avoided = sum(
+        count for key, count in check_stats.items() if not key.endswith(".database")
+    )
+    return {**check_stats, "avoided": avoided}
+
 
 def event_channel_only():
     async def predicate(interaction: discord.Interaction) -> bool:
-        event_channels = EventChannel.objects.filter(
-            guild_id=interaction.guild.id, channel_id=interaction.channel.id
+        guild_id, channel_id = interaction.guild.id, interaction.channel.id
+        is_event_channel = await _cached_check(
+            interaction,
+            "event_channel",
+            lambda: event_access.is_event_channel(guild_id, channel_id),
+            EventChannel.objects.filter(guild_id=guild_id, channel_id=channel_id),
         )
 
-        if not event_channels.exists():
+        if not is_event_channel:
             raise NotEventChannel
 
         return True
@@ -30,11 +72,15 @@ def event_channel_only():
 
 def event_moderator_only():
     async def predicate(interaction: discord.Interaction) -> bool:
-        event_moderator = EventModerator.objects.filter(
-            guild_id=interaction.guild.id, member_id=interaction.user.id
+        guild_id, member_id = interaction.guild.id, interaction.user.id
+        is_event_moderator = await _cached_check(
+            interaction,
+            "event_moderator",
+            lambda: event_access.is_event_moderator(guild_id, member_id),
+            EventModerator.objects.filter(guild_id=guild_id, member_id=member_id),
         )
 
-        if not event_moderator.exists():
+        if not is_event_moderator:
             raise NotEventModerator
 
         return True
@@ -0,0 +1,145 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import statistics
+import threading
+import time
+import typing as t
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import close_old_connections, connection
+
+from evebot.utils.queries import record_queries
+
+_T = t.TypeVar("_T")
+
+logger = logging.getLogger(__name__)
+
+
+class DatabaseExecutor(object):
+    """Bounded thread pool for the blocking Django ORM calls of the bot.
+
+    Every worker thread owns its own Django connection, so the executor is the
+    connection pool of the bot: ``max_workers`` is the number of database
+    connections the bot process may hold at once, ``min_workers`` of them are
+    opened by :meth:`prewarm`.
+
+    With ``conn_max_age`` the worker connections are persistent and recycled
+    once they get older than that many seconds. ``health_checks`` makes Django
+    ping a reused connection before every call, which costs a round-trip per
+    call; a broken connection is otherwise closed after the failed call.
+    """
+
+    def __init__(
+        self,
+        max_workers: int,
+        *,
+        min_workers: int = 0,
+        conn_max_age: t.Optional[int] = None,
+        health_checks: t.Optional[bool] = None,
+        thread_name_prefix: str = "evebot-db",
+    ):
+        self.max_workers = max_workers
+        self.min_workers = min(min_workers, max_workers)
+        self.conn_max_age = conn_max_age
+        self.health_checks = health_checks
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix=thread_name_prefix,
+            initializer=self._init_worker,
+        )
+
+        self._lock = threading.Lock()
+        self._waits: t.Deque[float] = deque(maxlen=1000)
+        self._calls = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._active = 0
+        self._connections: t.Set[int] = set()
+
+    def _init_worker(self) -> None:
+        # Настройки соединения только для потоков пула, веб их не видит
+        settings_dict = dict(connection.settings_dict)
+        if self.conn_max_age is not None:
+            settings_dict["CONN_MAX_AGE"] = self.conn_max_age
+        if self.health_checks is not None:
+            settings_dict["CONN_HEALTH_CHECKS"] = self.health_checks
+        connection.settings_dict = settings_dict
+
+    def _call(
+        self, submitted: float, func: t.Callable[..., _T], *args: t.Any, **kwargs: t.Any
+    ) -> _T:
+        wait = time.monotonic() - submitted
+        with self._lock:
+            self._calls += 1
+            self._active += 1
+            self._wait_total += wait
+            self._wait_max = max(self._wait_max, wait)
+            self._waits.append(wait)
+
+        close_old_connections()
+        try:
+            with record_queries():
+                return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+            with self._lock:
+                self._active -= 1
+                if connection.connection is not None:
+                    self._connections.add(threading.get_ident())
+                else:
+                    self._connections.discard(threading.get_ident())
+
+    async def run(
+        self, func: t.Callable[..., _T], /, *args: t.Any, **kwargs: t.Any
+    ) -> _T:
+        loop = asyncio.get_running_loop()
+        # run_in_executor не переносит контекст в поток, копируем его сами
+        context = contextvars.copy_context()
+        call = functools.partial(
+            context.run, self._call, time.monotonic(), func, *args, **kwargs
+        )
+        return await loop.run_in_executor(self._executor, call)
+
+    async def prewarm(self) -> None:
+        """Start ``min_workers`` threads and open their connections."""
+        if not self.min_workers:
+            return
+
+        # Барьер не отпускает поток, пока не стартуют все остальные, иначе
+        # пул отдал бы все задачи одному и тому же потоку
+        barrier = threading.Barrier(self.min_workers)
+
+        def warm() -> None:
+            barrier.wait(timeout=30)
+            connection.ensure_connection()
+
+        await asyncio.gather(*(self.run(warm) for _ in range(self.min_workers)))
+        logger.info(f"Database executor prewarmed: {self.min_workers} connections")
+
+    def stats(self) -> t.Dict[str, t.Any]:
+        with self._lock:
+            waits = sorted(self._waits)
+            calls = self._calls
+            result = {
+                "workers": f"{self.min_workers}..{self.max_workers}",
+                "threads": len(self._executor._threads),
+                "connections": len(self._connections),
+                "active": self._active,
+                "calls": calls,
+                "wait_avg_ms": self._wait_total / calls * 1000 if calls else 0.0,
+                "wait_max_ms": self._wait_max * 1000,
+            }
+        if waits:
+            result["wait_p50_ms"] = statistics.median(waits) * 1000
+            result["wait_p95_ms"] = (
+                waits[min(len(waits) - 1, int(len(waits) * 0.95))] * 1000
+            )
+        return result
+
+    def shutdown(self, wait: bool = True) -> None:
+        logger.info("Shutting down database executor...")
+        self._executor.shutdown(wait=wait, cancel_futures=False)
@@ -0,0 +1,103 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import typing as t
+from collections import defaultdict
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+# Модуль импортируется в дочернем процессе до django.setup(), поэтому
+# здесь не должно быть импортов моделей
+
+
+def _init_worker(settings_module: str) -> None:
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", settings_module)
+
+    import django
+
+    django.setup()
+
+
+def _run_job(func_path: str, args: tuple, kwargs: dict) -> t.Any:
+    from django.db import close_old_connections
+
+    close_old_connections()
+    try:
+        return import_string(func_path)(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+class ProcessJobPool(object):
+    """Bounded pool of worker processes with their own Django setup.
+
+    Jobs are referenced by dotted path, so only their arguments and results are
+    pickled. At most ``concurrency`` jobs of the same key run at once, and a
+    caller waits no longer than ``timeout`` seconds for its job.
+    """
+
+    def __init__(
+        self,
+        max_workers: int,
+        *,
+        concurrency: int,
+        timeout: float,
+        settings_module: t.Optional[str] = None,
+    ):
+        self.max_workers = max_workers
+        self.concurrency = concurrency
+        self.timeout = timeout
+
+        # spawn: дочерний процесс не наследует потоки и соединения бота
+        self._executor = ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(settings_module or os.environ["DJANGO_SETTINGS_MODULE"],),
+        )
+        self._semaphores: t.DefaultDict[t.Hashable, asyncio.Semaphore] = defaultdict(
+            lambda: asyncio.Semaphore(self.concurrency)
+        )
+
+    async def run(
+        self,
+        key: t.Hashable,
+        func_path: str,
+        /,
+        *args: t.Any,
+        discard: t.Optional[t.Callable[[t.Any], None]] = None,
+        **kwargs: t.Any,
+    ) -> t.Any:
+        """Run ``func_path(*args, **kwargs)`` in a worker process.
+
+        Raises :class:`TimeoutError` when the job does not finish in time. A job
+        which is already running can not be stopped, ``discard`` is called
+        with its result once it finishes.
+        """
+        future: t.Optional[Future] = None
+        try:
+            async with asyncio.timeout(self.timeout), self._semaphores[key]:
+                future = self._executor.submit(_run_job, func_path, args, kwargs)
+                return await asyncio.wrap_future(future)
+        except (TimeoutError, asyncio.CancelledError):
+            if future is not None and discard is not None:
+                future.add_done_callback(lambda done: self._discard(done, discard))
+            raise
+
+    @staticmethod
+    def _discard(future: Future, discard: t.Callable[[t.Any], None]) -> None:
+        if future.cancelled() or future.exception() is not None:
+            return
+        try:
+            discard(future.result())
+        except Exception as exc:
+            logger.error(f"Can't discard abandoned job result: {exc}")
+
+    def shutdown(self, wait: bool = True) -> None:
+        logger.info("Shutting down process job pool...")
+        self._executor.shutdown(wait=wait, cancel_futures=True)
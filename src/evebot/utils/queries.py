@@ -0,0 +1,173 @@
+import contextlib
+import contextvars
+import functools
+import logging
+import threading
+import time
+import typing as t
+from collections import Counter
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+_F = t.TypeVar("_F", bound=t.Callable[..., t.Awaitable[t.Any]])
+
+
+class QueryScope(object):
+    """SQL statements executed on behalf of one command or listener call.
+
+    The scope is shared by all DB executor calls made in its context, possibly
+    from several threads at once.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.count = 0
+        self.duration = 0.0
+        self.slowest: t.Tuple[float, str] = (0.0, "")
+        self.statements: t.Counter[str] = Counter()
+        self.closed = False
+        self._lock = threading.Lock()
+
+    def record(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.add(sql, time.perf_counter() - start)
+
+    def add(self, sql: str, duration: float) -> None:
+        # Задачи, созданные внутри команды, наследуют контекст и могут
+        # пережить ее, их запросы уже не считаем
+        if not self.closed:
+            with self._lock:
+                self.count += 1
+                self.duration += duration
+                self.statements[sql] += 1
+                if duration > self.slowest[0]:
+                    self.slowest = (duration, sql)
+        if duration * 1000 >= settings.EVE_SLOW_QUERY_MS:
+            logger.warning(
+                f"Slow query in {self.name}: {duration * 1000:.1f} ms: {sql}"
+            )
+
+    def repeated(self) -> t.Optional[t.Tuple[str, int]]:
+        """The most repeated statement, if it looks like an N+1 loop."""
+        if not self.statements:
+            return None
+        sql, count = self.statements.most_common(1)[0]
+        if count < settings.EVE_QUERY_N_PLUS_ONE_THRESHOLD:
+            return None
+        return sql, count
+
+
+class QueryStat(object):
+    def __init__(self):
+        self.calls = 0
+        self.queries = 0
+        self.duration = 0.0
+        self.max_queries = 0
+        self.slowest: t.Tuple[float, str] = (0.0, "")
+        self.n_plus_one = 0
+
+    def add(self, scope: QueryScope) -> None:
+        self.calls += 1
+        self.queries += scope.count
+        self.duration += scope.duration
+        self.max_queries = max(self.max_queries, scope.count)
+        if scope.slowest[0] > self.slowest[0]:
+            self.slowest = scope.slowest
+
+
+_current_scope: contextvars.ContextVar[t.Optional[QueryScope]] = contextvars.ContextVar(
+    "query_scope", default=None
+)
+
+query_stats: t.Dict[str, QueryStat] = {}
+
+
+@contextlib.contextmanager
+def query_scope(name: str) -> t.Iterator[t.Optional[QueryScope]]:
+    """Collect the statements of the block under ``name`` in :data:`query_stats`.
+
+    Nested scopes are counted by the outermost one only. A task which outlives
+    the scope it was created in opens its own scopes, e.g. the attendance
+    actors and the write buffer started from a reaction listener.
+    """
+    current = _current_scope.get()
+    if not settings.EVE_QUERY_INSTRUMENTATION or (
+        current is not None and not current.closed
+    ):
+        yield None
+        return
+
+    scope = QueryScope(name)
+    token = _current_scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _current_scope.reset(token)
+        scope.closed = True
+        stat = query_stats.setdefault(name, QueryStat())
+        stat.add(scope)
+        repeated = scope.repeated()
+        if repeated is not None:
+            stat.n_plus_one += 1
+            sql, count = repeated
+            logger.warning(f"Possible N+1 in {name}: {count} times: {sql}")
+
+
+def instrumented(name: str) -> t.Callable[[_F], _F]:
+    """Run the decorated coroutine function inside :func:`query_scope`."""
+
+    def decorator(func: _F) -> _F:
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with query_scope(name):
+                return await func(*args, **kwargs)
+
+        return t.cast(_F, wrapper)
+
+    return decorator
+
+
+@contextlib.contextmanager
+def record_queries() -> t.Iterator[None]:
+    """Record the statements of the calling thread into the current scope.
+
+    Used by the DB executor around every call, the scope comes from the context
+    copied from the submitting task. Every alias is wrapped, so the reads the
+    router sends to the replica are counted too.
+    """
+    scope = _current_scope.get()
+    if scope is None:
+        yield
+        return
+    with contextlib.ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(scope.record))
+        yield
+
+
+@contextlib.contextmanager
+def recorded_query(sql: str) -> t.Iterator[None]:
+    """Record a statement executed outside of the Django connection.
+
+    Used by the psycopg activity store, which Django's execute wrappers don't
+    see.
+    """
+    scope = _current_scope.get()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if scope is not None:
+            scope.add(sql, time.perf_counter() - start)
+
+
+def get_query_stats(limit: int = 15) -> t.List[t.Tuple[str, QueryStat]]:
+    stats = sorted(query_stats.items(), key=lambda item: item[1].duration)
+    return stats[::-1][:limit]
@@ -12,7 +12,6 @@ os.environ["SSL_CERT_FILE"] = certifi.where()
 def main():
     """Run administrative tasks."""
     os.environ.setdefault("DJANGO_SETTINGS_MODULE", "system.settings")
-    os.environ.setdefault("DJANGO_ALLOW_ASYNC_UNSAFE", "True")
     try:
         from django.core.management import execute_from_command_line
     except ImportError as exc:
@@ -0,0 +1,45 @@
+import contextlib
+import contextvars
+import typing as t
+
+from django.conf import settings
+
+REPLICA_DATABASE = "replica"
+
+_use_replica: contextvars.ContextVar[bool] = contextvars.ContextVar(
+    "use_replica", default=False
+)
+
+
+def replica_configured() -> bool:
+    return REPLICA_DATABASE in settings.DATABASES
+
+
+@contextlib.contextmanager
+def use_replica(enabled: bool = True) -> t.Iterator[None]:
+    """Route the reads of the current context to the replica, if there is one."""
+    token = _use_replica.set(enabled)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+class ReplicaRouter(object):
+    """Reads inside :func:`use_replica` go to the replica, everything else to
+    the primary."""
+
+    def db_for_read(self, model, **hints) -> t.Optional[str]:
+        if _use_replica.get() and replica_configured():
+            return REPLICA_DATABASE
+        return None
+
+    def db_for_write(self, model, **hints) -> t.Optional[str]:
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints) -> t.Optional[bool]:
+        # Реплика - копия основной базы, объекты из них можно связывать
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints) -> bool:
+        return db != REPLICA_DATABASE
@@ -1,3 +1,29 @@
 from system.env import env
 
 DATABASES = {"default": env.db("DATABASE_URL")}
+DATABASES["default"]["CONN_MAX_AGE"] = env.int("DATABASE_CONN_MAX_AGE", default=0)
+DATABASES["default"]["CONN_HEALTH_CHECKS"] = env.bool(
+    "DATABASE_CONN_HEALTH_CHECKS", default=False
+)
+
+# Реплика только для чтения: статистика и выгрузки
+if env.str("DATABASE_REPLICA_URL", default=""):
+    DATABASES["replica"] = env.db("DATABASE_REPLICA_URL")
+    DATABASES["replica"]["TEST"] = {"MIRROR": "default"}
+
+DATABASE_ROUTERS = ["system.routers.ReplicaRouter"]
+
+# События, завершенные за последние N секунд, читаем с основной базы
+DATABASE_REPLICA_MAX_LAG = env.int("DATABASE_REPLICA_MAX_LAG", default=10)
+
+# Секционирование activity_eventattendance по месяцам (только PostgreSQL)
+DATABASE_ATTENDANCE_PARTITIONING = env.bool(
+    "DATABASE_ATTENDANCE_PARTITIONING", default=False
+)
+DATABASE_ATTENDANCE_PARTITIONS_AHEAD = env.int(
+    "DATABASE_ATTENDANCE_PARTITIONS_AHEAD", default=3
+)
+# Сколько месяцев держать подключенными, 0 - все
+DATABASE_ATTENDANCE_PARTITIONS_KEEP = env.int(
+    "DATABASE_ATTENDANCE_PARTITIONS_KEEP", default=0
+)
@@ -19,3 +19,54 @@ EVE_PROXY_HOST = env.str("EVE_PROXY_HOST", default="")
 EVE_PROXY_PORT = env.str("EVE_PROXY_PORT", default="")
 EVE_PROXY_USER = env.str("EVE_PROXY_USER", default="")
 EVE_PROXY_PASSWORD = env.str("EVE_PROXY_PASSWORD", default="")
+
+EVE_DB_EXECUTOR_WORKERS = env.int("EVE_DB_EXECUTOR_WORKERS", default=4)
+EVE_DB_EXECUTOR_MIN_WORKERS = env.int("EVE_DB_EXECUTOR_MIN_WORKERS", default=1)
+# Соединения потоков бота живут дольше, чем у веба: бот не обрабатывает запросы
+EVE_DB_CONN_MAX_AGE = env.int("EVE_DB_CONN_MAX_AGE", default=300)
+# Проверка соединения - лишний запрос на каждый вызов пула, по умолчанию выключена
+EVE_DB_CONN_HEALTH_CHECKS = env.bool("EVE_DB_CONN_HEALTH_CHECKS", default=False)
+# Горячие запросы активности: "django" (ORM в пуле потоков) или "psycopg"
+EVE_DB_ASYNC_BACKEND = env.str("EVE_DB_ASYNC_BACKEND", default="django")
+EVE_DB_ASYNC_POOL_SIZE = env.int("EVE_DB_ASYNC_POOL_SIZE", default=4)
+EVE_ATTENDANCE_FLUSH_INTERVAL = env.int("EVE_ATTENDANCE_FLUSH_INTERVAL", default=1000)
+EVE_ATTENDANCE_FLUSH_SIZE = env.int("EVE_ATTENDANCE_FLUSH_SIZE", default=200)
+EVE_REACTION_REMOVAL_RATE = env.float("EVE_REACTION_REMOVAL_RATE", default=4.0)
+EVE_LIVE_EMBED_INTERVAL = env.int("EVE_LIVE_EMBED_INTERVAL", default=5000)
+
+# Учет SQL запросов по командам и слушателям
+EVE_QUERY_INSTRUMENTATION = env.bool("EVE_QUERY_INSTRUMENTATION", default=True)
+EVE_SLOW_QUERY_MS = env.int("EVE_SLOW_QUERY_MS", default=200)
+EVE_QUERY_N_PLUS_ONE_THRESHOLD = env.int("EVE_QUERY_N_PLUS_ONE_THRESHOLD", default=10)
+EVE_QUERY_STATS_LOG_INTERVAL = env.int("EVE_QUERY_STATS_LOG_INTERVAL", default=60)
+
+# Окончательное удаление событий со статусом DELETED, 0 - не удалять
+EVE_RETENTION_DELETED_DAYS = env.int("EVE_RETENTION_DELETED_DAYS", default=0)
+EVE_RETENTION_BATCH_SIZE = env.int("EVE_RETENTION_BATCH_SIZE", default=5000)
+EVE_RETENTION_PAUSE = env.int("EVE_RETENTION_PAUSE", default=500)
+EVE_RETENTION_INTERVAL = env.int("EVE_RETENTION_INTERVAL", default=24)
+
+# Выгрузка статистики: формат файла и размер буфера в памяти до сброса на диск
+EVE_REPORT_FORMAT = env.str("EVE_REPORT_FORMAT", default="xlsx")
+EVE_EXPORT_SPOOL_SIZE = env.int("EVE_EXPORT_SPOOL_SIZE", default=8 * 1024 * 1024)
+EVE_EXPORT_CHUNK_SIZE = env.int("EVE_EXPORT_CHUNK_SIZE", default=2000)
+
+# Отчеты строятся в отдельных процессах, 0 - в пуле потоков бота
+EVE_REPORT_PROCESSES = env.int("EVE_REPORT_PROCESSES", default=2)
+EVE_REPORT_GUILD_CONCURRENCY = env.int("EVE_REPORT_GUILD_CONCURRENCY", default=1)
+EVE_REPORT_TIMEOUT = env.int("EVE_REPORT_TIMEOUT", default=300)
+
+# Очередь отчетов: число одновременно строящихся отчетов, период обновления
+# сообщения о ходе (секунды), число запусков прерванного отчета и сколько дней
+# хранить завершенные задания
+EVE_REPORT_JOB_WORKERS = env.int("EVE_REPORT_JOB_WORKERS", default=2)
+EVE_REPORT_JOB_PROGRESS_INTERVAL = env.int(
+    "EVE_REPORT_JOB_PROGRESS_INTERVAL", default=15
+)
+EVE_REPORT_JOB_ATTEMPTS = env.int("EVE_REPORT_JOB_ATTEMPTS", default=3)
+EVE_REPORT_JOB_KEEP_DAYS = env.int("EVE_REPORT_JOB_KEEP_DAYS", default=7)
+
+# Кэш готовых отчетов в STORAGE_ROOT/reports, размер в мегабайтах
+EVE_REPORT_CACHE = env.bool("EVE_REPORT_CACHE", default=True)
+EVE_REPORT_CACHE_SIZE = env.int("EVE_REPORT_CACHE_SIZE", default=256)
+EVE_REPORT_CACHE_FILES = env.int("EVE_REPORT_CACHE_FILES", default=200)
@@ -0,0 +1,37 @@
+import os
+
+import pytest
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "system.settings")
+# Без DATABASE_URL тесты идут на SQLite в памяти, тесты только для PostgreSQL
+# пропускаются
+os.environ.setdefault("DATABASE_URL", "sqlite://:memory:")
+
+
+def pytest_configure(config):
+    from django.conf import settings
+
+    # pytest-django настраивает Django только для уже загруженных настроек
+    settings.INSTALLED_APPS
+
+
+@pytest.fixture
+def postgres(db):
+    from django.db import connection
+
+    if connection.vendor != "postgresql":
+        pytest.skip("PostgreSQL only")
+
+
+@pytest.fixture
+def make_event(db):
+    from activity.choices import EventStatus
+    from activity.models import Event
+
+    def make_event(status=EventStatus.STARTED, **fields):
+        fields.setdefault("guild_id", 1)
+        fields.setdefault("member_id", 1)
+        fields.setdefault("title", "Test")
+        return Event.objects.create(status=status, **fields)
+
+    return make_event
@@ -0,0 +1,129 @@
+import asyncio
+
+import pytest
+
+from activity.actors import AttendanceActors, AttendanceOp
+from activity.choices import AttendanceServer, EventStatus
+from activity.cogs.base import MemberReactions
+
+
+class FakeMember(object):
+    def __init__(self, member_id):
+        self.id = member_id
+
+
+class FakeRemovals(object):
+    def __init__(self):
+        self.removed = []
+
+    def add(self, channel_id, message_id, member_id, emoji):
+        self.removed.append((member_id, emoji))
+
+
+class FakeCore(object):
+    def __init__(self):
+        self.reaction_removals = FakeRemovals()
+
+
+class FakeEvent(object):
+    channel_id = 100
+    message_id = 200
+
+    def __init__(self, event_id=1, status=EventStatus.STARTED):
+        self.id = event_id
+        self.status = status
+        self.members = {}
+        self.writes = []
+
+    async def amember_attendance(self, member_id):
+        # Уступаем циклу, чтобы операции могли бы перемешаться
+        await asyncio.sleep(0)
+        return self.members.get(member_id)
+
+    async def aadd_member_attendance(self, member, server):
+        await asyncio.sleep(0)
+        self.members[member.id] = server
+        self.writes.append(("add", member.id, server))
+
+    async def aremove_member_attendance(self, member):
+        await asyncio.sleep(0)
+        self.members.pop(member.id, None)
+        self.writes.append(("remove", member.id))
+
+
+@pytest.fixture
+def actors():
+    return AttendanceActors(core=FakeCore())
+
+
+@pytest.mark.asyncio
+async def test_operations_apply_in_order(actors):
+    event, member = FakeEvent(), FakeMember(10)
+
+    # Смена сервера: новая отметка приходит раньше снятия старой
+    actors.submit(event, AttendanceOp(member, AttendanceServer.ONE))
+    actors.submit(event, AttendanceOp(member, AttendanceServer.TWO))
+    actors.submit(event, AttendanceOp(member, AttendanceServer.ONE, added=False))
+    await actors.join(event.id)
+
+    assert event.members == {10: AttendanceServer.TWO}
+    assert event.writes == [
+        ("add", 10, AttendanceServer.ONE),
+        ("add", 10, AttendanceServer.TWO),
+    ]
+    assert actors.core.reaction_removals.removed == [
+        (10, MemberReactions(AttendanceServer.ONE).emoji)
+    ]
+    assert len(actors) == 0
+
+
+@pytest.mark.asyncio
+async def test_operations_are_idempotent(actors):
+    event, member = FakeEvent(), FakeMember(10)
+
+    actors.submit(event, AttendanceOp(member, AttendanceServer.ONE))
+    actors.submit(event, AttendanceOp(member, AttendanceServer.ONE))
+    actors.submit(event, AttendanceOp(member, AttendanceServer.THREE, added=False))
+    await actors.join(event.id)
+
+    assert event.writes == [("add", 10, AttendanceServer.ONE)]
+    assert actors.stats["added"] == 1
+    assert actors.stats["ignored"] == 2
+
+
+@pytest.mark.asyncio
+async def test_closing_drops_late_operations(actors):
+    event = FakeEvent()
+
+    actors.submit(event, AttendanceOp(FakeMember(10), AttendanceServer.ONE))
+    async with actors.closing(event.id):
+        # Поставленное до закрытия применяется до входа в блок
+        assert event.members == {10: AttendanceServer.ONE}
+        accepted = actors.submit(
+            event, AttendanceOp(FakeMember(11), AttendanceServer.TWO)
+        )
+
+    assert not accepted
+    assert 11 not in event.members
+    assert actors.stats["dropped"] == 1
+    assert actors.core.reaction_removals.removed == [
+        (11, MemberReactions(AttendanceServer.TWO).emoji)
+    ]
+    assert actors.submit(event, AttendanceOp(FakeMember(11), AttendanceServer.TWO))
+
+
+@pytest.mark.asyncio
+async def test_moderated_operations_apply_to_closed_events(actors):
+    event = FakeEvent(status=EventStatus.FINISHED)
+    event.members[11] = AttendanceServer.THREE
+
+    await actors.apply(event, AttendanceOp(FakeMember(10), AttendanceServer.ONE))
+    assert actors.stats["skipped"] == 1
+
+    op = AttendanceOp(FakeMember(10), AttendanceServer.ONE, moderated=True)
+    assert await actors.apply(event, op)
+    op = AttendanceOp(FakeMember(11), None, added=False, moderated=True)
+    assert await actors.apply(event, op)
+
+    assert event.members == {10: AttendanceServer.ONE}
+    assert actors.core.reaction_removals.removed == []
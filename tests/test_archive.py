@@ -0,0 +1,122 @@
+import csv
+import datetime
+import io
+
+import pytest
+from django.utils import timezone
+
+from activity.archive import EventArchive
+from activity.choices import AttendanceServer, EventStatus
+from activity.models import Event, EventAttendance, EventAttendanceRollup
+from activity.resources import server_column
+from activity.rollups import rebuild_rollup
+from activity.services import ActivityStatisticService
+
+pytest.importorskip("pyarrow")
+
+DAY = datetime.date(2024, 1, 10)
+
+
+def at(hour):
+    return timezone.make_aware(datetime.datetime.combine(DAY, datetime.time(hour)))
+
+
+@pytest.fixture
+def archive(settings, tmp_path):
+    settings.STORAGE_ROOT = tmp_path
+    settings.EVE_REPORT_CACHE = False
+    settings.EVE_REPORT_FORMAT = "csv"
+    return EventArchive()
+
+
+def archive_events(archive, cutoff, capture):
+    # manifest дописывается после коммита транзакции пачки
+    with capture(execute=True):
+        return archive.archive(cutoff)
+
+
+def finished_event(make_event, created, members):
+    event = make_event(status=EventStatus.FINISHED)
+    Event._base_manager.filter(pk=event.pk).update(created=created)
+    for member_id, server in members.items():
+        EventAttendance.objects.create(
+            event=event,
+            event_created=created,
+            member_id=member_id,
+            member_display_name=f"Member {member_id}",
+            server=server,
+        )
+    return event
+
+
+def rollup():
+    return set(
+        EventAttendanceRollup.objects.values_list("day", "member_id", "server", "count")
+    )
+
+
+@pytest.fixture
+def events(make_event):
+    # Первое событие уйдет в архив, второе того же дня останется в БД
+    old = finished_event(
+        make_event, at(10), {1: AttendanceServer.ONE, 2: AttendanceServer.TWO}
+    )
+    live = finished_event(make_event, at(14), {1: AttendanceServer.ONE})
+    return old, live
+
+
+@pytest.mark.django_db
+def test_archive_round_trip(archive, events, django_capture_on_commit_callbacks):
+    old, live = events
+
+    archived = archive_events(archive, at(12), django_capture_on_commit_callbacks)
+
+    assert archived == (1, 2)
+    assert list(Event._base_manager.values_list("id", flat=True)) == [live.id]
+    assert archive.archived_until == at(12)
+    assert archive.report_rows(start=at(0), end=at(23)) == [
+        {
+            "member_id": member_id,
+            "member_names": f"Member {member_id}",
+            **{
+                server_column(column): int(column == server)
+                for column in AttendanceServer
+            },
+        }
+        for member_id, server in ((1, AttendanceServer.ONE), (2, AttendanceServer.TWO))
+    ]
+    assert archive.report_rows(event_ids=[live.id]) == []
+
+
+@pytest.mark.django_db
+def test_rebuild_rollup_keeps_archived_events(
+    archive, events, django_capture_on_commit_callbacks
+):
+    rebuild_rollup(EventAttendance, EventAttendanceRollup)
+    before = rollup()
+    assert before == {
+        (DAY, 1, AttendanceServer.ONE.value, 2),
+        (DAY, 2, AttendanceServer.TWO.value, 1),
+    }
+
+    archive_events(archive, at(12), django_capture_on_commit_callbacks)
+    rebuild_rollup(EventAttendance, EventAttendanceRollup)
+
+    assert rollup() == before
+
+
+def test_rebuild_rollup_keeps_archived_events_in_report(
+    postgres, archive, events, django_capture_on_commit_callbacks
+):
+    archive_events(archive, at(12), django_capture_on_commit_callbacks)
+    rebuild_rollup(EventAttendance, EventAttendanceRollup)
+
+    report = ActivityStatisticService.get_statistics_by_date_range(
+        datetime.datetime.combine(DAY, datetime.time.min),
+        datetime.datetime.combine(DAY + datetime.timedelta(days=1), datetime.time.min),
+    )
+    rows = list(csv.DictReader(io.TextIOWrapper(report.fp, encoding="utf-8")))
+
+    assert [
+        (row["member_id"], row["server_one"], row["server_two"]) for row in rows
+    ] == [("1", "2", "0"), ("2", "0", "1")]
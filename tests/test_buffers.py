@@ -0,0 +1,257 @@
+import asyncio
+import datetime
+
+import pytest
+from django.utils import timezone
+
+from activity.buffers import (
+    AttendanceWriteBuffer,
+    PendingAttendance,
+    attendance_deltas,
+    drop_missing_events,
+    plan_attendance_writes,
+    write_attendances,
+)
+from activity.choices import AttendanceServer, EventStatus
+from activity.models import Event, EventAttendance, EventAttendanceRollup
+
+CREATED = datetime.datetime(2024, 1, 10, 12, tzinfo=datetime.timezone.utc)
+DAY = timezone.localdate(CREATED)
+
+
+def pending(server, name="member"):
+    return PendingAttendance(
+        member_name=name, member_display_name=name.title(), server=server
+    )
+
+
+class FakeMember(object):
+    def __init__(self, member_id, name):
+        self.id = member_id
+        self.name = name
+        self.display_name = name.title()
+
+
+class FakeStore(object):
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.batches = []
+
+    async def write_attendances(self, batch):
+        if self.fail:
+            raise RuntimeError("database is down")
+        self.batches.append(batch)
+
+
+@pytest.mark.asyncio
+async def test_buffer_coalesces_operations_per_member():
+    store = FakeStore()
+    buffer = AttendanceWriteBuffer(store=store, flush_interval=60, flush_size=100)
+
+    buffer.upsert(1, FakeMember(10, "ann"), AttendanceServer.ONE)
+    buffer.upsert(1, FakeMember(10, "ann"), AttendanceServer.TWO)
+    buffer.upsert(1, FakeMember(11, "bob"), AttendanceServer.ONE)
+    buffer.remove(1, 11)
+    buffer.upsert(2, FakeMember(10, "ann"), AttendanceServer.SIX)
+    assert len(buffer) == 3
+
+    assert await buffer.flush(event_id=1) == 2
+    assert store.batches == [
+        {1: {10: pending(AttendanceServer.TWO, "ann"), 11: None}},
+    ]
+    assert len(buffer) == 1
+
+    assert await buffer.flush() == 1
+    assert store.batches[-1] == {2: {10: pending(AttendanceServer.SIX, "ann")}}
+    assert len(buffer) == 0
+    assert await buffer.flush() == 0
+
+
+@pytest.mark.asyncio
+async def test_buffer_restores_failed_batch_without_overriding_newer_ops():
+    store = FakeStore(fail=True)
+    buffer = AttendanceWriteBuffer(store=store, flush_interval=60, flush_size=100)
+    buffer.upsert(1, FakeMember(10, "ann"), AttendanceServer.ONE)
+    buffer.upsert(1, FakeMember(11, "bob"), AttendanceServer.ONE)
+
+    with pytest.raises(RuntimeError):
+        await buffer.flush()
+    assert len(buffer) == 2
+
+    buffer.remove(1, 10)
+    store.fail = False
+    await buffer.flush()
+    assert store.batches == [
+        {1: {10: None, 11: pending(AttendanceServer.ONE, "bob")}},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_buffer_flushes_when_full():
+    store = FakeStore()
+    buffer = AttendanceWriteBuffer(store=store, flush_interval=60, flush_size=2)
+    buffer.start()
+    try:
+        buffer.upsert(1, FakeMember(10, "ann"), AttendanceServer.ONE)
+        buffer.upsert(1, FakeMember(11, "bob"), AttendanceServer.ONE)
+        for _ in range(50):
+            if store.batches:
+                break
+            await asyncio.sleep(0.01)
+        assert len(store.batches) == 1
+    finally:
+        await buffer.close()
+
+
+def test_attendance_deltas_of_finished_event():
+    batch = {
+        1: {
+            10: pending(AttendanceServer.TWO, "ann"),
+            11: None,
+            12: pending(AttendanceServer.ONE, "cid"),
+            13: pending(AttendanceServer.ONE, "dan"),
+        }
+    }
+    events = {1: (CREATED, 5, EventStatus.FINISHED)}
+    previous = {
+        (1, 10): (AttendanceServer.ONE.value, "Ann"),
+        (1, 11): (AttendanceServer.THREE.value, "Bob"),
+        (1, 13): (AttendanceServer.ONE.value, "Dan"),
+    }
+
+    rollup, deltas = attendance_deltas(batch, events, previous)
+
+    assert dict(deltas[1]) == {
+        AttendanceServer.ONE.value: 0,
+        AttendanceServer.TWO.value: 1,
+        AttendanceServer.THREE.value: -1,
+    }
+    assert +rollup == {
+        (DAY, 5, 10, AttendanceServer.TWO.value, "Ann"): 1,
+        (DAY, 5, 12, AttendanceServer.ONE.value, "Cid"): 1,
+    }
+    assert -rollup == {
+        (DAY, 5, 10, AttendanceServer.ONE.value, "Ann"): 1,
+        (DAY, 5, 11, AttendanceServer.THREE.value, "Bob"): 1,
+    }
+
+
+def test_attendance_deltas_of_running_event_skip_rollup():
+    batch = {1: {10: pending(AttendanceServer.TWO, "ann")}}
+    events = {1: (CREATED, 5, EventStatus.STARTED)}
+
+    rollup, deltas = attendance_deltas(batch, events, {})
+
+    assert not rollup
+    assert dict(deltas[1]) == {AttendanceServer.TWO.value: 1}
+
+
+def test_plan_attendance_writes():
+    batch = {1: {10: pending(AttendanceServer.TWO, "ann"), 11: None}}
+    events = {1: (CREATED, 5, EventStatus.STARTED)}
+    previous = {(1, 11): (AttendanceServer.TWO.value, "Bob")}
+
+    writes = plan_attendance_writes(batch, events, previous)
+
+    assert writes.upserts == [
+        (1, CREATED, 10, "ann", "Ann", AttendanceServer.TWO.value),
+    ]
+    assert writes.deletes == [(1, CREATED, [11])]
+    # Один пришел, один ушел - счетчик не меняется
+    assert writes.counters == {}
+
+
+@pytest.mark.django_db
+def test_write_attendances(make_event):
+    event = make_event(status=EventStatus.FINISHED)
+    day = timezone.localdate(event.created)
+    other = EventAttendanceRollup.objects.create(
+        day=day,
+        guild_id=2,
+        member_id=99,
+        server=AttendanceServer.ONE,
+        member_display_name="Other",
+        count=0,
+    )
+
+    write_attendances(
+        {
+            event.id: {
+                10: pending(AttendanceServer.ONE, "ann"),
+                11: pending(AttendanceServer.TWO, "bob"),
+            }
+        }
+    )
+    write_attendances(
+        {event.id: {10: pending(AttendanceServer.THREE, "ann"), 11: None}}
+    )
+
+    assert set(
+        EventAttendance.objects.filter(event=event).values_list("member_id", "server")
+    ) == {(10, AttendanceServer.THREE.value)}
+    event = Event.objects.get(pk=event.pk)
+    assert event.server_counts[AttendanceServer.ONE] == 0
+    assert event.server_counts[AttendanceServer.TWO] == 0
+    assert event.server_counts[AttendanceServer.THREE] == 1
+    assert set(
+        EventAttendanceRollup.objects.filter(guild_id=event.guild_id).values_list(
+            "member_id", "server", "count"
+        )
+    ) == {(10, AttendanceServer.THREE.value, 1)}
+    # Очистка rollup касается только ключей пачки
+    assert EventAttendanceRollup.objects.filter(pk=other.pk).exists()
+
+
+def test_drop_missing_events():
+    batch = {1: {10: pending(AttendanceServer.ONE)}, 2: {11: None}}
+    events = {1: (CREATED, 1, EventStatus.STARTED)}
+
+    assert drop_missing_events(batch, events) == {1: batch[1]}
+
+
+@pytest.mark.django_db
+def test_write_attendances_skips_deleted_event(make_event):
+    event = make_event()
+    deleted = make_event()
+    Event._base_manager.filter(pk=deleted.pk).delete()
+
+    write_attendances(
+        {
+            deleted.id: {10: pending(AttendanceServer.ONE, "ann")},
+            event.id: {11: pending(AttendanceServer.TWO, "bob")},
+        }
+    )
+
+    assert list(EventAttendance.objects.values_list("event_id", "member_id")) == [
+        (event.id, 11)
+    ]
+
+
+@pytest.mark.asyncio
+@pytest.mark.django_db(transaction=True)
+async def test_buffer_is_not_wedged_by_deleted_event(make_event):
+    from asgiref.sync import sync_to_async
+
+    from activity.stores import DjangoActivityStore
+    from evebot.utils.executor import DatabaseExecutor
+
+    event = await sync_to_async(make_event)()
+    deleted = await sync_to_async(make_event)()
+    await sync_to_async(Event._base_manager.filter(pk=deleted.pk).delete)()
+
+    executor = DatabaseExecutor(max_workers=1)
+    buffer = AttendanceWriteBuffer(
+        DjangoActivityStore(executor), flush_interval=60, flush_size=100
+    )
+    buffer.upsert(deleted.id, FakeMember(10, "ann"), AttendanceServer.ONE)
+    buffer.upsert(event.id, FakeMember(11, "bob"), AttendanceServer.TWO)
+    try:
+        assert await buffer.flush() == 2
+    finally:
+        executor.shutdown()
+
+    assert len(buffer) == 0
+    assert (
+        await sync_to_async(EventAttendance.objects.filter(event_id=event.id).count)()
+        == 1
+    )
@@ -0,0 +1,109 @@
+import io
+import os
+
+import pytest
+
+from activity.caches import ReportCache
+from activity.choices import AttendanceServer
+from activity.models import EventAttendance
+from activity.services import cached_report, report_watermark
+from system.storages import CommonFileSystemStorage
+
+
+@pytest.fixture
+def storage(settings, tmp_path):
+    settings.STORAGE_ROOT = tmp_path
+    settings.EVE_REPORT_CACHE = True
+    return CommonFileSystemStorage()
+
+
+def put(cache, key, content=b"report", atime=None):
+    path = cache.put(key, ".csv", io.BytesIO(content))
+    if atime is not None:
+        # Время обращения задаем явно, точность mtime у ФС разная
+        os.utime(path, (atime, atime))
+    return path
+
+
+def test_key_depends_on_the_watermark():
+    key = ReportCache.key("daterange", {"start": 1}, [{"count": 1}])
+
+    assert key == ReportCache.key("daterange", {"start": 1}, [{"count": 1}])
+    assert key != ReportCache.key("daterange", {"start": 1}, [{"count": 2}])
+    assert key != ReportCache.key("events", {"start": 1}, [{"count": 1}])
+
+
+def test_put_and_get(storage):
+    cache = ReportCache(storage)
+
+    assert cache.get("a", ".csv") is None
+    path = put(cache, "a")
+
+    assert cache.get("a", ".csv") == path
+    with open(path, "rb") as fp:
+        assert fp.read() == b"report"
+    assert not [name for name in os.listdir(os.path.dirname(path)) if ".tmp" in name]
+
+
+def test_least_recently_used_entries_are_evicted(storage):
+    cache = ReportCache(storage, max_files=2, max_size=1024)
+    put(cache, "a", atime=1)
+    put(cache, "b", atime=2)
+    # Обращение к "a" делает вытесняемым "b"
+    assert cache.get("a", ".csv")
+
+    put(cache, "c")
+
+    assert cache.get("a", ".csv")
+    assert cache.get("b", ".csv") is None
+    assert cache.get("c", ".csv")
+
+
+def test_entries_over_the_size_are_evicted_but_the_new_one(storage):
+    cache = ReportCache(storage, max_files=10, max_size=10)
+    put(cache, "a", b"x" * 6, atime=1)
+
+    put(cache, "b", b"x" * 20)
+
+    assert cache.get("a", ".csv") is None
+    assert cache.get("b", ".csv")
+
+
+@pytest.mark.django_db
+def test_watermark_changes_with_the_data(storage, make_event):
+    event = make_event()
+    queryset = EventAttendance.objects.filter(event=event)
+    empty = report_watermark(queryset)
+
+    attendance = EventAttendance.objects.create(
+        event=event,
+        event_created=event.created,
+        member_id=10,
+        member_display_name="Member",
+        server=AttendanceServer.ONE,
+    )
+    added = report_watermark(queryset)
+    attendance.delete()
+
+    assert empty != added
+    assert report_watermark(queryset) != added
+
+
+def test_cached_report_is_built_once(storage, settings):
+    builds = []
+
+    def build():
+        builds.append(1)
+        return io.BytesIO(b"report")
+
+    for _ in range(2):
+        with cached_report("daterange", {"start": 1}, [1], "csv", build) as fp:
+            assert fp.read() == b"report"
+    with cached_report("daterange", {"start": 1}, [2], "csv", build) as fp:
+        assert fp.read() == b"report"
+    assert len(builds) == 2
+
+    settings.EVE_REPORT_CACHE = False
+    with cached_report("daterange", {"start": 1}, [1], "csv", build) as fp:
+        assert fp.read() == b"report"
+    assert len(builds) == 3
@@ -0,0 +1,101 @@
+import pytest
+
+from activity.models import EventChannel
+from activity.registries import event_access
+from evebot.exceptions import NotEventChannel, NotEventModerator
+from evebot.utils import checks
+from evebot.utils.checks import event_channel_only, event_moderator_only
+from evebot.utils.executor import DatabaseExecutor
+
+
+class FakeObject(object):
+    def __init__(self, object_id):
+        self.id = object_id
+
+
+class FakeClient(object):
+    def __init__(self, db_executor=None):
+        self.db_executor = db_executor
+
+
+class FakeInteraction(object):
+    def __init__(self, client, guild_id=1, channel_id=100, member_id=10):
+        self.client = client
+        self.guild = FakeObject(guild_id)
+        self.channel = FakeObject(channel_id)
+        self.user = FakeObject(member_id)
+        self.extras = {}
+
+
+def predicate(check):
+    @check
+    async def command(interaction):
+        ...
+
+    return command.__discord_app_commands_checks__[0]
+
+
+@pytest.fixture(autouse=True)
+def clean_stats():
+    checks.check_stats.clear()
+    yield
+    checks.check_stats.clear()
+
+
+@pytest.fixture
+def loaded_event_access():
+    event_access.replace([(1, 100)], [(1, 10)])
+    yield event_access
+    event_access.replace([], [])
+    event_access.loaded = False
+
+
+@pytest.mark.asyncio
+async def test_checks_are_memoized_per_interaction(loaded_event_access):
+    client = FakeClient()
+    interaction = FakeInteraction(client)
+    channel_only = predicate(event_channel_only())
+
+    # Проверки группы и подкоманды в одном interaction
+    assert await channel_only(interaction)
+    assert await channel_only(interaction)
+    assert await channel_only(FakeInteraction(client))
+
+    assert checks.get_check_stats() == {
+        "event_channel.registry": 2,
+        "event_channel.memoized": 1,
+        "avoided": 3,
+    }
+
+
+@pytest.mark.asyncio
+async def test_failed_checks_are_memoized(loaded_event_access):
+    interaction = FakeInteraction(FakeClient(), channel_id=101, member_id=11)
+    channel_only = predicate(event_channel_only())
+    moderator_only = predicate(event_moderator_only())
+
+    for _ in range(2):
+        with pytest.raises(NotEventChannel):
+            await channel_only(interaction)
+        with pytest.raises(NotEventModerator):
+            await moderator_only(interaction)
+
+    assert checks.check_stats["event_channel.memoized"] == 1
+    assert checks.check_stats["event_moderator.memoized"] == 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.django_db(transaction=True)
+async def test_checks_fall_back_to_database():
+    await EventChannel.objects.acreate(guild_id=1, channel_id=100)
+    executor = DatabaseExecutor(max_workers=1)
+    channel_only = predicate(event_channel_only())
+
+    assert not event_access.loaded
+    try:
+        assert await channel_only(FakeInteraction(FakeClient(executor)))
+    finally:
+        executor.shutdown()
+
+    assert executor.stats()["calls"] == 1
+    assert checks.get_check_stats() == {"event_channel.database": 1, "avoided": 0}
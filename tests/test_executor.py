@@ -0,0 +1,65 @@
+import asyncio
+import threading
+
+import pytest
+from django.db import connection
+
+from evebot.utils.executor import DatabaseExecutor
+
+
+@pytest.fixture
+def executor():
+    executor = DatabaseExecutor(max_workers=2)
+    yield executor
+    executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_calls_run_off_the_event_loop(executor):
+    assert await executor.run(threading.get_ident) != threading.get_ident()
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_bounded(executor):
+    lock = threading.Lock()
+    active = peak = 0
+
+    def work():
+        nonlocal active, peak
+        with lock:
+            active += 1
+            peak = max(peak, active)
+        threading.Event().wait(0.01)
+        with lock:
+            active -= 1
+
+    await asyncio.gather(*(executor.run(work) for _ in range(6)))
+
+    assert peak == 2
+    stats = executor.stats()
+    assert stats["calls"] == 6
+    assert stats["active"] == 0
+    assert stats["threads"] == 2
+
+
+@pytest.mark.asyncio
+async def test_exceptions_reach_the_caller(executor):
+    def fail():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError, match="boom"):
+        await executor.run(fail)
+    assert executor.stats()["active"] == 0
+
+
+@pytest.mark.asyncio
+async def test_worker_connection_settings_stay_in_the_pool():
+    executor = DatabaseExecutor(max_workers=1, conn_max_age=60, health_checks=True)
+    try:
+        settings = await executor.run(lambda: dict(connection.settings_dict))
+    finally:
+        executor.shutdown()
+
+    assert settings["CONN_MAX_AGE"] == 60
+    assert settings["CONN_HEALTH_CHECKS"] is True
+    assert connection.settings_dict["CONN_MAX_AGE"] != 60
@@ -0,0 +1,68 @@
+import datetime
+
+import pytest
+from django.utils import timezone
+
+from activity.choices import ReportJobStatus
+from activity.jobs import claim_job, decode_params, recover_jobs
+from activity.models import ReportJob
+
+
+def make_job(status=ReportJobStatus.PENDING, **fields):
+    fields.setdefault("params", {"start_id": 1, "end_id": 2})
+    return ReportJob.objects.create(
+        guild_id=1,
+        channel_id=2,
+        member_id=3,
+        method="get_statistics_by_event_range",
+        status=status,
+        **fields,
+    )
+
+
+@pytest.mark.django_db
+def test_claim_job_runs_job_once():
+    job = make_job()
+
+    claimed = claim_job(job.id)
+
+    assert claimed.status == ReportJobStatus.RUNNING
+    assert claimed.attempts == 1
+    assert claimed.started is not None
+    assert claim_job(job.id) is None
+
+
+@pytest.mark.django_db
+def test_recover_jobs():
+    pending = make_job()
+    interrupted = make_job(status=ReportJobStatus.RUNNING, attempts=1)
+    exhausted = make_job(status=ReportJobStatus.RUNNING, attempts=3)
+    done = make_job(status=ReportJobStatus.DONE)
+    old = make_job(status=ReportJobStatus.FAILED)
+    ReportJob.objects.filter(pk=old.pk).update(
+        updated=timezone.now() - datetime.timedelta(days=8)
+    )
+
+    assert recover_jobs(max_attempts=3, keep_days=7) == [pending.id, interrupted.id]
+
+    statuses = dict(ReportJob.objects.values_list("id", "status"))
+    assert statuses == {
+        pending.id: ReportJobStatus.PENDING,
+        interrupted.id: ReportJobStatus.PENDING,
+        exhausted.id: ReportJobStatus.FAILED,
+        done.id: ReportJobStatus.DONE,
+    }
+
+
+@pytest.mark.django_db
+def test_job_params_survive_json():
+    start = datetime.datetime(2024, 1, 1)
+    job = make_job(params={"start_date": start, "end_date": start, "other": "x"})
+
+    params = ReportJob.objects.get(pk=job.pk).params
+
+    assert decode_params(params) == {
+        "start_date": start,
+        "end_date": start,
+        "other": "x",
+    }
@@ -0,0 +1,68 @@
+import datetime
+
+from django.utils import timezone
+
+from activity import partitions
+from activity.buffers import PendingAttendance, write_attendances
+from activity.choices import AttendanceServer
+from activity.models import Event, EventAttendance
+
+
+def test_add_months():
+    assert partitions.add_months(datetime.date(2024, 11, 1), 1) == datetime.date(
+        2024, 12, 1
+    )
+    assert partitions.add_months(datetime.date(2024, 12, 1), 1) == datetime.date(
+        2025, 1, 1
+    )
+    assert partitions.add_months(datetime.date(2024, 1, 1), -1) == datetime.date(
+        2023, 12, 1
+    )
+
+
+def test_partition_name():
+    name = partitions.partition_name(datetime.date(2024, 3, 1))
+    assert name == f"{EventAttendance._meta.db_table}_y2024m03"
+    assert partitions.PARTITION_NAME_RE.search(name)
+
+
+def test_convert_to_partitioned(postgres, make_event):
+    current = partitions.month_start(timezone.localdate())
+    previous = partitions.add_months(current, -1)
+    old = make_event()
+    Event._base_manager.filter(pk=old.pk).update(
+        created=timezone.make_aware(
+            datetime.datetime.combine(previous, datetime.time(12))
+        )
+    )
+    old.refresh_from_db()
+    new = make_event()
+    for event in (old, new):
+        EventAttendance.objects.create(event=event, member_id=10, server="Server 1")
+
+    created = partitions.convert_to_partitioned(ahead=1)
+
+    assert partitions.is_partitioned()
+    assert created == [
+        partitions.partition_name(month)
+        for month in (previous, current, partitions.add_months(current, 1))
+    ]
+    assert set(partitions.partitions()) == {
+        previous,
+        current,
+        partitions.add_months(current, 1),
+    }
+    assert EventAttendance.objects.count() == 2
+
+    # Upsert по уникальному ограничению работает и на секционированной таблице
+    write_attendances(
+        {
+            new.id: {
+                10: PendingAttendance("ann", "Ann", AttendanceServer.TWO),
+                11: PendingAttendance("bob", "Bob", AttendanceServer.ONE),
+            }
+        }
+    )
+    assert set(
+        EventAttendance.objects.filter(event=new).values_list("member_id", "server")
+    ) == {(10, AttendanceServer.TWO.value), (11, AttendanceServer.ONE.value)}
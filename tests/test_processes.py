@@ -0,0 +1,61 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from evebot.utils.processes import ProcessJobPool
+
+
+@pytest.fixture
+def make_pool():
+    pools = []
+
+    def make_pool(**options):
+        options.setdefault("concurrency", 1)
+        options.setdefault("timeout", 30)
+        pool = ProcessJobPool(2, **options)
+        pools.append(pool)
+        return pool
+
+    yield make_pool
+    for pool in pools:
+        pool.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_jobs_run_in_worker_processes(make_pool):
+    pool = make_pool()
+
+    assert await pool.run("guild", "os.getpid") != os.getpid()
+    assert await pool.run("guild", "operator.add", 2, 3) == 5
+
+
+@pytest.mark.asyncio
+async def test_jobs_of_the_same_key_run_one_at_a_time(make_pool):
+    pool = make_pool()
+    # Поднимаем оба процесса, чтобы не мерить время их запуска
+    await asyncio.gather(pool.run("a", "os.getpid"), pool.run("b", "os.getpid"))
+
+    started = time.monotonic()
+    await asyncio.gather(
+        pool.run("guild", "time.sleep", 0.3), pool.run("guild", "time.sleep", 0.3)
+    )
+
+    assert time.monotonic() - started >= 0.6
+
+
+@pytest.mark.asyncio
+async def test_abandoned_job_result_is_discarded(make_pool):
+    pool = make_pool(timeout=0.5)
+    discarded = []
+
+    with pytest.raises(TimeoutError):
+        await pool.run("guild", "time.sleep", 2, discard=discarded.append)
+
+    # Запущенную задачу не остановить, ее результат убирается по завершении
+    for _ in range(100):
+        if discarded:
+            break
+        await asyncio.sleep(0.1)
+    assert discarded == [None]
@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+from django.db import connections
+
+from activity.models import Event
+from evebot.utils.executor import DatabaseExecutor
+from evebot.utils.queries import (
+    query_scope,
+    query_stats,
+    record_queries,
+    recorded_query,
+)
+
+
+@pytest.fixture(autouse=True)
+def clean_stats():
+    query_stats.clear()
+    yield
+    query_stats.clear()
+
+
+def test_nested_scopes_are_counted_by_the_outermost():
+    with query_scope("outer") as outer:
+        with query_scope("inner") as inner:
+            assert inner is None
+            with recorded_query("SELECT 1"):
+                ...
+
+    assert outer.count == 1
+    assert list(query_stats) == ["outer"]
+    assert query_stats["outer"].calls == 1
+
+
+@pytest.mark.asyncio
+async def test_task_outliving_its_scope_opens_its_own():
+    release = asyncio.Event()
+
+    async def worker():
+        await release.wait()
+        with query_scope("worker"), recorded_query("SELECT 2"):
+            ...
+
+    with query_scope("listener") as listener:
+        # Задача наследует контекст со scope слушателя
+        task = asyncio.create_task(worker())
+        await asyncio.sleep(0)
+    release.set()
+    await task
+
+    assert listener.closed
+    assert listener.count == 0
+    assert query_stats["worker"].queries == 1
+
+
+def test_closed_scope_ignores_late_statements():
+    with query_scope("command") as scope:
+        ...
+    scope.add("SELECT 3", 0.0)
+
+    assert scope.count == 0
+
+
+def test_record_queries_wraps_every_alias():
+    with query_scope("command") as scope, record_queries():
+        for alias in connections:
+            assert scope.record in connections[alias].execute_wrappers
+
+
+def test_record_queries_without_scope():
+    with record_queries():
+        for alias in connections:
+            assert not connections[alias].execute_wrappers
+
+
+@pytest.mark.asyncio
+@pytest.mark.django_db(transaction=True)
+async def test_executor_calls_are_recorded_in_the_callers_scope():
+    executor = DatabaseExecutor(max_workers=2)
+    try:
+        with query_scope("command") as scope:
+            await asyncio.gather(
+                executor.run(lambda: list(Event.objects.all())),
+                executor.run(lambda: Event.objects.count()),
+            )
+        # Вне scope запросы никуда не пишутся
+        await executor.run(lambda: Event.objects.count())
+    finally:
+        executor.shutdown()
+
+    assert scope.count == 2
+    assert query_stats["command"].queries == 2
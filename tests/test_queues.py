@@ -0,0 +1,163 @@
+import asyncio
+
+import discord
+import pytest
+
+from activity.queues import EmbedUpdateDebouncer, ReactionRemovalQueue
+
+
+class FakeMessage(object):
+    def __init__(self, bot, channel_id, message_id):
+        self.bot = bot
+        self.channel_id = channel_id
+        self.id = message_id
+
+    async def remove_reaction(self, emoji, member):
+        if self.bot.fail is not None:
+            raise self.bot.fail
+        self.bot.removed.append((self.channel_id, self.id, member.id, str(emoji)))
+
+    async def edit(self, embed):
+        self.bot.edited.append((self.id, embed.title))
+
+
+class FakeChannel(object):
+    def __init__(self, bot, channel_id):
+        self.bot = bot
+        self.id = channel_id
+
+    def get_partial_message(self, message_id):
+        return FakeMessage(self.bot, self.id, message_id)
+
+
+class FakeBot(object):
+    def __init__(self, fail=None):
+        self.fail = fail
+        self.removed = []
+        self.edited = []
+
+    def get_partial_messageable(self, channel_id):
+        return FakeChannel(self, channel_id)
+
+
+async def drain(queue):
+    await asyncio.gather(*queue._workers.values())
+
+
+@pytest.mark.asyncio
+async def test_removals_are_coalesced():
+    bot = FakeBot()
+    queue = ReactionRemovalQueue(bot, rate=1000)
+
+    queue.add(1, 10, 100, "1️⃣")
+    queue.add(1, 10, 100, "1️⃣")
+    queue.add(1, 10, 101, "1️⃣")
+    queue.add(2, 20, 100, "2️⃣")
+    assert len(queue) == 3
+    await drain(queue)
+
+    assert sorted(bot.removed) == [
+        (1, 10, 100, "1️⃣"),
+        (1, 10, 101, "1️⃣"),
+        (2, 20, 100, "2️⃣"),
+    ]
+    assert queue.stats["coalesced"] == 1
+    assert queue.stats["removed"] == 3
+    assert len(queue) == 0
+
+
+@pytest.mark.asyncio
+async def test_discarded_removals_are_skipped():
+    bot = FakeBot()
+    queue = ReactionRemovalQueue(bot, rate=1000)
+
+    queue.add(1, 10, 100, "1️⃣")
+    queue.add(1, 10, 101, "1️⃣")
+    queue.add(1, 11, 100, "1️⃣")
+    # Участник сам снял реакцию, сообщение события очищено целиком
+    queue.discard(1, 10, 100, "1️⃣")
+    queue.drop_message(1, 11)
+    await drain(queue)
+
+    assert bot.removed == [(1, 10, 101, "1️⃣")]
+    assert queue.stats["skipped"] == 2
+
+
+@pytest.mark.asyncio
+async def test_failed_removals_are_not_retried():
+    response = type("Response", (), {"status": 404, "reason": "Not Found"})()
+    bot = FakeBot(fail=discord.NotFound(response, "Unknown Message"))
+    queue = ReactionRemovalQueue(bot, rate=1000)
+
+    queue.add(1, 10, 100, "1️⃣")
+    await drain(queue)
+
+    assert queue.stats["failed"] == 1
+    assert len(queue) == 0
+    assert not queue._workers
+
+
+class FakeEvent(object):
+    def __init__(self, title):
+        self.title = title
+        self.renders = 0
+
+
+async def render(event):
+    event.renders += 1
+    return discord.Embed(title=event.title)
+
+
+@pytest.mark.asyncio
+async def test_touches_between_edits_are_merged():
+    bot = FakeBot()
+    debouncer = EmbedUpdateDebouncer(bot, render, interval=0.05)
+    event = FakeEvent("first")
+
+    debouncer.touch(1, 10, event)
+    await asyncio.sleep(0)
+    # Пока первая правка не остыла, новые касания копятся в одну
+    for title in ("second", "third", "fourth"):
+        event.title = title
+        debouncer.touch(1, 10, event)
+    await drain(debouncer)
+
+    assert bot.edited == [(10, "first"), (10, "fourth")]
+    assert debouncer.stats["merged"] == 2
+    assert event.renders == 2
+
+
+@pytest.mark.asyncio
+async def test_unchanged_embed_is_not_sent():
+    bot = FakeBot()
+    debouncer = EmbedUpdateDebouncer(bot, render, interval=0)
+    event = FakeEvent("same")
+
+    debouncer.touch(1, 10, event)
+    await drain(debouncer)
+    debouncer.touch(1, 10, event)
+    await drain(debouncer)
+    # Сообщение правили в обход, следующий рендер отправляется снова
+    debouncer.invalidate(10)
+    debouncer.touch(1, 10, event)
+    await drain(debouncer)
+
+    assert bot.edited == [(10, "same"), (10, "same")]
+    assert debouncer.stats["unchanged"] == 1
+    assert debouncer.stats["edited"] == 2
+
+
+@pytest.mark.asyncio
+async def test_forget_cancels_pending_edit():
+    bot = FakeBot()
+    debouncer = EmbedUpdateDebouncer(bot, render, interval=10)
+    event = FakeEvent("first")
+
+    debouncer.touch(1, 10, event)
+    await asyncio.sleep(0)
+    debouncer.touch(1, 10, event)
+    debouncer.forget(10)
+    await asyncio.sleep(0)
+
+    assert bot.edited == [(10, "first")]
+    assert not debouncer._workers
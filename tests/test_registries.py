@@ -0,0 +1,173 @@
+import asyncio
+
+import pytest
+
+from activity.choices import AttendanceServer, EventStatus
+from activity.models import EventChannel, EventModerator
+from activity.registries import (
+    ActiveEventIndex,
+    AttendanceRegistry,
+    EventAccessRegistry,
+    event_access,
+)
+
+
+class FakeStore(object):
+    def __init__(self, members, delay=0.0):
+        self.members = members
+        self.delay = delay
+        self.loads = 0
+
+    async def load_attendances(self, event_id):
+        self.loads += 1
+        await asyncio.sleep(self.delay)
+        return list(self.members)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_access_loads_once():
+    store = FakeStore([(10, "Server 1"), (11, "Server 2")], delay=0.01)
+    registry = AttendanceRegistry(store=store)
+
+    first, second, counts = await asyncio.gather(
+        registry.get(1, 10), registry.get(1, 11), registry.counts(1)
+    )
+
+    assert (first, second) == (AttendanceServer.ONE, AttendanceServer.TWO)
+    assert counts[AttendanceServer.ONE] == counts[AttendanceServer.TWO] == 1
+    assert store.loads == 1
+    assert 1 in registry
+
+
+@pytest.mark.asyncio
+async def test_set_and_discard():
+    registry = AttendanceRegistry(store=FakeStore([(10, "Server 1")]))
+
+    assert await registry.set(1, 10, AttendanceServer.THREE) == AttendanceServer.ONE
+    assert await registry.set(1, 11, AttendanceServer.ONE) is None
+    assert await registry.discard(1, 10) == AttendanceServer.THREE
+    assert await registry.discard(1, 10) is None
+    assert await registry.get(1, 11) == AttendanceServer.ONE
+
+
+@pytest.mark.asyncio
+async def test_evict_reloads_state():
+    store = FakeStore([(10, "Server 1")])
+    registry = AttendanceRegistry(store=store)
+    await registry.set(1, 10, AttendanceServer.TWO)
+
+    registry.evict(1)
+
+    assert 1 not in registry
+    assert await registry.get(1, 10) == AttendanceServer.ONE
+    assert store.loads == 2
+
+
+@pytest.mark.asyncio
+async def test_evict_during_load_does_not_cache_state():
+    store = FakeStore([(10, "Server 1")], delay=0.05)
+    registry = AttendanceRegistry(store=store)
+
+    pending = asyncio.gather(registry.get(1, 10), registry.get(1, 10))
+    await asyncio.sleep(0.01)
+    registry.evict(1)
+
+    assert await pending == [AttendanceServer.ONE, AttendanceServer.ONE]
+    assert 1 not in registry
+
+
+class FakeEvent(object):
+    def __init__(self, event_id, message_id, status=EventStatus.STARTED):
+        self.id = event_id
+        self.message_id = message_id
+        self.status = status
+
+
+def test_active_event_index_by_id():
+    index = ActiveEventIndex()
+    event = FakeEvent(1, 100)
+    index.warm([event, FakeEvent(2, 200, status=EventStatus.FINISHED)])
+
+    assert index.get_by_id(1) is event
+    assert index.get_by_id(2) is None
+
+    index.discard(100)
+    assert index.get_by_id(1) is None
+
+
+def test_active_event_index_caches_closed_events():
+    index = ActiveEventIndex(closed_size=1)
+    event = FakeEvent(1, 100)
+    index.add(event)
+
+    event.status = EventStatus.FINISHED
+    index.add(event)
+    assert index.get(100) is event
+    assert index.get_by_id(1) is None
+    assert index.stats() == {"events": 0, "closed": 1, "missing": 0}
+
+    # Кэш закрытых событий ограничен, вытесненные снова читаются из БД
+    index.add(FakeEvent(2, 200, status=EventStatus.CANCELED))
+    assert index.get(100) is None
+    assert not index.is_missing(100)
+
+    deleted = FakeEvent(2, 200, status=EventStatus.DELETED)
+    index.add(deleted)
+    assert index.get(200) is None
+    assert index.is_missing(200)
+
+
+def test_event_access_snapshot():
+    registry = EventAccessRegistry()
+    assert not registry.loaded
+    # До первой загрузки reload ничего не делает
+    registry.reload()
+    assert not registry.loaded
+
+    registry.replace([(1, 100), (1, 101), (2, 200)], [(1, 10)])
+
+    assert registry.loaded
+    assert registry.is_event_channel(1, 101)
+    assert not registry.is_event_channel(2, 101)
+    assert registry.is_event_moderator(1, 10)
+    assert not registry.is_event_moderator(2, 10)
+    assert registry.channels(1) == {100, 101}
+    assert registry.moderators(3) == frozenset()
+
+
+@pytest.mark.django_db
+def test_event_access_load():
+    EventChannel.objects.create(guild_id=1, channel_id=100)
+    EventModerator.objects.create(guild_id=1, member_id=10)
+    registry = EventAccessRegistry()
+
+    registry.load()
+
+    assert registry.channels(1) == {100}
+    assert registry.moderators(1) == {10}
+
+
+@pytest.fixture
+def loaded_event_access(db):
+    event_access.load()
+    yield event_access
+    event_access.replace([], [])
+    event_access.loaded = False
+
+
+def test_event_access_reloads_on_commit(
+    loaded_event_access, django_capture_on_commit_callbacks
+):
+    with django_capture_on_commit_callbacks(execute=True):
+        channel = EventChannel.objects.create(guild_id=1, channel_id=100)
+        moderator = EventModerator.objects.create(guild_id=1, member_id=10)
+        # Снимок обновляется только после коммита
+        assert not loaded_event_access.is_event_channel(1, 100)
+    assert loaded_event_access.is_event_channel(1, 100)
+    assert loaded_event_access.is_event_moderator(1, 10)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        channel.delete()
+        moderator.delete()
+    assert not loaded_event_access.is_event_channel(1, 100)
+    assert not loaded_event_access.is_event_moderator(1, 10)
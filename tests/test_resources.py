@@ -0,0 +1,96 @@
+import pytest
+
+from activity.choices import AttendanceServer, EventStatus
+from activity.models import EventAttendance
+from activity.resources import (
+    REPORT_COLUMNS,
+    CommonEventAttendanceResource,
+    EventAttendanceRollupResource,
+    merge_sorted_report_rows,
+    pivot_report_rows,
+)
+
+
+def report_row(member_id, names="", **counts):
+    row = {"member_id": member_id, "member_names": names}
+    row.update(dict.fromkeys(REPORT_COLUMNS[2:], 0))
+    row.update(counts)
+    return row
+
+
+def test_report_headers_follow_servers():
+    headers = CommonEventAttendanceResource().get_export_headers()
+    assert tuple(headers) == REPORT_COLUMNS
+    assert len(REPORT_COLUMNS) == 2 + len(AttendanceServer)
+    assert EventAttendanceRollupResource().get_export_headers() == headers
+
+
+def test_pivot_report_rows():
+    rows = [
+        {"member_id": 1, "server": "Server 1", "value": 3, "member_names": "Ann"},
+        {"member_id": 1, "server": "Server 3", "value": 2, "member_names": "Ann,Bo"},
+        {"member_id": 2, "server": "Server 6", "value": None, "member_names": None},
+        {"member_id": 2, "server": "Server 6", "value": 4, "member_names": "Cid"},
+    ]
+
+    assert list(pivot_report_rows(rows)) == [
+        report_row(1, "Ann,Bo", server_one=3, server_three=2),
+        report_row(2, "Cid", server_six=4),
+    ]
+
+
+def test_pivot_report_rows_skips_unknown_servers(caplog):
+    rows = [
+        {"member_id": 1, "server": "Server 1", "value": 1, "member_names": "Ann"},
+        {"member_id": 1, "server": "Server 0", "value": 5, "member_names": "Old"},
+        {"member_id": 2, "server": "Server 0", "value": 2, "member_names": "Bob"},
+    ]
+
+    assert list(pivot_report_rows(rows)) == [report_row(1, "Ann", server_one=1)]
+    assert "Skipped 2 report rows of unknown server 'Server 0'" in caplog.text
+
+
+def test_pivot_report_rows_empty():
+    assert list(pivot_report_rows([])) == []
+
+
+def test_merge_sorted_report_rows():
+    database = [
+        report_row(1, "Ann", server_one=1),
+        report_row(3, "Cid", server_two=2),
+    ]
+    archive = [
+        report_row(1, "Ann,Old", server_one=2, server_four=1),
+        report_row(2, "Bob", server_five=5),
+    ]
+
+    assert list(merge_sorted_report_rows(database, archive)) == [
+        report_row(1, "Ann,Old", server_one=3, server_four=1),
+        report_row(2, "Bob", server_five=5),
+        report_row(3, "Cid", server_two=2),
+    ]
+
+
+def test_aggregate_counts_distinct_events(postgres, make_event):
+    events = [make_event(status=EventStatus.FINISHED) for _ in range(2)]
+    for event in events:
+        EventAttendance.objects.create(
+            event=event,
+            member_id=10,
+            member_display_name="Ann",
+            server=AttendanceServer.ONE,
+        )
+    EventAttendance.objects.create(
+        event=events[0],
+        member_id=11,
+        member_display_name="Bob",
+        server=AttendanceServer.TWO,
+    )
+
+    resource = CommonEventAttendanceResource()
+    rows = list(resource.aggregate(EventAttendance.objects.all()))
+
+    assert rows == [
+        report_row(10, "Ann", server_one=2),
+        report_row(11, "Bob", server_two=1),
+    ]
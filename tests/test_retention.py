@@ -0,0 +1,45 @@
+import datetime
+
+import pytest
+from django.utils import timezone
+
+from activity.choices import EventStatus
+from activity.models import Event, EventAttendance
+from activity.retention import purge_batch
+
+
+@pytest.fixture
+def cutoff():
+    return timezone.now() - datetime.timedelta(days=30)
+
+
+def deleted_event(make_event, members, deleted_at):
+    event = make_event(status=EventStatus.DELETED)
+    for member_id in range(members):
+        EventAttendance.objects.create(
+            event=event, member_id=member_id, server="Server 1"
+        )
+    Event._base_manager.filter(pk=event.pk).update(updated=deleted_at)
+    return event
+
+
+@pytest.mark.django_db
+def test_purge_batch_deletes_in_bounded_batches(make_event, cutoff):
+    old = cutoff - datetime.timedelta(days=1)
+    expired = [deleted_event(make_event, 3, old) for _ in range(2)]
+    recent = deleted_event(make_event, 1, cutoff + datetime.timedelta(days=1))
+    finished = make_event(status=EventStatus.FINISHED)
+    Event._base_manager.filter(pk=finished.pk).update(updated=old)
+
+    results = []
+    while True:
+        result = purge_batch(cutoff, batch_size=4)
+        if result == (0, 0):
+            break
+        results.append(result)
+
+    # Сначала строки участников пачками по 4, затем сами события
+    assert results == [(0, 4), (0, 2), (2, 0)]
+    assert not Event._base_manager.filter(pk__in=[e.pk for e in expired]).exists()
+    assert Event._base_manager.filter(pk__in=[recent.pk, finished.pk]).count() == 2
+    assert EventAttendance.objects.filter(event=recent).count() == 1
@@ -0,0 +1,59 @@
+import datetime
+
+import pytest
+from django.utils import timezone
+
+from activity import services
+from activity.choices import EventStatus
+from activity.models import Event
+from activity.services import replica_is_fresh
+from system import routers
+from system.routers import REPLICA_DATABASE, ReplicaRouter, use_replica
+
+
+@pytest.fixture
+def replica(monkeypatch):
+    # Реплика не подключается, роутеру достаточно знать, что она есть
+    monkeypatch.setattr(routers, "replica_configured", lambda: True)
+    monkeypatch.setattr(services, "replica_configured", lambda: True)
+
+
+def test_reads_go_to_primary_without_replica():
+    router = ReplicaRouter()
+
+    with use_replica():
+        assert router.db_for_read(Event) is None
+
+
+def test_reads_go_to_replica_only_inside_use_replica(replica):
+    router = ReplicaRouter()
+
+    assert router.db_for_read(Event) is None
+    with use_replica():
+        assert router.db_for_read(Event) == REPLICA_DATABASE
+        assert router.db_for_write(Event) == "default"
+        with use_replica(False):
+            assert router.db_for_read(Event) is None
+        assert router.db_for_read(Event) == REPLICA_DATABASE
+    assert router.db_for_read(Event) is None
+    assert not router.allow_migrate(REPLICA_DATABASE, "activity")
+
+
+@pytest.mark.django_db
+def test_replica_is_never_fresh_without_replica():
+    assert not replica_is_fresh()
+
+
+def test_recently_finished_events_are_read_from_primary(replica, make_event):
+    event = make_event(status=EventStatus.FINISHED)
+    other = make_event(status=EventStatus.STARTED)
+
+    assert not replica_is_fresh()
+    assert not replica_is_fresh(id__in=[event.id])
+    assert replica_is_fresh(id__in=[other.id])
+
+    # Событие закончилось давно, реплика его уже догнала
+    Event._base_manager.filter(pk=event.pk).update(
+        updated=timezone.now() - datetime.timedelta(minutes=1)
+    )
+    assert replica_is_fresh(id__in=[event.id])
@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+from django.db import connection
+
+from activity.buffers import PendingAttendance
+from activity.choices import AttendanceServer, EventStatus
+from activity.models import Event, EventAttendance, EventAttendanceRollup
+from activity.stores import DjangoActivityStore, PsycopgActivityStore
+from evebot.utils.executor import DatabaseExecutor
+
+BATCHES = [
+    {
+        10: PendingAttendance("ann", "Ann", AttendanceServer.ONE),
+        11: PendingAttendance("bob", "Bob", AttendanceServer.TWO),
+    },
+    {
+        10: PendingAttendance("ann", "Ann", AttendanceServer.THREE),
+        11: None,
+        12: PendingAttendance("cid", "Cid", AttendanceServer.ONE),
+    },
+    {12: None},
+]
+
+
+def written_state(event):
+    event = Event._base_manager.get(pk=event.pk)
+    return (
+        set(
+            EventAttendance.objects.filter(event=event).values_list(
+                "member_id", "member_name", "member_display_name", "server"
+            )
+        ),
+        event.server_counts,
+        set(
+            EventAttendanceRollup.objects.filter(guild_id=event.guild_id).values_list(
+                "member_id", "server", "member_display_name", "count"
+            )
+        ),
+    )
+
+
+@pytest.mark.django_db(transaction=True)
+def test_stores_write_the_same_rows(postgres, make_event):
+    pytest.importorskip("psycopg")
+    # Разные гильдии разделяют строки rollup двух хранилищ
+    django_event = make_event(status=EventStatus.FINISHED, guild_id=1)
+    psycopg_event = make_event(status=EventStatus.FINISHED, guild_id=2)
+
+    async def write():
+        executor = DatabaseExecutor(1)
+        stores = {
+            django_event.id: DjangoActivityStore(executor),
+            psycopg_event.id: PsycopgActivityStore(size=1),
+        }
+        try:
+            for ops in BATCHES:
+                for event_id, store in stores.items():
+                    await store.write_attendances({event_id: dict(ops)})
+        finally:
+            for store in stores.values():
+                await store.close()
+            await executor.run(connection.close)
+            executor.shutdown()
+
+    asyncio.run(write())
+
+    assert written_state(django_event) == written_state(psycopg_event)
+    attendances, counts, rollup = written_state(django_event)
+    assert attendances == {(10, "ann", "Ann", AttendanceServer.THREE.value)}
+    assert counts[AttendanceServer.THREE] == 1
+    assert sum(counts.values()) == 1
+    assert rollup == {(10, AttendanceServer.THREE.value, "Ann", 1)}